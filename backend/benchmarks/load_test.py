@@ -0,0 +1,230 @@
+"""
+HTTP load driver for the ERP API and admin changelists.
+
+Seed a database first (`python manage.py seed_benchmark_data`), start the
+server, then:
+
+    python benchmarks/load_test.py --base-url http://localhost:8000 --clients 20 --seconds 30 \
+        --admin-user saeed --admin-password ... --token $ERP_API_TOKEN --json results.json
+
+Each client thread picks endpoints by weight and records latency. The report
+gives throughput and p50/p90/p99/max latency per endpoint, and orders taken
+per minute when order-create runs (it needs --token: orders are POSTed as
+the sync engine does, with seeded SKUs and customer emails). Compare two
+--json files to catch regressions.
+Standard library only, so it runs anywhere the backend does.
+"""
+import argparse
+import http.cookiejar
+import json
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+SKU_PREFIX = 'BENCH'  # seed_benchmark_data's PREFIX
+
+# name -> (path template, weight, auth: '', 'admin' session or API 'token')
+# {product_id}, {contact_n} and {category_id} are filled with random seeded values.
+ENDPOINTS = {
+    'product-list': ('/api/v1/inventory/products/', 1, ''),
+    'product-detail': ('/api/v1/inventory/products/{product_id}/', 20, ''),
+    'product-stock': ('/api/v1/inventory/products/{product_id}/stock/', 20, ''),
+    'product-moves': ('/api/v1/inventory/products/{product_id}/moves/', 10, ''),
+    # The whole ledger, streamed
+    'stockmove-list': ('/api/v1/inventory/moves/', 1, ''),
+    'category-list': ('/api/v1/inventory/categories/', 5, ''),
+    'barcode-lookup': ('/api/v1/inventory/lookup/?code={barcode}', 20, ''),
+    'customer-by-email': ('/api/v1/customers/by-email/contact{contact_n}@bench.local', 10, ''),
+    'order-create': ('/api/v1/orders', 10, 'token'),
+    'admin-products': ('/admin/inventory/product/?category__id__exact={category_id}', 2, 'admin'),
+    'admin-stockmoves': ('/admin/inventory/stockmove/', 2, 'admin'),
+    'admin-orders': ('/admin/orders/order/?status__exact=processing', 2, 'admin'),
+    'admin-contacts': ('/admin/contacts/contact/?is_customer__exact=1', 2, 'admin'),
+}
+
+
+def order_body(rng, args):
+    """An order as middleware/sync_engine.py sends it, for seeded products and customers."""
+    items = []
+    for _ in range(rng.randint(1, args.max_items)):
+        product_id = rng.randint(*args.product_ids)
+        items.append({
+            'product_sku': f'{SKU_PREFIX}-{product_id - args.product_ids[0]:07d}',
+            'quantity': rng.randint(1, 3),
+            'unit_price': round(rng.uniform(5, 500), 2),
+        })
+    return {
+        'external_id': f'LOAD-{uuid.uuid4().hex[:16]}',
+        'store': 'load',
+        'customer_email': f'customer{rng.randrange(args.customers)}@bench.local',
+        'status': 'processing',
+        'total_amount': round(sum(i['quantity'] * i['unit_price'] for i in items), 2),
+        'currency': 'AED',
+        'placed_at': datetime.now(timezone.utc).isoformat(),
+        'items': items,
+    }
+
+
+# POSTed endpoints: name -> function(rng, args) building the JSON body
+BODIES = {'order-create': order_body}
+
+
+def admin_opener(base_url, username, password):
+    """urllib opener holding a logged-in admin session."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    login_url = f'{base_url}/admin/login/'
+    page = opener.open(login_url).read().decode()
+    token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page).group(1)
+    data = urllib.parse.urlencode({
+        'csrfmiddlewaretoken': token, 'username': username, 'password': password, 'next': '/admin/',
+    }).encode()
+    request = urllib.request.Request(login_url, data=data, headers={'Referer': login_url})
+    opener.open(request)
+    if not any(cookie.name == 'sessionid' for cookie in jar):
+        raise SystemExit('Admin login failed')
+    return opener
+
+
+def client(base_url, endpoints, weights, opener, args, deadline, results, lock):
+    rng = random.Random()
+    plain = urllib.request.build_opener()
+    local = defaultdict(list)
+    errors = defaultdict(int)
+    token_headers = {'Authorization': f'Token {args.token}'} if args.token else {}
+    while time.time() < deadline:
+        name = rng.choices(endpoints, weights)[0]
+        path, _, auth = ENDPOINTS[name]
+        product_id = rng.randint(*args.product_ids)
+        url = base_url + path.format(
+            product_id=product_id,
+            barcode=f'29{product_id - args.product_ids[0]:011d}',
+            contact_n=rng.randrange(args.contacts),
+            category_id=rng.randint(*args.category_ids),
+        )
+        request = urllib.request.Request(url, headers=token_headers if auth == 'token' else {})
+        if name in BODIES:
+            request.data = json.dumps(BODIES[name](rng, args)).encode()
+            request.add_header('Content-Type', 'application/json')
+        start = time.perf_counter()
+        try:
+            with (opener if auth == 'admin' else plain).open(request, timeout=args.timeout) as response:
+                response.read()
+            local[name].append(time.perf_counter() - start)
+        except (urllib.error.URLError, TimeoutError, ConnectionError):
+            errors[name] += 1
+    with lock:
+        for name, samples in local.items():
+            results['latency'][name].extend(samples)
+        for name, count in errors.items():
+            results['errors'][name] += count
+
+
+def id_range(value):
+    first, last = value.split(':')
+    return int(first), int(last)
+
+
+def change(new, old):
+    return f'{(new - old) / old * 100:+.0f}%' if old else 'n/a'
+
+
+def percentile(samples, p):
+    if len(samples) < 2:
+        return samples[0] if samples else 0.0
+    return statistics.quantiles(samples, n=100, method='inclusive')[p - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--clients', type=int, default=10, help='Concurrent client threads')
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--only', nargs='*', choices=sorted(ENDPOINTS), help='Restrict to these endpoints')
+    parser.add_argument('--admin-user')
+    parser.add_argument('--admin-password')
+    parser.add_argument('--token', help='API token for the endpoints that write (order-create)')
+    # Ranges the random ids are drawn from; seed_benchmark_data prints the values to use
+    parser.add_argument('--product-ids', type=id_range, default='1:100000', metavar='FIRST:LAST')
+    parser.add_argument('--category-ids', type=id_range, default='1:50', metavar='FIRST:LAST')
+    parser.add_argument('--contacts', type=int, default=50_000)
+    parser.add_argument('--customers', type=int, default=20_000)
+    parser.add_argument('--max-items', type=int, default=5, help='Items per posted order (1..N)')
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--compare', help='Earlier --json file; prints the change per endpoint')
+    args = parser.parse_args()
+    base_url = args.base_url.rstrip('/')
+
+    opener = None
+    if args.admin_user:
+        opener = admin_opener(base_url, args.admin_user, args.admin_password)
+    available = {'': True, 'admin': opener is not None, 'token': bool(args.token)}
+    endpoints = [
+        name for name, (_, _, auth) in ENDPOINTS.items()
+        if (not args.only or name in args.only) and available[auth]
+    ]
+    if not endpoints:
+        sys.exit('No endpoints to run (admin endpoints need --admin-user, order-create --token)')
+    weights = [ENDPOINTS[name][1] for name in endpoints]
+
+    results = {'latency': defaultdict(list), 'errors': defaultdict(int)}
+    lock = threading.Lock()
+    deadline = time.time() + args.seconds
+    threads = [
+        threading.Thread(target=client, args=(base_url, endpoints, weights, opener, args, deadline, results, lock))
+        for _ in range(args.clients)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    report = {}
+    for name in endpoints:
+        samples = sorted(results['latency'][name])
+        report[name] = {
+            'requests': len(samples),
+            'errors': results['errors'][name],
+            'rps': len(samples) / args.seconds,
+            'p50_ms': percentile(samples, 50) * 1000,
+            'p90_ms': percentile(samples, 90) * 1000,
+            'p99_ms': percentile(samples, 99) * 1000,
+            'max_ms': (samples[-1] if samples else 0.0) * 1000,
+        }
+
+    print(f"{'endpoint':<20}{'reqs':>8}{'errs':>6}{'req/s':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  (ms)")
+    for name, r in report.items():
+        print(f"{name:<20}{r['requests']:>8}{r['errors']:>6}{r['rps']:>9.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p90_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}")
+    total = sum(r['requests'] for r in report.values())
+    print(f'total {total} requests, {total / args.seconds:.1f} req/s with {args.clients} clients')
+    if 'order-create' in report:
+        print(f"orders taken: {report['order-create']['rps'] * 60:.0f}/min")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['endpoints']
+        print(f"\n{'vs baseline':<20}{'req/s':>10}{'p50':>10}{'p99':>10}")
+        for name, r in report.items():
+            if name in baseline:
+                b = baseline[name]
+                print(f"{name:<20}{change(r['rps'], b['rps']):>10}"
+                      f"{change(r['p50_ms'], b['p50_ms']):>10}{change(r['p99_ms'], b['p99_ms']):>10}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'clients': args.clients, 'seconds': args.seconds, 'endpoints': report}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+CPU cost of a list response: DRF ModelSerializer + JSONRenderer vs the
+values_list() + orjson fast path (core.serialization).
+
+Runs against the configured database, so seed it first
+(`python manage.py seed_benchmark_data`).
+
+    cd backend && python benchmarks/serialization.py --rows 10000
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from contacts.models import Contact  # noqa: E402
+from contacts.serializers import ContactSerializer  # noqa: E402
+from core.serialization import dumps, fast_rows, iter_json_array, serializer_columns  # noqa: E402
+from inventory.models import Product, StockMove  # noqa: E402
+from inventory.serializers import ProductSerializer, StockMoveSerializer  # noqa: E402
+
+CASES = [
+    ('products', Product, ProductSerializer),
+    ('stock moves', StockMove, StockMoveSerializer),
+    ('contacts', Contact, ContactSerializer),
+]
+
+
+def cpu(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.process_time()
+        func()
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=3, help='Best of N runs')
+    args = parser.parse_args()
+
+    print(f"{'list':<12}{'rows':>8}{'drf cpu s':>12}{'fast cpu s':>12}{'stream s':>12}{'speedup':>9}")
+    for name, model, serializer_class in CASES:
+        queryset = model.objects.order_by('pk')[:args.rows]
+        rows = queryset.count()
+        if not rows:
+            print(f'{name:<12} no rows, seed the database first')
+            continue
+        columns = serializer_columns(serializer_class)
+        drf = cpu(lambda: JSONRenderer().render(serializer_class(queryset, many=True).data), args.repeat)
+        fast = cpu(lambda: dumps(list(fast_rows(queryset, columns))), args.repeat)
+        stream = cpu(lambda: b''.join(iter_json_array(fast_rows(queryset, columns))), args.repeat)
+        print(f'{name:<12}{rows:>8}{drf:>12.3f}{fast:>12.3f}{stream:>12.3f}{drf / fast:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
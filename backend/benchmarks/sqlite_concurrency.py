@@ -0,0 +1,135 @@
+"""
+SQLite concurrency benchmark: default journal settings vs the production profile.
+
+Spawns reader and writer processes against a scratch database shaped like the
+StockMove ledger and reports reads/s, writes/s and "database is locked" errors.
+
+    cd backend && python benchmarks/sqlite_concurrency.py --readers 4 --writers 3 --seconds 10
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+from django.conf import settings  # noqa: E402
+
+PROFILES = {
+    # What Django gave us before: rollback journal, FULL fsync, 5s default timeout
+    'default': {'timeout': 5.0, 'pragmas': {}, 'begin': 'BEGIN'},
+    'production': {
+        'timeout': settings.SQLITE_BUSY_TIMEOUT,
+        'pragmas': settings.SQLITE_PRAGMAS,
+        'begin': 'BEGIN IMMEDIATE',
+    },
+}
+
+SCHEMA = """
+CREATE TABLE stock_move (
+    id INTEGER PRIMARY KEY,
+    product_id INTEGER NOT NULL,
+    quantity NUMERIC NOT NULL,
+    move_type VARCHAR(20) NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX stock_move_product ON stock_move (product_id);
+"""
+
+
+def connect(path, profile):
+    conn = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None)
+    for pragma, value in profile['pragmas'].items():
+        conn.execute(f'PRAGMA {pragma}={value}')
+    return conn
+
+
+def setup(path, profile, rows):
+    conn = connect(path, profile)
+    conn.executescript(SCHEMA)
+    conn.execute('BEGIN')
+    conn.executemany(
+        'INSERT INTO stock_move (product_id, quantity, move_type, created_at) VALUES (?, ?, ?, datetime())',
+        ((i % 1000, 1, 'purchase') for i in range(rows)),
+    )
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def writer(path, profile, deadline, results):
+    conn = connect(path, profile)
+    done = errors = 0
+    while time.time() < deadline:
+        try:
+            conn.execute(profile['begin'])
+            conn.execute(
+                'INSERT INTO stock_move (product_id, quantity, move_type, created_at) VALUES (?, ?, ?, datetime())',
+                (done % 1000, -1, 'sale'),
+            )
+            conn.execute('COMMIT')
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+    results.put(('write', done, errors))
+
+
+def reader(path, profile, deadline, results):
+    conn = connect(path, profile)
+    done = errors = 0
+    while time.time() < deadline:
+        try:
+            conn.execute('SELECT SUM(quantity) FROM stock_move WHERE product_id = ?', (done % 1000,)).fetchone()
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put(('read', done, errors))
+
+
+def run(name, readers, writers, seconds, rows):
+    profile = PROFILES[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.sqlite3')
+        setup(path, profile, rows)
+        results = mp.Queue()
+        deadline = time.time() + seconds
+        procs = [mp.Process(target=writer, args=(path, profile, deadline, results)) for _ in range(writers)]
+        procs += [mp.Process(target=reader, args=(path, profile, deadline, results)) for _ in range(readers)]
+        for p in procs:
+            p.start()
+        totals = {'read': [0, 0], 'write': [0, 0]}
+        for _ in procs:
+            kind, done, errors = results.get()
+            totals[kind][0] += done
+            totals[kind][1] += errors
+        for p in procs:
+            p.join()
+    return {
+        'reads/s': totals['read'][0] / seconds,
+        'writes/s': totals['write'][0] / seconds,
+        'locked': totals['read'][1] + totals['write'][1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=3)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--rows', type=int, default=100_000, help='ledger rows seeded before the run')
+    args = parser.parse_args()
+
+    print(f"{'profile':<12}{'reads/s':>12}{'writes/s':>12}{'locked':>10}")
+    for name in PROFILES:
+        r = run(name, args.readers, args.writers, args.seconds, args.rows)
+        print(f"{name:<12}{r['reads/s']:>12.0f}{r['writes/s']:>12.0f}{r['locked']:>10}")
+
+
+if __name__ == '__main__':
+    main()
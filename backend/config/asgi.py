@@ -0,0 +1,10 @@
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Under ASGI every request runs its sync parts in a fresh thread, so a
+# persistent per-thread connection would leak instead of being reused: off
+# unless the operator sets it. PostgreSQL gets a pool instead (settings).
+os.environ.setdefault('CONN_MAX_AGE', '0')
+
+application = get_asgi_application()
@@ -29,6 +29,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.PrimaryPinningMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -39,6 +40,34 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request SQL inspection (query count, DB time, N+1 suspects) - opt-in,
+# off by default so production pays nothing for it
+QUERY_INSPECTOR = os.environ.get('QUERY_INSPECTOR', 'False') == 'True'
+QUERY_INSPECTOR_LOG_QUERIES = int(os.environ.get('QUERY_INSPECTOR_LOG_QUERIES', '50'))
+QUERY_INSPECTOR_LOG_MS = float(os.environ.get('QUERY_INSPECTOR_LOG_MS', '200'))
+QUERY_INSPECTOR_N1_THRESHOLD = int(os.environ.get('QUERY_INSPECTOR_N1_THRESHOLD', '5'))
+if QUERY_INSPECTOR:
+    MIDDLEWARE.insert(1, 'core.middleware.QueryCountMiddleware')
+
+# Profiles of single requests and jobs (core.profiling), listed in the admin.
+# Requests are profiled when PROFILER is on and either a PROFILER_SAMPLE_RATE
+# draw picks them (only under PROFILER_PATHS, if set) or they carry
+# "X-Profile: <PROFILER_TOKEN>" (without a token: a staff session). Jobs named
+# in PROFILER_JOBS ('*' for all) are profiled on every run. The oldest
+# profiles go once they add up to PROFILER_MAX_MB.
+PROFILER = os.environ.get('PROFILER', 'False') == 'True'
+PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', '0'))
+PROFILER_PATHS = [p for p in os.environ.get('PROFILER_PATHS', '').split(',') if p]
+PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN', '')
+PROFILER_JOBS = [name for name in os.environ.get('PROFILER_JOBS', '').split(',') if name]
+PROFILER_MODE = os.environ.get('PROFILER_MODE', 'sample')
+PROFILER_INTERVAL_MS = float(os.environ.get('PROFILER_INTERVAL_MS', '5'))
+PROFILER_MAX_MB = int(os.environ.get('PROFILER_MAX_MB', '200'))
+PROFILER_DIR = BASE_DIR / 'data' / 'profiles'
+if PROFILER:
+    # After AuthenticationMiddleware: the X-Profile header may need the session user
+    MIDDLEWARE.append('core.middleware.ProfilerMiddleware')
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -60,13 +89,125 @@ TEMPLATES = [
 WSGI_APPLICATION = 'config.wsgi.application'
 
 # Database
-# Use dj-database-url to parse DATABASE_URL (Coolify provides this)
-# Database - Switched to SQLite for immediate stability
-DATABASES = {
-    'default': {
+# Use dj-database-url to parse DATABASE_URL (Coolify provides this).
+# Without DATABASE_URL we fall back to the SQLite file for immediate stability.
+
+# SQLite production profile, applied on every new connection.
+# WAL lets readers run while a writer commits, synchronous=NORMAL only fsyncs
+# at checkpoints, and the busy timeout makes the gunicorn workers queue for
+# the write lock instead of failing with "database is locked".
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', '20'))  # seconds
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': SQLITE_BUSY_TIMEOUT * 1000,
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', '65536')),  # negative = KiB
+    'temp_store': 'MEMORY',
+}
+SQLITE_OPTIONS = {
+    'timeout': SQLITE_BUSY_TIMEOUT,
+    # Take the write lock at BEGIN so transactions never deadlock upgrading a read lock
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': ''.join(f'PRAGMA {k}={v};' for k, v in SQLITE_PRAGMAS.items()),
+}
+# How many times core.db.retry_on_lock re-runs a write transaction
+SQLITE_LOCK_RETRIES = int(os.environ.get('SQLITE_LOCK_RETRIES', '5'))
+
+# Persistent connections: keep each worker's connection open for this many
+# seconds, with a liveness check before reuse so a restarted Postgres doesn't
+# surface as a failed request. Only under WSGI (config.wsgi): under ASGI,
+# which run.sh serves, each request's sync code runs in a fresh thread with
+# a connection of its own, so config.asgi defaults this to 0 and reuse
+# comes from the PostgreSQL pool below instead.
+CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', '600'))
+# PostgreSQL connection pool per worker process (psycopg 3); replaces
+# CONN_MAX_AGE, which it can't be combined with
+DATABASE_POOL = os.environ.get('DATABASE_POOL', 'True') == 'True'
+DATABASE_POOL_MAX_SIZE = int(os.environ.get('DATABASE_POOL_MAX_SIZE', '10'))
+
+
+def database_config(url):
+    config = dj_database_url.parse(url, conn_max_age=CONN_MAX_AGE, conn_health_checks=True)
+    if config['ENGINE'] == 'django.db.backends.sqlite3':
+        config['OPTIONS'] = {**SQLITE_OPTIONS, **config.get('OPTIONS', {})}
+    elif config['ENGINE'] == 'django.db.backends.postgresql' and DATABASE_POOL:
+        config['CONN_MAX_AGE'] = 0
+        config['OPTIONS'] = {'pool': {'min_size': 2, 'max_size': DATABASE_POOL_MAX_SIZE}, **config.get('OPTIONS', {})}
+    return config
+
+
+if os.environ.get('DATABASE_URL'):
+    DATABASES = {'default': database_config(os.environ['DATABASE_URL'])}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'data' / 'db.sqlite3',
+            'OPTIONS': SQLITE_OPTIONS,
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+
+# Cold storage for old stock moves (inventory.archive): its own SQLite file
+# so the main one stays small, or ARCHIVE_DATABASE_URL.
+if os.environ.get('ARCHIVE_DATABASE_URL'):
+    DATABASES['archive'] = database_config(os.environ['ARCHIVE_DATABASE_URL'])
+else:
+    DATABASES['archive'] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'data' / 'db.sqlite3',
+        'NAME': BASE_DIR / 'data' / 'archive.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    }
+DATABASE_ROUTERS = ['core.routers.ArchiveRouter']
+# Months of stock moves kept in the main database by `manage.py archive_stock_moves`
+STOCK_ARCHIVE_MONTHS = int(os.environ.get('STOCK_ARCHIVE_MONTHS', '24'))
+
+# Read replica: API and report reads go to 'replica', writes to 'default'
+# (see core.routers). Locally, point it at the same file to exercise routing:
+#   DATABASE_REPLICA_URL=sqlite:///data/db.sqlite3
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = database_config(os.environ['DATABASE_REPLICA_URL'])
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS.append('core.routers.PrimaryReplicaRouter')
+# After a write, the client keeps reading from the primary this long (covers replication lag)
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '5'))
+
+# Cache
+# 'catalog' holds serialized catalog reads (core.cache): per-process memory with
+# LRU eviction under a byte cap, or files shared by the workers when
+# CATALOG_CACHE=file. 'cache_versions' holds the table versions the catalog
+# keys embed; it is file-based so a write in one worker invalidates all of them.
+CACHE_DIR = BASE_DIR / 'data' / 'cache'
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', '3600'))
+if os.environ.get('CATALOG_CACHE', 'memory') == 'file':
+    CATALOG_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR / 'catalog',
+        'TIMEOUT': CATALOG_CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
     }
+else:
+    CATALOG_CACHE = {
+        'BACKEND': 'core.cache.BoundedMemoryCache',
+        'LOCATION': 'catalog',
+        'TIMEOUT': CATALOG_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'MAX_BYTES': int(os.environ.get('CATALOG_CACHE_MAX_MB', '64')) * 1024 * 1024,
+        },
+    }
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'catalog': CATALOG_CACHE,
+    'cache_versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR / 'versions',
+        'TIMEOUT': None,
+    },
 }
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -90,11 +231,62 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny', # Open for now for ease of import script
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.serialization.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Machine clients use API tokens (core.authentication); Basic auth ran a
+    # full PBKDF2 hash on every request, so it is off unless asked for
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'core.authentication.APITokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
     ],
 }
+if os.environ.get('API_BASIC_AUTH', 'False') == 'True':
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'].append('rest_framework.authentication.BasicAuthentication')
+
+# Seconds a verified API token is trusted without hitting the database
+API_TOKEN_CACHE_TTL = int(os.environ.get('API_TOKEN_CACHE_TTL', '60'))
+API_TOKEN_CACHE_MAX_ENTRIES = 1000
+
+# Dashboard (core.dashboard): products at or below this stock count as low,
+# and the summary is cached this many seconds
+LOW_STOCK_THRESHOLD = int(os.environ.get('LOW_STOCK_THRESHOLD', '5'))
+DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', '10'))
+
+# Change stream (core.changes): events kept for Last-Event-ID resumes, how
+# often each worker polls the log, and seconds between keepalives. Streams
+# close after CHANGE_STREAM_MAX_SECONDS and the browser reconnects, so
+# worker restarts never wait on them.
+CHANGE_LOG_SIZE = int(os.environ.get('CHANGE_LOG_SIZE', '10000'))
+CHANGE_STREAM_POLL = float(os.environ.get('CHANGE_STREAM_POLL', '1'))
+CHANGE_STREAM_HEARTBEAT = int(os.environ.get('CHANGE_STREAM_HEARTBEAT', '15'))
+CHANGE_STREAM_MAX_SECONDS = int(os.environ.get('CHANGE_STREAM_MAX_SECONDS', '300'))
+
+# Background jobs (core.jobs, `manage.py run_workers`): pool size, how often
+# idle workers look for work, the lease a running job holds (extended while
+# it runs), the first retry delay (doubling per attempt), and how long
+# finished jobs and the files they wrote are kept
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '1'))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '300'))
+JOB_RETRY_DELAY = int(os.environ.get('JOB_RETRY_DELAY', '30'))
+JOB_KEEP_DAYS = int(os.environ.get('JOB_KEEP_DAYS', '7'))
+JOB_FILES_DIR = BASE_DIR / 'data' / 'jobs'
+
+# Demand forecasting (inventory.forecasting, `manage.py forecast_demand`):
+# days of sales history, supplier lead time and days between orders, the
+# service level safety stock is sized for, and the smoothing factor of the
+# forecast (higher follows recent days more closely)
+FORECAST_DAYS = int(os.environ.get('FORECAST_DAYS', '90'))
+FORECAST_LEAD_TIME_DAYS = int(os.environ.get('FORECAST_LEAD_TIME_DAYS', '7'))
+FORECAST_REVIEW_DAYS = int(os.environ.get('FORECAST_REVIEW_DAYS', '7'))
+FORECAST_SERVICE_LEVEL = float(os.environ.get('FORECAST_SERVICE_LEVEL', '0.95'))
+FORECAST_ALPHA = float(os.environ.get('FORECAST_ALPHA', '0.2'))
+
+# Customer matching (contacts.matching): country code given to local phone
+# numbers (05x..., 04...) so they match their international form
+CUSTOMER_PHONE_COUNTRY_CODE = os.environ.get('CUSTOMER_PHONE_COUNTRY_CODE', '971')
 
 CORS_ALLOW_ALL_ORIGINS = True
 
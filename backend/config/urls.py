@@ -1,12 +1,23 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import RedirectView
+from core.changes import change_stream
+from core.dashboard import DashboardSummaryView
+from core.views import ProfileUploadView
+from orders.views import OrderIngestView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     # FUTURE: API URLs will be included here
     path('api/v1/inventory/', include('inventory.urls')),
     path('api/v1/customers/', include('contacts.urls')),
+    # No slash: a POST can't follow the APPEND_SLASH redirect
+    path('api/v1/orders', OrderIngestView.as_view()),
+    path('api/v1/orders/', include('orders.urls')),
+    path('api/v1/dashboard/summary/', DashboardSummaryView.as_view(), name='dashboard-summary'),
+    path('api/v1/changes/stream/', change_stream, name='change-stream'),
+    path('api/v1/jobs/', include('core.urls')),
+    path('api/v1/profiles/', ProfileUploadView.as_view(), name='profile-upload'),
     # Redirect root to admin
     path('', RedirectView.as_view(url='/admin/', permanent=False)),
 ]
@@ -1,8 +1,9 @@
 from django.contrib import admin
+from core.admin_mixins import LargeTableAdminMixin
 from .models import Contact
 
 @admin.register(Contact)
-class ContactAdmin(admin.ModelAdmin):
-    list_display = ('name', 'email', 'phone', 'is_customer', 'is_vendor')
+class ContactAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('name', 'email', 'phone', 'user', 'is_customer', 'is_vendor')
     list_filter = ('is_customer', 'is_vendor')
-    search_fields = ('name', 'email')
+    search_fields = ('name', 'email', 'phone')
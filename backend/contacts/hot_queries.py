@@ -0,0 +1,5 @@
+from core.query_plans import register
+from .models import Contact
+
+register('contacts.contact.by_email', lambda: Contact.objects.filter(email='someone@example.com'))
+register('admin.contact.customers', lambda: Contact.objects.filter(is_customer=True).order_by('name'))
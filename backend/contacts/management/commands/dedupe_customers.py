@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from contacts import matching
+
+MERGE_BATCH = 200
+
+
+class Command(BaseCommand):
+    help = ('Find duplicate customers across Contact rows and User accounts by shared email, phone and name '
+            'keys (contacts.matching) and merge them: contacts into one, accounts into one with their orders, '
+            'and the two linked.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-score', type=float, default=matching.MERGE_SCORE,
+                            help='Merge pairs scoring at least this (0 to 1)')
+        parser.add_argument('--review', action='store_true',
+                            help=f'Also list pairs from {matching.REVIEW_SCORE} up that are not merged')
+        parser.add_argument('--block-limit', type=int, default=matching.BLOCK_LIMIT,
+                            help='Skip name tokens shared by more records than this')
+        parser.add_argument('--dry-run', action='store_true', help='Report only, change nothing')
+        parser.add_argument('--show', type=int, default=20, help='Clusters (and review pairs) to list')
+
+    def handle(self, *args, **options):
+        min_score = options['min_score']
+        if not 0 < min_score <= 1:
+            raise CommandError('--min-score is between 0 and 1.')
+        floor = min(min_score, matching.REVIEW_SCORE) if options['review'] else min_score
+
+        start = time.perf_counter()
+        records = list(matching.all_records())
+        pairs = list(matching.find_duplicates(records, floor, options['block_limit']))
+        merging = [pair for pair in pairs if pair[0] >= min_score]
+        groups = matching.unmerged(matching.clusters(merging))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{len(records):,} customers, {len(merging):,} matching pairs in {len(groups):,} clusters '
+            f'({elapsed:.1f}s).'
+        )
+
+        names = {record.ref: record.name or record.email or record.phone for record in records}
+        for refs in groups[:options['show']]:
+            self.stdout.write('  ' + ', '.join(f'{kind} {pk} ({names[kind, pk]})' for kind, pk in refs))
+        if len(groups) > options['show']:
+            self.stdout.write(f'  ... and {len(groups) - options["show"]:,} more')
+
+        if options['review']:
+            review = sorted((pair for pair in pairs if pair[0] < min_score), key=lambda pair: -pair[0])
+            self.stdout.write(f'{len(review):,} pairs to review:')
+            for value, reasons, a, b in review[:options['show']]:
+                self.stdout.write(
+                    f'  {value:.2f} on {"+".join(reasons)}: {a.ref[0]} {a.ref[1]} ({names[a.ref]}) / '
+                    f'{b.ref[0]} {b.ref[1]} ({names[b.ref]})'
+                )
+
+        if options['dry_run']:
+            self.stdout.write('Dry run, nothing merged.')
+            return
+        start = time.perf_counter()
+        # Many small merges per transaction (each merge is a savepoint of its own)
+        for i in range(0, len(groups), MERGE_BATCH):
+            with transaction.atomic():
+                for refs in groups[i:i + MERGE_BATCH]:
+                    matching.merge(refs)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(groups):,} clusters merged in {time.perf_counter() - start:.1f}s.'
+        ))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from contacts.matching import rebuild_keys
+from contacts.models import MatchKey
+
+
+class Command(BaseCommand):
+    help = 'Recompute the customer matching keys (after bulk imports, or once after upgrading).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--if-empty', action='store_true', help='Do nothing if the keys already exist')
+
+    def handle(self, *args, **options):
+        if options['if_empty'] and MatchKey.objects.exists():
+            self.stdout.write('Match keys already in place.')
+            return
+        start = time.perf_counter()
+        count = rebuild_keys()
+        self.stdout.write(self.style.SUCCESS(f'{count:,} match keys built in {time.perf_counter() - start:.1f}s.'))
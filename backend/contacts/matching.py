@@ -0,0 +1,394 @@
+"""
+Customer matching and deduplication across Contact rows and User accounts.
+
+Customers arrive from the Zoho import (Contact, with made-up
+@imported.local addresses when the export had none), the WooCommerce sync
+(by billing email) and as Order.customer (User). Every customer is reduced
+to normalized keys:
+
+- email: case-folded, +tags dropped, Gmail dots ignored; placeholder
+  addresses give no key
+- phone: digits in international form (local numbers get
+  CUSTOMER_PHONE_COUNTRY_CODE)
+- name tokens: case- and accent-folded words, titles and particles dropped
+
+Records that share a key form a block, and only records within a block are
+compared, never every pair. Name tokens shared by more than BLOCK_LIMIT
+records (common first names) are too broad to block on. A pair scores 1
+on the same email; on the same phone 0.6 plus up to 0.4 for the names;
+on names alone at most 0.85, so names never merge by themselves. Two
+different real emails lower the score.
+
+MatchKey stores the keys (kept current by contacts.signals) so resolve()
+finds the candidates for one customer with a few indexed lookups;
+find_duplicates() and merge() are the batch side (`manage.py
+dedupe_customers`).
+"""
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, router, transaction
+
+from orders import sales
+from orders.models import Order
+from .models import Contact, MatchKey
+
+PLACEHOLDER_DOMAINS = {'imported.local'}
+GMAIL_DOMAINS = {'gmail.com', 'googlemail.com'}
+STOP_TOKENS = {'mr', 'mrs', 'ms', 'miss', 'dr', 'eng', 'al', 'el', 'bin', 'bint', 'ibn', 'abu', 'the'}
+MIN_TOKEN = 2
+BLOCK_LIMIT = 100
+# Scores: at or above MERGE_SCORE records are the same customer; from
+# REVIEW_SCORE up they are worth a look
+MERGE_SCORE = 0.9
+REVIEW_SCORE = 0.75
+PHONE_WEIGHT = 0.6
+NAME_WEIGHT = 0.85
+CONFLICT_FACTOR = 0.8
+WRITE_BATCH = 2000
+
+
+def normalize_email(value):
+    value = (value or '').strip().casefold()
+    local, _, domain = value.rpartition('@')
+    if not local or not domain or domain in PLACEHOLDER_DOMAINS:
+        return ''
+    local = local.split('+', 1)[0]
+    if domain in GMAIL_DOMAINS:
+        local, domain = local.replace('.', ''), 'gmail.com'
+    return f'{local}@{domain}' if local else ''
+
+
+def normalize_phone(value):
+    digits = re.sub(r'\D', '', value or '')
+    if digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith('0'):
+        digits = settings.CUSTOMER_PHONE_COUNTRY_CODE + digits[1:]
+    elif len(digits) == 9 and digits.startswith('5'):
+        # UAE mobile typed without the leading 0
+        digits = settings.CUSTOMER_PHONE_COUNTRY_CODE + digits
+    # Shorter than any real number: an extension or junk
+    return digits if len(digits) >= 8 else ''
+
+
+def name_tokens(value):
+    value = unicodedata.normalize('NFKD', value or '').casefold()
+    value = ''.join(c for c in value if not unicodedata.combining(c))
+    return frozenset(
+        token for token in re.split(r'\W+', value)
+        if len(token) >= MIN_TOKEN and token not in STOP_TOKENS
+    )
+
+
+@dataclass
+class Record:
+    """One customer as matching sees it: ``ref`` is ('contact', id) or ('user', id)."""
+    ref: tuple
+    name: str
+    email: str = ''
+    phone: str = ''
+    tokens: frozenset = field(default_factory=frozenset)
+
+    @classmethod
+    def build(cls, ref, name, email, phone):
+        return cls(ref, name or '', normalize_email(email), normalize_phone(phone), name_tokens(name))
+
+    def keys(self):
+        if self.email:
+            yield 'email', self.email
+        if self.phone:
+            yield 'phone', self.phone
+        for token in self.tokens:
+            yield 'name', token
+
+
+def _user_name(first_name, last_name):
+    return f'{first_name} {last_name}'.strip()
+
+
+def contact_records(ids=None):
+    contacts = Contact.objects.order_by('id')
+    if ids is not None:
+        contacts = contacts.filter(id__in=ids)
+    for pk, name, email, phone in contacts.values_list('id', 'name', 'email', 'phone').iterator(chunk_size=5000):
+        yield Record.build(('contact', pk), name, email, phone)
+
+
+def user_records(ids=None):
+    """Customer accounts: active and not staff (staff accounts are never matched)."""
+    users = get_user_model().objects.filter(is_active=True, is_staff=False).order_by('id')
+    if ids is not None:
+        users = users.filter(id__in=ids)
+    rows = users.values_list('id', 'first_name', 'last_name', 'email', 'phone')
+    for pk, first_name, last_name, email, phone in rows.iterator(chunk_size=5000):
+        yield Record.build(('user', pk), _user_name(first_name, last_name), email, phone)
+
+
+def all_records():
+    yield from contact_records()
+    yield from user_records()
+
+
+def _token_similarity(a, b):
+    if a == b:
+        return 1.0
+    # Numbers (branches, flat numbers) only match exactly
+    if a.isdigit() or b.isdigit():
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def name_similarity(a, b):
+    """0 to 1: each token against its closest counterpart, so order doesn't matter but spelling variants score."""
+    if not a.tokens or not b.tokens:
+        return 0.0
+    best_a = sum(max(_token_similarity(t, u) for u in b.tokens) for t in a.tokens)
+    best_b = sum(max(_token_similarity(u, t) for t in a.tokens) for u in b.tokens)
+    return (best_a + best_b) / (len(a.tokens) + len(b.tokens))
+
+
+def score(a, b):
+    """``(score, reasons)`` for two records."""
+    if a.email and a.email == b.email:
+        return 1.0, ('email',)
+    similarity = name_similarity(a, b)
+    if a.phone and a.phone == b.phone:
+        value, reasons = PHONE_WEIGHT + (1 - PHONE_WEIGHT) * similarity, ('phone', 'name')
+    else:
+        value, reasons = NAME_WEIGHT * similarity, ('name',)
+    if a.email and b.email:
+        # Two real, different addresses: more likely two people sharing a phone or a name
+        value *= CONFLICT_FACTOR
+    return round(value, 3), reasons
+
+
+def find_duplicates(records, min_score=REVIEW_SCORE, block_limit=BLOCK_LIMIT):
+    """
+    Scored pairs ``(score, reasons, a, b)`` at or above ``min_score``,
+    comparing records only within their key blocks.
+    """
+    blocks = defaultdict(list)
+    for record in records:
+        for key in record.keys():
+            blocks[key].append(record)
+    # Names alone stay below NAME_WEIGHT: skip those blocks when they can't reach min_score
+    use_names = min_score <= NAME_WEIGHT
+    seen = set()
+    for (kind, _), members in blocks.items():
+        if len(members) < 2 or (kind == 'name' and not use_names):
+            continue
+        if kind == 'email':
+            # Same address, same customer: chain them to the first instead of every pair
+            for other in members[1:]:
+                seen.add((members[0].ref, other.ref))
+                yield 1.0, ('email',), members[0], other
+            continue
+        if len(members) > block_limit:
+            continue
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if (a.ref, b.ref) in seen:
+                    continue
+                seen.add((a.ref, b.ref))
+                value, reasons = score(a, b)
+                if value >= min_score:
+                    yield value, reasons, a, b
+
+
+def clusters(pairs):
+    """Connected groups of refs (union-find) over ``pairs`` of records."""
+    parent = {}
+
+    def find(ref):
+        parent.setdefault(ref, ref)
+        while parent[ref] != ref:
+            parent[ref] = parent[parent[ref]]
+            ref = parent[ref]
+        return ref
+
+    for _, _, a, b in pairs:
+        root_a, root_b = find(a.ref), find(b.ref)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    groups = defaultdict(list)
+    for ref in parent:
+        groups[find(ref)].append(ref)
+    return [sorted(group) for group in groups.values()]
+
+
+def unmerged(groups):
+    """Drop the clusters already merged: one contact linked to its one account."""
+    pairs = {}
+    for index, refs in enumerate(groups):
+        if len(refs) == 2 and refs[0][0] == 'contact' and refs[1][0] == 'user':
+            pairs[refs[0][1]] = index
+    linked = set()
+    ids = list(pairs)
+    for i in range(0, len(ids), WRITE_BATCH):
+        for pk, user_id in Contact.objects.filter(pk__in=ids[i:i + WRITE_BATCH]).values_list('pk', 'user_id'):
+            if ('user', user_id) == groups[pairs[pk]][1]:
+                linked.add(pairs[pk])
+    return [refs for index, refs in enumerate(groups) if index not in linked]
+
+
+def _merge_contacts(ids):
+    contacts = Contact.objects.in_bulk(ids)
+    ordered = [contacts[pk] for pk in sorted(contacts)]
+    if not ordered:
+        return None
+    # The oldest contact with a real address survives
+    survivor = next((c for c in ordered if normalize_email(c.email)), ordered[0])
+    others = [c for c in ordered if c is not survivor]
+    for other in others:
+        if not normalize_email(survivor.email) and normalize_email(other.email):
+            survivor.email = other.email
+        survivor.phone = survivor.phone or other.phone
+        survivor.address = survivor.address or other.address
+        survivor.user_id = survivor.user_id or other.user_id
+        survivor.is_vendor = survivor.is_vendor or other.is_vendor
+        survivor.is_customer = survivor.is_customer or other.is_customer
+    # Before saving: the survivor may take over an address (unique)
+    Contact.objects.filter(pk__in=[c.pk for c in others]).delete()
+    survivor.save()
+    return survivor
+
+
+def _merge_users(ids):
+    users = get_user_model().objects.in_bulk(ids)
+    if not users:
+        return None
+    # The oldest account keeps the orders; the others are deactivated, not deleted
+    survivor, *others = [users[pk] for pk in sorted(users)]
+    other_ids = [user.pk for user in others]
+    if other_ids:
+        Order.objects.filter(customer_id__in=other_ids).update(customer=survivor)
+        sales.customers_merged(other_ids, survivor.pk)
+        Contact.objects.filter(user_id__in=other_ids).update(user=survivor)
+    for other in others:
+        survivor.phone = survivor.phone or other.phone
+        survivor.first_name = survivor.first_name or other.first_name
+        survivor.last_name = survivor.last_name or other.last_name
+        other.is_active = False
+        other.save(update_fields=['is_active'])
+    survivor.save()
+    return survivor
+
+
+def merge(refs):
+    """
+    Merge one cluster: its contacts into one, its accounts into one (orders
+    moved over), and link the two. Returns ``(contact, user)``.
+    """
+    contact_ids = [pk for kind, pk in refs if kind == 'contact']
+    user_ids = [pk for kind, pk in refs if kind == 'user']
+    with transaction.atomic():
+        contact = _merge_contacts(contact_ids)
+        user = _merge_users(user_ids)
+        if contact is not None and user is not None and contact.user_id != user.pk:
+            contact.user = user
+            contact.save(update_fields=['user'])
+    return contact, user
+
+
+# --- Stored keys ---
+
+def _key_rows(record):
+    column = f'{record.ref[0]}_id'
+    return [MatchKey(kind=kind, key=key[:255], **{column: record.ref[1]}) for kind, key in record.keys()]
+
+
+def refresh_keys(kind, instance):
+    """Re-key one Contact or User after a save."""
+    column = f'{kind}_id'
+    MatchKey.objects.filter(**{column: instance.pk}).delete()
+    if kind == 'contact':
+        record = Record.build(('contact', instance.pk), instance.name, instance.email, instance.phone)
+    elif instance.is_active and not instance.is_staff:
+        name = _user_name(instance.first_name, instance.last_name)
+        record = Record.build(('user', instance.pk), name, instance.email, instance.phone)
+    else:
+        return
+    MatchKey.objects.bulk_create(_key_rows(record))
+
+
+def rebuild_keys():
+    """Recompute every stored key (after bulk loads, or once after upgrading); returns the number of keys."""
+    connection = connections[router.db_for_write(MatchKey)]
+    quote = connection.ops.quote_name
+    # One prepared statement for all rows; bulk_create builds a statement per
+    # couple of hundred rows on SQLite
+    sql = (f'INSERT INTO {quote(MatchKey._meta.db_table)} (kind, {quote("key")}, contact_id, user_id) '
+           'VALUES (%s, %s, %s, %s)')
+    created = 0
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        MatchKey.objects.using(connection.alias).all().delete()
+        batch = []
+        for record in all_records():
+            kind, pk = record.ref
+            contact_id, user_id = (pk, None) if kind == 'contact' else (None, pk)
+            batch.extend((key_kind, key[:255], contact_id, user_id) for key_kind, key in record.keys())
+            if len(batch) >= WRITE_BATCH:
+                cursor.executemany(sql, batch)
+                created += len(batch)
+                batch = []
+        cursor.executemany(sql, batch)
+    return created + len(batch)
+
+
+def _candidates(probe):
+    refs = set()
+    for kind, key in (('email', probe.email), ('phone', probe.phone)):
+        if key:
+            refs.update(MatchKey.objects.filter(kind=kind, key=key).values_list('contact_id', 'user_id'))
+    for token in probe.tokens:
+        # Only tokens rare enough to block on; reading one row past the limit
+        # tells without counting a common token's whole block
+        block = MatchKey.objects.filter(kind='name', key=token).values_list('contact_id', 'user_id')
+        block = list(block[:BLOCK_LIMIT + 1])
+        if len(block) <= BLOCK_LIMIT:
+            refs.update(block)
+    contact_ids = {contact_id for contact_id, _ in refs if contact_id}
+    user_ids = {user_id for _, user_id in refs if user_id}
+    records = []
+    if contact_ids:
+        records.extend(contact_records(contact_ids))
+    if user_ids:
+        records.extend(user_records(user_ids))
+    return records
+
+
+def resolve(email=None, phone=None, name=None, min_score=MERGE_SCORE):
+    """
+    The existing customer for these details, or None:
+    ``{'score', 'matched_on', 'contact', 'user', 'email'}`` with the best
+    matching Contact and User (either may be None) and their real address
+    (None if they only have a placeholder).
+    """
+    probe = Record.build(None, name, email, phone)
+    best = {}
+    for record in _candidates(probe):
+        value, reasons = score(probe, record)
+        kind = record.ref[0]
+        if value >= min_score and (kind not in best or value > best[kind][0]):
+            best[kind] = (value, reasons, record.ref[1])
+    if not best:
+        return None
+
+    contact = Contact.objects.filter(pk=best['contact'][2]).first() if 'contact' in best else None
+    User = get_user_model()
+    if 'user' in best:
+        user = User.objects.filter(pk=best['user'][2]).first()
+    else:
+        user = contact.user if contact is not None and contact.user_id else None
+    if contact is None and user is not None:
+        contact = user.contacts.order_by('id').first()
+    value, reasons, _ = max(best.values(), key=lambda match: match[0])
+    # A real address only, never an @imported.local placeholder
+    email = next((e for e in (contact and contact.email, user and user.email) if normalize_email(e)), None)
+    return {'score': value, 'matched_on': list(reasons), 'contact': contact, 'user': user, 'email': email}
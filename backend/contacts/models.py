@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 class Contact(models.Model):
@@ -13,8 +14,44 @@ class Contact(models.Model):
     
     is_vendor = models.BooleanField(default=False)
     is_customer = models.BooleanField(default=True)
+    # The account this customer's orders are placed under (Order.customer),
+    # linked by contacts.matching
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name="contacts")
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Partial index: customers are the rows the CRM screens list, by name
+        indexes = [
+            models.Index(fields=['name'], condition=models.Q(is_customer=True), name='contact_customer_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
+
+class MatchKey(models.Model):
+    """
+    Normalized email, phone and name-token keys of customers (Contact rows
+    and User accounts), so candidates for a match are an indexed lookup
+    instead of a scan. Maintained by contacts.signals; see contacts.matching.
+    """
+    KIND_CHOICES = [
+        ('email', 'Email'),
+        ('phone', 'Phone'),
+        ('name', 'Name token'),
+    ]
+
+    kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+    key = models.CharField(max_length=255)
+    contact = models.ForeignKey(Contact, on_delete=models.CASCADE, null=True, blank=True, related_name="match_keys")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+                             related_name="match_keys")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'key'], name='matchkey_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.key}"
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import matching
+from .models import Contact
+
+
+# Deletes cascade to the keys; bulk writes (imports, the seeder) need
+# `manage.py rebuild_match_keys` afterwards
+@receiver(post_save, sender=Contact)
+def rekey_contact(sender, instance, raw=False, **kwargs):
+    if not raw:
+        matching.refresh_keys('contact', instance)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def rekey_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Logins only touch last_login
+    if raw or (update_fields and set(update_fields) <= {'last_login', 'password'}):
+        return
+    matching.refresh_keys('user', instance)
@@ -1,6 +1,6 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
-from .views import ContactViewSet
+from .views import ContactViewSet, contact_by_email, resolve_customer
 
 router = DefaultRouter()
 # Script hits /api/v1/customers NOT /api/v1/contacts/customers
@@ -15,5 +15,8 @@ router = DefaultRouter()
 router.register(r'', ContactViewSet) # This makes it /api/v1/customers/ (if included there)
 
 urlpatterns = [
+    # SyncEngine calls /customers/by-email/<email> without a trailing slash
+    re_path(r'^by-email/(?P<email>[^/]+)/?$', contact_by_email, name='contact-by-email'),
+    re_path(r'^resolve/?$', resolve_customer, name='contact-resolve'),
     path('', include(router.urls)),
 ]
@@ -1,7 +1,50 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
 from rest_framework import viewsets
+from core.db import RetryOnLockMixin
+from core.serialization import FastListMixin
+from core.views import api_auth, not_found
+from . import matching
 from .models import Contact
 from .serializers import ContactSerializer
 
-class ContactViewSet(viewsets.ModelViewSet):
+class ContactViewSet(FastListMixin, RetryOnLockMixin, viewsets.ModelViewSet):
     queryset = Contact.objects.all()
     serializer_class = ContactSerializer
+
+@api_auth
+async def contact_by_email(request, email):
+    """Lookup used by the sync engine before creating a customer (async under config.asgi)."""
+    contact = await Contact.objects.filter(email__iexact=email).afirst()
+    if contact is None:
+        return not_found()
+    return JsonResponse(ContactSerializer(contact).data)
+
+@api_auth
+async def resolve_customer(request):
+    """
+    The existing customer for ?email=, ?phone=, ?name= (any of them), for
+    the sync engine before it creates one: normalized and fuzzy matching
+    (contacts.matching), not just the exact email. ?min_score=0..1
+    (default 0.9). 404 when nothing scores high enough.
+    """
+    params = request.GET
+    if not any(params.get(name) for name in ('email', 'phone', 'name')):
+        return JsonResponse({'detail': 'Give at least one of email, phone, name.'}, status=400)
+    try:
+        min_score = float(params.get('min_score', matching.MERGE_SCORE))
+    except ValueError:
+        return JsonResponse({'detail': 'min_score must be a number.'}, status=400)
+    match = await sync_to_async(matching.resolve)(
+        params.get('email'), params.get('phone'), params.get('name'), min_score,
+    )
+    if match is None:
+        return not_found()
+    contact, user = match['contact'], match['user']
+    return JsonResponse({
+        'score': match['score'],
+        'matched_on': match['matched_on'],
+        'email': match['email'],
+        'contact': ContactSerializer(contact).data if contact is not None else None,
+        'user': {'id': user.pk, 'username': user.username, 'email': user.email} if user is not None else None,
+    })
@@ -1,6 +1,15 @@
-from django.contrib import admin
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
-from .models import User
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from . import jobs, profiling
+from .models import APIToken, ChangeEvent, Counter, Job, Profile, User
+from .serializers import JobSerializer
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -8,3 +17,129 @@ class CustomUserAdmin(UserAdmin):
     fieldsets = UserAdmin.fieldsets + (
         ('Extra Fields', {'fields': ('phone', 'is_vendor')}),
     )
+
+@admin.register(APIToken)
+class APITokenAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user', 'prefix', 'is_active', 'expires_at', 'last_used_at', 'created_at')
+    list_filter = ('is_active',)
+    search_fields = ('name', 'prefix', 'user__username')
+    readonly_fields = ('prefix', 'last_used_at', 'created_at')
+    raw_id_fields = ('user',)
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            key = obj.set_new_key()
+            messages.warning(request, f'API key for "{obj.name}": {key} — copy it now, it will not be shown again.')
+        super().save_model(request, obj, form, change)
+
+@admin.register(Counter)
+class CounterAdmin(admin.ModelAdmin):
+    list_display = ('name', 'value', 'updated_at')
+    # Maintained on writes (value is without the deltas not folded in yet);
+    # `manage.py rebuild_dashboard` recomputes them
+    readonly_fields = ('name', 'value', 'updated_at')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(ChangeEvent)
+class ChangeEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'action', 'object_id', 'sku', 'created_at')
+    list_filter = ('kind', 'action')
+    search_fields = ('sku',)
+    # Written by the change stream signals, pruned to CHANGE_LOG_SIZE
+    readonly_fields = ('kind', 'action', 'object_id', 'sku', 'category_id', 'data', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'priority', 'progress', 'message', 'attempts', 'created_by',
+                    'created_at', 'finished_at', 'file')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'message')
+    list_select_related = ('created_by',)
+    # Priority can still be changed while the job waits; the rest belongs to the workers
+    readonly_fields = ('name', 'payload', 'status', 'run_after', 'attempts', 'max_attempts', 'locked_by',
+                       'locked_until', 'progress_done', 'progress_total', 'message', 'result', 'error',
+                       'created_by', 'created_at', 'started_at', 'finished_at')
+    actions = ['cancel_jobs', 'retry_jobs']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='Progress')
+    def progress(self, obj):
+        percent = obj.percent
+        if percent is not None:
+            return f'{percent}%'
+        return obj.progress_done or '-'
+
+    @admin.display(description='File')
+    def file(self, obj):
+        url = JobSerializer(obj).data['download']
+        return format_html('<a href="{}">Download</a>', url) if url else '-'
+
+    @admin.action(description='Cancel selected jobs')
+    def cancel_jobs(self, request, queryset):
+        count = jobs.cancel(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, f'{count} job(s) cancelled.', messages.SUCCESS)
+
+    @admin.action(description='Retry selected failed or cancelled jobs')
+    def retry_jobs(self, request, queryset):
+        count = jobs.retry(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, f'{count} job(s) queued again.', messages.SUCCESS)
+
+@admin.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'name', 'mode', 'duration', 'size_kb', 'created_at', 'download')
+    list_filter = ('kind', 'mode')
+    search_fields = ('name',)
+    date_hierarchy = 'created_at'
+    # Written by core.profiling; a summary of the data comes with the detail page
+    readonly_fields = ('kind', 'name', 'mode', 'duration_ms', 'file', 'size', 'meta', 'created_at', 'download',
+                       'summary')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_view), name='core_profile_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            raise Http404
+        profile = get_object_or_404(Profile, pk=pk)
+        file = Path(settings.PROFILER_DIR, profile.file)
+        if not file.exists():
+            raise Http404('The profile file is gone.')
+        return FileResponse(file.open('rb'), as_attachment=True, filename=profile.file)
+
+    # Files go with their rows
+    def delete_model(self, request, obj):
+        profiling.delete(Profile.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        profiling.delete(queryset)
+
+    @admin.display(description='Duration', ordering='duration_ms')
+    def duration(self, obj):
+        return f'{obj.duration_ms:,.0f} ms' if obj.duration_ms is not None else '-'
+
+    @admin.display(description='Size', ordering='size')
+    def size_kb(self, obj):
+        return f'{obj.size / 1024:,.1f} KB'
+
+    @admin.display(description='File')
+    def download(self, obj):
+        return format_html('<a href="{}">Download</a>', reverse('admin:core_profile_download', args=[obj.pk]))
+
+    @admin.display(description='Summary')
+    def summary(self, obj):
+        return format_html('<pre style="font-size: 12px">{}</pre>', profiling.summary(obj))
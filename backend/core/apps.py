@@ -3,3 +3,14 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+        from django.utils.module_loading import autodiscover_modules
+        from . import signals  # noqa: F401
+        # Job handlers (core.jobs), including background exports, for the web and the workers alike
+        autodiscover_modules('jobs', 'exports')
+        if settings.QUERY_INSPECTOR:
+            from django.db.backends.signals import connection_created
+            from .queries import install_on_connection_created
+            connection_created.connect(install_on_connection_created)
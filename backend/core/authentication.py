@@ -0,0 +1,119 @@
+"""
+API token authentication for machine clients.
+
+``Authorization: Bearer <key>`` (or ``Token <key>``). The key is hashed with
+SHA-256 and looked up by digest, so checking it is one indexed query instead
+of a PBKDF2 run. Verified digests are then remembered in-process for
+API_TOKEN_CACHE_TTL seconds, which makes repeat requests from the sync engine
+a dict lookup.
+
+Revoking or editing a token (or saving its user) clears it from this
+process's cache straight away; other gunicorn workers drop it when the TTL
+runs out.
+
+The sync engine's token is issued by run.sh from ERP_API_TOKEN, the same
+variable the engine reads (see create_api_token --key).
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import authentication, exceptions
+
+from .models import APIToken
+
+# key digest -> (user, token, monotonic deadline)
+_verified = {}
+_lock = threading.Lock()
+
+# last_used_at is for humans; don't write it on every request
+LAST_USED_RESOLUTION = timedelta(minutes=5)
+
+
+def _ttl():
+    return getattr(settings, 'API_TOKEN_CACHE_TTL', 60)
+
+
+def _max_entries():
+    return getattr(settings, 'API_TOKEN_CACHE_MAX_ENTRIES', 1000)
+
+
+def forget_token(key_hash=None):
+    """Drop one digest (or everything) from the verified-token cache."""
+    with _lock:
+        if key_hash is None:
+            _verified.clear()
+        else:
+            _verified.pop(key_hash, None)
+
+
+def forget_user(user_id):
+    """Drop the cached tokens of one user."""
+    with _lock:
+        for key_hash in [key_hash for key_hash, (user, _, _) in _verified.items() if user.pk == user_id]:
+            del _verified[key_hash]
+
+
+def _remember(key_hash, user, token):
+    with _lock:
+        if len(_verified) >= _max_entries():
+            # Oldest first; a full cache only means a few extra lookups
+            _verified.pop(next(iter(_verified)))
+        _verified[key_hash] = (user, token, time.monotonic() + _ttl())
+
+
+def _cached(key_hash):
+    entry = _verified.get(key_hash)
+    if entry is None:
+        return None
+    user, token, deadline = entry
+    now = time.monotonic()
+    if now >= deadline or (token.expires_at and token.expires_at <= timezone.now()):
+        forget_token(key_hash)
+        return None
+    return user, token
+
+
+class APITokenAuthentication(authentication.BaseAuthentication):
+    keywords = ('bearer', 'token')
+
+    def authenticate(self, request):
+        header = authentication.get_authorization_header(request).split()
+        if not header or header[0].lower().decode() not in self.keywords:
+            return None
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        try:
+            key = header[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        return self.authenticate_credentials(key)
+
+    def authenticate_credentials(self, key):
+        # Looking up by digest: timing reveals nothing useful about the key
+        key_hash = APIToken.hash_key(key)
+        hit = _cached(key_hash)
+        if hit is not None:
+            return hit
+
+        token = (
+            APIToken.objects.select_related('user')
+            .filter(key_hash=key_hash, is_active=True)
+            .first()
+        )
+        now = timezone.now()
+        if token is None or (token.expires_at and token.expires_at <= now):
+            raise exceptions.AuthenticationFailed('Invalid or expired token.')
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        if token.last_used_at is None or now - token.last_used_at > LAST_USED_RESOLUTION:
+            APIToken.objects.filter(pk=token.pk).update(last_used_at=now)
+            token.last_used_at = now
+        _remember(key_hash, token.user, token)
+        return token.user, token
+
+    def authenticate_header(self, request):
+        return 'Bearer'
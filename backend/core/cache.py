@@ -0,0 +1,158 @@
+"""
+Catalog read cache.
+
+Entries live in the 'catalog' cache and are keyed by the request parameters
+plus the current version of every table they were built from. A write to one
+of those tables (post_save/post_delete, see inventory.signals) replaces its
+version once the transaction commits. Later reads then miss, and stale entries
+age out through LRU eviction, so nothing has to be deleted by pattern.
+
+Versions are kept in the 'cache_versions' cache, which is file-based by default
+so that all gunicorn workers on the host see the same versions even when the
+entries themselves are in per-process memory.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework.response import Response
+
+_sizes = {}
+
+
+class BoundedMemoryCache(LocMemCache):
+    """
+    LocMemCache that also evicts least-recently-used entries to keep the
+    pickled values under OPTIONS['MAX_BYTES'] (MAX_ENTRIES still applies).
+    """
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self._max_bytes = int(params.get('OPTIONS', {}).get('MAX_BYTES', 64 * 1024 * 1024))
+        # Shared like the store itself: one instance per thread, one store per name
+        self._size = _sizes.setdefault(name, [0])
+
+    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self._delete(key)
+        super()._set(key, value, timeout)
+        self._size[0] += len(value)
+        # The entry just set is at the front, so it is never the one evicted
+        while self._size[0] > self._max_bytes and len(self._cache) > 1:
+            self._evict_lru()
+
+    def _evict_lru(self):
+        key, value = self._cache.popitem()
+        self._expire_info.pop(key, None)
+        self._size[0] -= len(value)
+
+    def _cull(self):
+        if self._cull_frequency == 0:
+            self._cache.clear()
+            self._expire_info.clear()
+            self._size[0] = 0
+        else:
+            for _ in range(len(self._cache) // self._cull_frequency):
+                self._evict_lru()
+
+    def _delete(self, key):
+        value = self._cache.get(key)
+        deleted = super()._delete(key)
+        if deleted:
+            self._size[0] -= len(value)
+        return deleted
+
+    def incr(self, key, delta=1, version=None):
+        # Re-set through _set so the size bookkeeping stays right
+        value = self.get(key, version=version)
+        if value is None:
+            raise ValueError("Key '%s' not found" % key)
+        self.set(key, value + delta, version=version)
+        return value + delta
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._expire_info.clear()
+            self._size[0] = 0
+
+
+def _version_key(model):
+    label = model if isinstance(model, str) else model._meta.label_lower
+    return f'table:{label}'
+
+
+def table_version(model):
+    return caches['cache_versions'].get(_version_key(model)) or '0'
+
+
+def bump_version(model):
+    """
+    Invalidate every cached entry built from ``model``'s table, after commit.
+    ``model`` can also be a plain name for versions that aren't a table.
+    """
+    def bump():
+        # A fresh token rather than incr: no lost updates between workers
+        caches['cache_versions'].set(_version_key(model), str(time.time_ns()), None)
+    transaction.on_commit(bump)
+
+
+def cache_key(prefix, models, params=()):
+    """``params`` is a dict or an iterable of (name, value) pairs."""
+    versions = '.'.join(table_version(m) for m in models)
+    if hasattr(params, 'items'):
+        params = params.items()
+    query = urlencode(sorted(params), doseq=True)
+    digest = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+    return f'{prefix}:{versions}:{digest}'
+
+
+def cached(prefix, models, params, compute, timeout=DEFAULT_TIMEOUT):
+    """Return the cached value for (prefix, params, table versions), computing it on a miss."""
+    cache = caches['catalog']
+    key = cache_key(prefix, models, params)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+async def acached(prefix, models, params, compute, timeout=DEFAULT_TIMEOUT):
+    """:func:`cached` for async views; ``compute`` is a coroutine function."""
+    # Both caches are local (memory/file), so calling them inline is fine here
+    cache = caches['catalog']
+    key = cache_key(prefix, models, params)
+    value = cache.get(key)
+    if value is None:
+        value = await compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+class CachedReadMixin:
+    """
+    ViewSet mixin caching the serialized list/retrieve payloads in the
+    catalog cache, versioned by ``cache_models``.
+    """
+    cache_models = ()
+
+    @property
+    def cache_prefix(self):
+        return type(self).__name__
+
+    def list(self, request, *args, **kwargs):
+        parent = super().list
+        data = cached(f'{self.cache_prefix}:list', self.cache_models, request.query_params.lists(),
+                      lambda: parent(request, *args, **kwargs).data)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        parent = super().retrieve
+        params = [*request.query_params.lists(), *sorted(kwargs.items())]
+        data = cached(f'{self.cache_prefix}:detail', self.cache_models, params,
+                      lambda: parent(request, *args, **kwargs).data)
+        return Response(data)
@@ -0,0 +1,292 @@
+"""
+Change stream: Server-Sent Events for stock, product and order writes.
+
+Writers call record() from signal handlers; the event is written once the
+write's transaction has committed, so an event exists only for writes that
+did. Events go to a short log table (core.models.ChangeEvent) whose ids
+double as the SSE event ids: a client that reconnects with Last-Event-ID is
+replayed what it missed, as long as it is still in the last
+CHANGE_LOG_SIZE events.
+
+Each worker process polls the log once every CHANGE_STREAM_POLL seconds
+however many streams are open (_Hub) and hands new events to the streams
+whose filters they match. Both the poller and replays read "everything
+after the last id seen", which is only safe if ids become visible in id
+order. SQLite takes the write lock at BEGIN, so they do. On PostgreSQL an id
+is handed out at INSERT, not at COMMIT, so each event is inserted in a
+transaction of its own that takes an advisory lock first: event inserts
+commit one after another, and the lock is held for that one INSERT, never
+while the writer's own rows are locked. A replica replays them in the same
+order. Other databases aren't supported; the stream says so.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections, router, transaction
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .models import ChangeEvent
+from .serialization import dumps
+from .views import api_auth
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('stock', 'product', 'order')
+# Delete what fell out of the log every this many events
+PRUNE_EVERY = 100
+FETCH_BATCH = 500
+# Events a slow client may fall behind before its stream is closed; it
+# reconnects and catches up from the log
+QUEUE_SIZE = 1000
+RETRY_MS = 3000
+# Key of the PostgreSQL advisory lock ordering event inserts
+LOCK_KEY = 0x6368616e6765
+VENDORS = ('sqlite', 'postgresql')
+COLUMNS = ('id', 'kind', 'action', 'object_id', 'sku', 'category_id', 'data', 'created_at')
+
+_muted = contextvars.ContextVar('changes_muted', default=False)
+
+
+@contextmanager
+def muted():
+    """No events for the writes inside (bulk clean-ups that publish one summary event instead)."""
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+
+def is_muted():
+    return _muted.get()
+
+
+def record(kind, action, object_id=None, sku='', category_id=None, **data):
+    if _muted.get():
+        return
+    using = router.db_for_write(ChangeEvent)
+    fields = {
+        'kind': kind, 'action': action, 'object_id': object_id, 'sku': sku or '', 'category_id': category_id,
+        'data': data,
+    }
+    # robust: a lost event mustn't fail a write that already committed
+    transaction.on_commit(lambda: _insert(using, fields), using=using, robust=True)
+
+
+def _insert(using, fields):
+    with transaction.atomic(using=using):
+        if connections[using].vendor == 'postgresql':
+            with connections[using].cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [LOCK_KEY])
+        event = ChangeEvent.objects.using(using).create(**fields)
+        if event.pk % PRUNE_EVERY == 0:
+            ChangeEvent.objects.using(using).filter(pk__lte=event.pk - settings.CHANGE_LOG_SIZE).delete()
+
+
+def _frame(row):
+    pk, kind, action, object_id, sku, category_id, data, created_at = row
+    body = {'action': action, 'id': object_id, 'at': created_at}
+    if sku:
+        body['sku'] = sku
+        body['category'] = category_id
+    body.update(data)
+    return f'id: {pk}\nevent: {kind}\ndata: '.encode() + dumps(body) + b'\n\n'
+
+
+async def _fetch(after, until=None):
+    events = ChangeEvent.objects.filter(pk__gt=after)
+    if until is not None:
+        events = events.filter(pk__lte=until)
+    return [row async for row in events.order_by('pk').values_list(*COLUMNS)[:FETCH_BATCH]]
+
+
+async def _latest_id():
+    return await ChangeEvent.objects.order_by('-pk').values_list('pk', flat=True).afirst() or 0
+
+
+async def _oldest_id():
+    return await ChangeEvent.objects.order_by('pk').values_list('pk', flat=True).afirst()
+
+
+class EventFilter:
+    """
+    What a stream asked for: event kinds, SKUs and category ids (empty means
+    any). SKU and category match either way round. Order events carry no
+    product, so a SKU or category filter leaves them out; bulk product and
+    stock events (repricing, rebuilds) have no SKU and always pass.
+    """
+
+    def __init__(self, kinds=(), skus=(), categories=()):
+        self.kinds = set(kinds)
+        self.skus = set(skus)
+        self.categories = set(categories)
+
+    def __call__(self, row):
+        kind, sku, category_id = row[1], row[4], row[5]
+        if self.kinds and kind not in self.kinds:
+            return False
+        if not (self.skus or self.categories):
+            return True
+        if kind == 'order':
+            return False
+        return not sku or sku in self.skus or category_id in self.categories
+
+
+class _Subscriber:
+    def __init__(self, matches):
+        self.matches = matches
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.overflowed = False
+
+
+class _Hub:
+    """Polls the log for this process and fans new events out to the open streams."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.last_id = 0
+        self._task = None
+        self._loop = None
+        self._ready = None
+
+    async def subscribe(self, matches):
+        """A new subscriber and the last event id it won't be sent."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._loop is not loop:
+            self._loop = loop
+            self._ready = asyncio.Event()
+            # A fresh context: the poller must not inherit the first request's
+            # router pinning or query collector
+            self._task = loop.create_task(self._run(), context=contextvars.Context())
+        await self._ready.wait()
+        # No await from here on, so nothing is fetched between reading
+        # last_id and joining
+        subscriber = _Subscriber(matches)
+        self.subscribers.add(subscriber)
+        return subscriber, self.last_id
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def _run(self):
+        try:
+            self.last_id = await _latest_id()
+            self._ready.set()
+            while True:
+                await asyncio.sleep(settings.CHANGE_STREAM_POLL)
+                if not self.subscribers:
+                    break
+                try:
+                    rows = await _fetch(self.last_id)
+                except Exception:
+                    logger.exception('Reading the change log failed')
+                    continue
+                for row in rows:
+                    self._publish(row)
+                # Nothing below this id can still turn up (see _insert())
+                if rows:
+                    self.last_id = rows[-1][0]
+        finally:
+            self._task = None
+
+    def _publish(self, row):
+        frame = None
+        for subscriber in list(self.subscribers):
+            if not subscriber.matches(row):
+                continue
+            frame = frame or _frame(row)
+            try:
+                subscriber.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                subscriber.overflowed = True
+                self.subscribers.discard(subscriber)
+
+
+_hub = _Hub()
+
+
+async def _replay(after, until, matches):
+    while after < until:
+        rows = await _fetch(after, until)
+        if not rows:
+            return
+        for row in rows:
+            if matches(row):
+                yield _frame(row)
+        after = rows[-1][0]
+
+
+async def _events(matches, resume):
+    # Subscribed on the first read, so a response that is never sent leaves nothing behind
+    subscriber, live_from = await _hub.subscribe(matches)
+    deadline = time.monotonic() + settings.CHANGE_STREAM_MAX_SECONDS
+    try:
+        yield f'retry: {RETRY_MS}\n\n'.encode()
+        if resume is not None and resume != live_from:
+            oldest = await _oldest_id()
+            if resume > live_from or oldest is None or oldest > resume + 1:
+                # Too old (pruned) or from another database: start over from now
+                body = dumps({'reason': 'Last-Event-ID is no longer in the change log'})
+                yield f'id: {live_from}\nevent: reset\ndata: '.encode() + body + b'\n\n'
+            else:
+                async for frame in _replay(resume, live_from, subscriber.matches):
+                    yield frame
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (subscriber.overflowed and subscriber.queue.empty()):
+                # The client reconnects by itself, with Last-Event-ID
+                return
+            try:
+                frame = await asyncio.wait_for(
+                    subscriber.queue.get(), min(settings.CHANGE_STREAM_HEARTBEAT, remaining),
+                )
+            except TimeoutError:
+                # Keeps proxies from timing the connection out
+                frame = b': keepalive\n\n'
+            yield frame
+    finally:
+        _hub.unsubscribe(subscriber)
+
+
+def _values(request, name):
+    return [v.strip() for value in request.GET.getlist(name) for v in value.split(',') if v.strip()]
+
+
+def _last_event_id(request):
+    # EventSource sends the header on reconnects; the parameter is for the first connect
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+@api_auth
+async def change_stream(request):
+    """
+    GET api/v1/changes/stream/ (text/event-stream). Filters, each repeatable
+    or comma-separated: ?types=stock,product,order, ?sku=..., ?category=<id>.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': 'The change stream needs the ASGI server (config.asgi).'}, status=501)
+    if connections[router.db_for_read(ChangeEvent)].vendor not in VENDORS:
+        return JsonResponse({'detail': 'The change stream needs SQLite or PostgreSQL.'}, status=501)
+    kinds = _values(request, 'types')
+    if set(kinds) - set(KINDS):
+        return JsonResponse({'detail': f'types must be among {", ".join(KINDS)}.'}, status=400)
+    try:
+        categories = [int(c) for c in _values(request, 'category')]
+    except ValueError:
+        return JsonResponse({'detail': 'category must be a category id.'}, status=400)
+
+    matches = EventFilter(kinds, _values(request, 'sku'), categories)
+    response = StreamingHttpResponse(_events(matches, _last_event_id(request)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx: pass events on as they come instead of buffering the response
+    response['X-Accel-Buffering'] = 'no'
+    return response
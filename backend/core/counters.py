@@ -0,0 +1,77 @@
+"""
+Named running totals (core.models.Counter).
+
+Writers call add() from signal handlers, inside the transaction that changes
+the underlying rows, so a counter never drifts from a committed write. add()
+only inserts a CounterDelta row: updating the counter row itself would make
+every writer wait on that one row's lock until it commits (and on
+PostgreSQL, lock it after the rows the writer already holds). values() adds
+the pending deltas to the stored value; fold() moves them into it, every
+FOLD_EVERY deltas after commit and from `manage.py rebuild_dashboard --fold`.
+
+Bulk paths that skip signals (bulk_create, queryset.update) recompute and
+set() the totals instead; see `manage.py rebuild_dashboard`.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Counter, CounterDelta
+
+# Fold the deltas into the counters every this many
+FOLD_EVERY = 1000
+CENT = Decimal('0.01')
+
+
+def add(name, delta):
+    if not delta:
+        return
+    row = CounterDelta.objects.create(name=name, value=delta)
+    if row.pk % FOLD_EVERY == 0:
+        transaction.on_commit(fold, robust=True)
+
+
+def _lock(names):
+    """The counter rows of ``names``, created if missing and locked for the rest of the transaction."""
+    for name in names:
+        Counter.objects.get_or_create(name=name)
+    return {c.name: c for c in Counter.objects.select_for_update().filter(name__in=names).order_by('name')}
+
+
+@transaction.atomic
+def fold(names=None):
+    """Move the pending deltas (of ``names``, or all) into the counter rows."""
+    deltas = CounterDelta.objects.all()
+    if names is not None:
+        deltas = deltas.filter(name__in=names)
+    names = sorted(set(deltas.values_list('name', flat=True)))
+    if not names:
+        return 0
+    # Locked first: a fold running meanwhile waits, then finds its deltas gone
+    counters = _lock(names)
+    last = CounterDelta.objects.filter(name__in=names).order_by('-pk').values_list('pk', flat=True).first()
+    if last is None:
+        return 0
+    pending = CounterDelta.objects.filter(name__in=names, pk__lte=last)
+    for name, total in pending.values_list('name').annotate(total=Sum('value')).order_by():
+        counter = counters[name]
+        counter.value += total
+        counter.save(update_fields=['value', 'updated_at'])
+    return pending.delete()[0]
+
+
+@transaction.atomic
+def set_value(name, value):
+    _lock([name])
+    CounterDelta.objects.filter(name=name).delete()
+    Counter.objects.filter(name=name).update(value=value)
+
+
+def values(*names):
+    """``{name: value}``, zero for counters never written."""
+    found = dict(Counter.objects.filter(name__in=names).values_list('name', 'value'))
+    pending = CounterDelta.objects.filter(name__in=names).values_list('name').annotate(total=Sum('value')).order_by()
+    for name, total in pending:
+        found[name] = (found.get(name, Decimal('0')) + total).quantize(CENT)
+    return {name: found.get(name, Decimal('0')) for name in names}
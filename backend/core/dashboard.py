@@ -0,0 +1,66 @@
+"""
+One-call dashboard summary.
+
+Every KPI comes from a precomputed counter or rollup (core.counters,
+orders.sales, inventory.kpis), so building the summary is a handful of
+indexed reads however big the ledger and order tables get. The result is
+also cached for DASHBOARD_CACHE_TTL seconds.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from inventory import kpis
+from orders import sales
+from . import counters
+
+CACHE_KEY = 'dashboard:summary'
+WEEK_DAYS = 7
+TOP_SKUS = 10
+
+
+def build_summary():
+    today = timezone.localdate()
+    values = counters.values(sales.OPEN_ORDERS, kpis.STOCK_VALUE, kpis.LOW_STOCK)
+    today_orders, today_sales = sales.sales_since(today)
+    week_orders, week_sales = sales.sales_since(today - timedelta(days=WEEK_DAYS - 1))
+    return {
+        'generated_at': timezone.now(),
+        'today': {'orders': today_orders, 'sales': today_sales},
+        'last_7_days': {'orders': week_orders, 'sales': week_sales},
+        'open_orders': int(values[sales.OPEN_ORDERS]),
+        'low_stock': {'count': int(values[kpis.LOW_STOCK]), 'threshold': settings.LOW_STOCK_THRESHOLD},
+        'stock_value': values[kpis.STOCK_VALUE],
+        'top_skus_today': [
+            {'id': row['product_id'], 'sku': row['product__sku'], 'name': row['product__name'],
+             'quantity': row['quantity'], 'amount': row['amount']}
+            for row in sales.top_products(today, TOP_SKUS)
+        ],
+    }
+
+
+def summary():
+    cache = caches['catalog']
+    data = cache.get(CACHE_KEY)
+    if data is None:
+        data = build_summary()
+        cache.set(CACHE_KEY, data, settings.DASHBOARD_CACHE_TTL)
+    return data
+
+
+def rebuild():
+    """Recompute every dashboard counter and rollup (after bulk loads)."""
+    sales.rebuild_sales()
+    kpis.rebuild_stock_kpis()
+    caches['catalog'].delete(CACHE_KEY)
+
+
+class DashboardSummaryView(APIView):
+    """Today's sales, open orders, low stock, stock value and top SKUs in one response."""
+
+    def get(self, request):
+        return Response(summary())
@@ -0,0 +1,65 @@
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def is_lock_error(exc):
+    """True if ``exc`` is SQLite giving up on the write lock."""
+    message = str(exc).lower()
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def retry_on_lock(func=None, *, using=DEFAULT_DB_ALIAS, retries=None, backoff=0.05):
+    """
+    Run ``func`` inside ``transaction.atomic`` and re-run it when SQLite reports
+    the database is locked (busy timeout exceeded under heavy write contention).
+
+    Only the outermost transaction is retried: inside an existing atomic block the
+    error is re-raised so the caller that owns the transaction can handle it.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            max_retries = settings.SQLITE_LOCK_RETRIES if retries is None else retries
+            attempt = 0
+            while True:
+                try:
+                    with transaction.atomic(using=using):
+                        return fn(*args, **kwargs)
+                except OperationalError as exc:
+                    if (
+                        attempt >= max_retries
+                        or not is_lock_error(exc)
+                        or connections[using].in_atomic_block
+                    ):
+                        raise
+                    # Exponential backoff with jitter so the workers don't retry in lockstep
+                    delay = backoff * (2 ** attempt) * (1 + random.random())
+                    attempt += 1
+                    logger.warning('Database locked in %s, retry %d/%d in %.2fs',
+                                   fn.__qualname__, attempt, max_retries, delay)
+                    time.sleep(delay)
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+class RetryOnLockMixin:
+    """ViewSet mixin that runs create/update/destroy through :func:`retry_on_lock`."""
+
+    def perform_create(self, serializer):
+        retry_on_lock(super().perform_create)(serializer)
+
+    def perform_update(self, serializer):
+        retry_on_lock(super().perform_update)(serializer)
+
+    def perform_destroy(self, instance):
+        retry_on_lock(super().perform_destroy)(instance)
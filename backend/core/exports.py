@@ -0,0 +1,217 @@
+"""
+Streaming CSV / NDJSON exports.
+
+Rows are pulled from the database in chunks (``queryset.iterator``) and
+encoded chunk by chunk into a StreamingResponse, so memory stays flat no
+matter how many rows there are and the first bytes go out immediately, under
+WSGI and ASGI alike.
+Optionally gzipped on the fly.
+"""
+import csv
+import io
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse, QueryDict
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_GET
+
+from . import jobs
+from .serialization import StreamingResponse, dumps
+from .views import api_auth, job_accepted
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+CHUNK_ROWS = 2000
+# name -> (queryset_factory, filter_func, exporter), see register()
+EXPORTS = {}
+
+
+def csv_chunks(header, rows, chunk_rows=CHUNK_ROWS):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(records, chunk_rows=CHUNK_ROWS):
+    lines = []
+    for record in records:
+        lines.append(dumps(record))
+        if len(lines) >= chunk_rows:
+            yield b'\n'.join(lines) + b'\n'
+            lines = []
+    if lines:
+        yield b'\n'.join(lines) + b'\n'
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(chunks, fmt, filename, compress=False):
+    filename = f"{filename}-{timezone.localdate():%Y%m%d}.{fmt}"
+    content_type = FORMATS[fmt]
+    if compress:
+        chunks = gzip_chunks(chunks)
+        content_type = 'application/gzip'
+        filename += '.gz'
+    response = StreamingResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Don't let nginx buffer the whole export before passing it on
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def local_row(row):
+    """Datetimes in local time (what the accountants see in the admin), the rest as-is."""
+    return tuple(timezone.localtime(v).isoformat() if isinstance(v, datetime) else v for v in row)
+
+
+def queryset_rows(queryset, lookups):
+    """Tuples for ``lookups`` (fields or ``fk__field`` paths), streamed in chunks."""
+    for row in queryset.values_list(*lookups).iterator(chunk_size=CHUNK_ROWS):
+        yield local_row(row)
+
+
+def export_rows(header, rows, params, filename):
+    """Stream row tuples (already in export form) as CSV/NDJSON."""
+    if params.format == 'csv':
+        chunks = csv_chunks(header, rows)
+    else:
+        chunks = ndjson_chunks(dict(zip(header, row)) for row in rows)
+    return export_response(chunks, params.format, filename, params.compress)
+
+
+def export_queryset(queryset, columns, params, filename):
+    """Stream ``queryset`` as CSV/NDJSON; ``columns`` is [(header, lookup), ...]."""
+    header = [name for name, _ in columns]
+    rows = queryset_rows(queryset, [lookup for _, lookup in columns])
+    return export_rows(header, rows, params, filename)
+
+
+class ExportParams:
+    """Common query parameters: ?format=csv|ndjson&gzip=1&from=&to=."""
+
+    def __init__(self, params):
+        self.format = params.get('format', 'csv')
+        if self.format not in FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+        self.compress = params.get('gzip') in ('1', 'true')
+        self.start = self._parse_bound(params.get('from'), end=False)
+        self.end = self._parse_bound(params.get('to'), end=True)
+
+    @staticmethod
+    def _parse_bound(value, end):
+        """A datetime, or a date meaning the whole day (``to`` is inclusive)."""
+        if not value:
+            return None
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(f'Invalid date: {value}')
+            moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+    def filter_dates(self, queryset, field='created_at'):
+        # Plain range on the column so the (…, created_at) indexes are used
+        if self.start:
+            queryset = queryset.filter(**{f'{field}__gte': self.start})
+        if self.end:
+            queryset = queryset.filter(**{f'{field}__lt': self.end})
+        return queryset
+
+
+def register(name, queryset_factory, filter_func, exporter):
+    """Make an export available to export_view() and to background jobs under ``name``."""
+    EXPORTS[name] = (queryset_factory, filter_func, exporter)
+    return name
+
+
+def _prepare(name, query):
+    queryset_factory, filter_func, exporter = EXPORTS[name]
+    params = ExportParams(query)
+    return exporter, filter_func(queryset_factory(), params, query), params
+
+
+def export_view(name):
+    """
+    GET view streaming the registered export ``name``, filtered by the query
+    string. With ?background=1 the file is written by a job instead (202 and
+    the job; download it from the jobs API when done; signed-in users only).
+    Bad parameters answer 400 in DRF's error shape.
+    """
+    @require_GET
+    @api_auth
+    def view(request):
+        try:
+            exporter, queryset, params = _prepare(name, request.GET)
+        except (ValueError, ValidationError) as exc:
+            return JsonResponse({'detail': str(exc)}, status=400)
+        if request.GET.get('background') in ('1', 'true'):
+            # Only the user who started a job can fetch it (core.views.JobViewSet)
+            if not request.user.is_authenticated:
+                return JsonResponse({'detail': 'Sign in to run an export in the background.'}, status=401)
+            query = {key: request.GET.getlist(key) for key in request.GET if key != 'background'}
+            return job_accepted(jobs.enqueue('core.export', {'export': name, 'query': query}, user=request.user))
+        return exporter(queryset, params)
+    return view
+
+
+@jobs.task('core.export')
+def run_export(job, progress):
+    query = QueryDict(mutable=True)
+    for key, values in job.payload['query'].items():
+        query.setlist(key, values)
+    exporter, queryset, params = _prepare(job.payload['export'], query)
+    response = exporter(queryset, params)
+    filename = response['Content-Disposition'].split('filename=', 1)[1].strip('"')
+    path = jobs.job_file(job, filename)
+    written = 0
+    try:
+        with open(path, 'wb') as out:
+            for chunk in response.streaming_content:
+                out.write(chunk)
+                written += len(chunk)
+                progress(written, message=f'{written / 1e6:.1f} MB written')
+    except BaseException:
+        # Cancelled or failed: no half-written file left behind
+        path.unlink(missing_ok=True)
+        raise
+    return {'file': path.name, 'bytes': written}
+
+
+def export_actions(exporter):
+    """Admin actions exporting the selected rows (or all filtered rows) with ``exporter``."""
+    def make(fmt, compress, description):
+        def action(modeladmin, request, queryset):
+            return exporter(queryset, ExportParams({'format': fmt, 'gzip': '1' if compress else ''}))
+        action.__name__ = f"export_{fmt}{'_gz' if compress else ''}"
+        action.short_description = description
+        return action
+    return [
+        make('csv', False, 'Export selected as CSV'),
+        make('csv', True, 'Export selected as CSV (gzip)'),
+        make('ndjson', False, 'Export selected as NDJSON'),
+    ]
@@ -0,0 +1,304 @@
+"""
+Background jobs kept in the database (core.models.Job), no broker.
+
+Handlers are registered with @task('app.name') and called as
+``handler(job, progress)``; whatever they return (JSON) becomes the job's
+result. enqueue() stores a job and returns it straight away; `manage.py
+run_workers` runs a pool of threads or processes that claim jobs and run
+them.
+
+Claiming is a compare-and-set UPDATE (queued -> running) inside a write
+transaction, with SKIP LOCKED where the database has it, so two workers
+never get the same job. The worker holds a lease it extends from a
+heartbeat thread; if the worker dies, reap() puts the job back in the queue
+once the lease has run out. Failed jobs are retried with a growing delay
+until max_attempts.
+
+Apps keep their handlers in a ``jobs`` module, imported at startup
+(core.apps).
+"""
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import profiling
+from .db import retry_on_lock
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+FINISHED = ('done', 'failed', 'cancelled')
+# Queued jobs looked at per claim; the first one still queued wins
+CLAIM_CANDIDATES = 5
+# Seconds between progress writes
+REPORT_EVERY = 1.0
+
+
+class Cancelled(Exception):
+    """Raised from progress() when the job was cancelled (or its lease lost) meanwhile."""
+
+
+def task(name):
+    def decorator(func):
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, priority=0, user=None, max_attempts=None, run_after=None):
+    if name not in TASKS:
+        raise ValueError(f"Unknown job '{name}'")
+    fields = {'max_attempts': max_attempts} if max_attempts else {}
+    return Job.objects.create(
+        name=name, payload=payload or {}, priority=priority, run_after=run_after,
+        created_by=user if user is not None and user.is_authenticated else None, **fields,
+    )
+
+
+def cancel(job_ids):
+    """Cancel queued or running jobs; running ones stop at their next progress report."""
+    return Job.objects.filter(pk__in=job_ids).exclude(status__in=FINISHED).update(
+        status='cancelled', finished_at=timezone.now(), locked_by='', locked_until=None,
+    )
+
+
+def retry(job_ids):
+    """Queue failed or cancelled jobs again, with a fresh set of attempts."""
+    return Job.objects.filter(pk__in=job_ids, status__in=('failed', 'cancelled')).update(
+        status='queued', attempts=0, run_after=None, error='', message='', finished_at=None,
+        progress_done=0, progress_total=None,
+    )
+
+
+def worker_name(index):
+    return f'{socket.gethostname()}:{os.getpid()}:{index}'
+
+
+def _ready(names):
+    now = timezone.now()
+    jobs = Job.objects.filter(status='queued').filter(Q(run_after__isnull=True) | Q(run_after__lte=now))
+    return jobs.filter(name__in=names) if names else jobs
+
+
+@retry_on_lock
+def _claim(worker, names):
+    now = timezone.now()
+    candidates = _ready(names).order_by('-priority', 'id')
+    if connection.features.has_select_for_update_skip_locked:
+        candidates = candidates.select_for_update(skip_locked=True)
+    for pk in candidates.values_list('pk', flat=True)[:CLAIM_CANDIDATES]:
+        claimed = Job.objects.filter(pk=pk, status='queued').update(
+            status='running', locked_by=worker, locked_until=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+            attempts=F('attempts') + 1, started_at=now, message='',
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def claim(worker, names=None):
+    """The next job for ``worker`` (marked running), or None."""
+    # A plain read first: idle workers shouldn't take the write lock every poll
+    if not _ready(names).exists():
+        return None
+    return _claim(worker, names)
+
+
+def reap():
+    """Requeue (or fail) running jobs whose worker stopped extending the lease."""
+    now = timezone.now()
+    lost = Job.objects.filter(status='running', locked_until__lt=now)
+    failed = lost.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', error='Worker lost', finished_at=now, locked_by='', locked_until=None,
+    )
+    requeued = lost.update(status='queued', message='Worker lost, requeued', locked_by='', locked_until=None)
+    return requeued, failed
+
+
+def job_file(job, filename):
+    """Where a job writes a file it produces (served by the jobs API)."""
+    directory = Path(settings.JOB_FILES_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f'{job.pk}-{filename}'
+
+
+def purge(days=None):
+    """Delete finished jobs (and their files) older than ``days`` (JOB_KEEP_DAYS)."""
+    days = settings.JOB_KEEP_DAYS if days is None else days
+    old = Job.objects.filter(status__in=FINISHED, finished_at__lt=timezone.now() - timedelta(days=days))
+    for result in old.exclude(result=None).values_list('result', flat=True).iterator():
+        if isinstance(result, dict) and result.get('file'):
+            Path(settings.JOB_FILES_DIR, result['file']).unlink(missing_ok=True)
+    return old.delete()[0]
+
+
+class Progress:
+    """
+    Passed to handlers: ``progress(done, total=None, message=None)``. Only
+    notes the values; the heartbeat writes them from its own connection, so
+    reporting never touches the handler's transaction or open cursors.
+    Raises Cancelled once the job is no longer ours to run.
+    """
+
+    def __init__(self, heartbeat):
+        self.heartbeat = heartbeat
+
+    def __call__(self, done, total=None, message=None):
+        if self.heartbeat.lost.is_set():
+            raise Cancelled()
+        fields = {'progress_done': done}
+        if total is not None:
+            fields['progress_total'] = total
+        if message is not None:
+            fields['message'] = message[:255]
+        self.heartbeat.report(fields)
+
+
+class Heartbeat(threading.Thread):
+    """
+    Runs beside the handler: writes reported progress (at most every
+    REPORT_EVERY seconds) and extends the lease, and sets ``lost`` if the job
+    was cancelled or taken over meanwhile.
+    """
+
+    def __init__(self, job, worker):
+        super().__init__(name=f'heartbeat-{job.pk}', daemon=True)
+        self.job = job
+        self.worker = worker
+        self.stopped = threading.Event()
+        self.lost = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def report(self, fields):
+        with self._lock:
+            self._pending.update(fields)
+
+    def run(self):
+        lease = settings.JOB_LEASE_SECONDS
+        extended = time.monotonic()
+        try:
+            while not self.lost.is_set():
+                stopping = self.stopped.wait(REPORT_EVERY)
+                with self._lock:
+                    fields, self._pending = self._pending, {}
+                due = time.monotonic() - extended >= lease / 3
+                if not fields and not due:
+                    if stopping:
+                        return
+                    continue
+                try:
+                    if not Job.objects.filter(pk=self.job.pk, status='running', locked_by=self.worker).update(
+                        locked_until=timezone.now() + timedelta(seconds=lease), **fields,
+                    ):
+                        self.lost.set()
+                    extended = time.monotonic()
+                except Exception:
+                    # Most likely the handler holding SQLite's write lock; try again next beat
+                    logger.warning('Could not update job %s', self.job.pk, exc_info=True)
+                    self.report(fields)
+                if stopping:
+                    return
+        finally:
+            connection.close()
+
+
+def _finish(job, worker, **fields):
+    return Job.objects.filter(pk=job.pk, status='running', locked_by=worker).update(
+        locked_by='', locked_until=None, **fields,
+    )
+
+
+def run(job, worker):
+    """Run a claimed job and record how it went."""
+    handler = TASKS.get(job.name)
+    heartbeat = Heartbeat(job, worker)
+    heartbeat.start()
+    started = time.monotonic()
+    result = error = None
+    capture = None
+    if settings.PROFILER_JOBS and ('*' in settings.PROFILER_JOBS or job.name in settings.PROFILER_JOBS):
+        capture = profiling.start('job', job.name)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for '{job.name}'")
+        result = handler(job, Progress(heartbeat))
+    except Cancelled:
+        logger.info('Job %s (%s) cancelled', job.pk, job.name)
+        return
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Job %s (%s) failed, attempt %d/%d', job.pk, job.name, job.attempts, job.max_attempts)
+    finally:
+        # Last progress written before the outcome
+        heartbeat.stopped.set()
+        heartbeat.join()
+        if capture is not None:
+            capture.stop()
+            capture.meta.update(job=job.pk, attempt=job.attempts, failed=error is not None)
+            capture.save()
+
+    now = timezone.now()
+    if error is None:
+        if _finish(job, worker, status='done', result=result, finished_at=now, error='',
+                   progress_done=Coalesce(F('progress_total'), F('progress_done'))):
+            logger.info('Job %s (%s) done in %.1fs', job.pk, job.name, time.monotonic() - started)
+    elif job.attempts < job.max_attempts:
+        delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+        _finish(job, worker, status='queued', error=error, run_after=now + timedelta(seconds=delay),
+                message=f'Attempt {job.attempts} failed, retrying')
+    else:
+        _finish(job, worker, status='failed', error=error, finished_at=now)
+
+
+def work(index, names=None, stop=None, burst=False):
+    """
+    One worker: claim and run jobs until ``stop`` is set (a threading or
+    multiprocessing Event), or the queue is empty when ``burst``.
+    """
+    worker = worker_name(index)
+    stop = stop or threading.Event()
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                job = claim(worker, names)
+            except Exception:
+                logger.exception('Claiming a job failed')
+                job = None
+            if job is None:
+                if burst:
+                    return
+                stop.wait(settings.JOB_POLL_SECONDS)
+                continue
+            try:
+                run(job, worker)
+            except Exception:
+                # Recording the outcome failed; the lease runs out and reap() requeues the job
+                logger.exception('Job %s (%s) could not be finished', job.pk, job.name)
+    finally:
+        connection.close()
+
+
+def work_in_process(index, names=None, stop=None, burst=False):
+    """work() as the target of a worker process (`run_workers --processes`)."""
+    import django
+    django.setup()
+    # Never reuse a connection inherited from the parent process
+    connections.close_all()
+    # Ctrl-C reaches the whole process group; the parent decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work(index, names, stop, burst)
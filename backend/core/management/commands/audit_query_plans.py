@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.query_plans import analyze, autodiscover
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN the registered hot querysets (hot_queries.py in each app), flag full '
+            'table scans and temp B-tree sorts, and suggest composite indexes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Only audit these registry names (prefix match)')
+        parser.add_argument('--database', default=None, help='Database alias to explain against')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not just flagged ones')
+        parser.add_argument('--fail', action='store_true', help='Exit non-zero when anything is flagged (for CI)')
+
+    def handle(self, *args, **options):
+        flagged = 0
+        for name, factory in autodiscover().items():
+            if options['names'] and not any(name.startswith(n) for n in options['names']):
+                continue
+            queryset = factory()
+            if options['database']:
+                queryset = queryset.using(options['database'])
+            report = analyze(name, queryset)
+
+            if report.ok:
+                self.stdout.write(self.style.SUCCESS(f'OK    {name}'))
+            else:
+                flagged += 1
+                problems = [f'full scan of {t}' for t in report.full_scans]
+                problems += [f'temp B-tree for {s}' for s in report.temp_sorts]
+                self.stdout.write(self.style.WARNING(f'FLAG  {name}: ' + ', '.join(problems)))
+                if report.suggestion:
+                    model = queryset.model.__name__
+                    self.stdout.write(f"      suggest on {model}: models.Index(fields={report.suggestion!r})")
+            if options['verbose_plans'] or not report.ok:
+                for line in report.plan.splitlines():
+                    self.stdout.write(f'        {line}')
+
+        summary = f'{flagged} flagged'
+        if flagged and options['fail']:
+            raise CommandError(summary)
+        self.stdout.write(summary)
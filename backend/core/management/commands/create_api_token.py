@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import APIToken, User
+
+# Keys given with --key; ours are 47 characters of randomness
+MIN_KEY_LENGTH = 32
+
+
+class Command(BaseCommand):
+    help = 'Issue an API token for a user and print the key (it is only stored hashed).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--name', default='api', help="What will use the token, e.g. 'sync-engine'")
+        parser.add_argument('--days', type=int, help='Expire after this many days (default: never)')
+        parser.add_argument('--key', help='Use this key instead of a new one (e.g. $ERP_API_TOKEN, shared with the sync engine)')
+        parser.add_argument('--if-missing', action='store_true', help='Do nothing if a token with this key exists')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist.")
+        key = options['key']
+        if key is not None:
+            if len(key) < MIN_KEY_LENGTH:
+                raise CommandError(f'The key must be at least {MIN_KEY_LENGTH} characters of randomness.')
+            existing = APIToken.objects.filter(key_hash=APIToken.hash_key(key)).first()
+            if existing is not None:
+                if options['if_missing']:
+                    self.stderr.write(f'Token "{existing.name}" for {existing.user.username} already exists.')
+                    return
+                raise CommandError(f'Token "{existing.name}" already has this key.')
+        expires_at = timezone.now() + timedelta(days=options['days']) if options['days'] else None
+        token, key = APIToken.issue(user, options['name'], expires_at, key=key)
+        self.stderr.write(f'Token "{token.name}" for {user.username} created; set ERP_API_TOKEN to:')
+        self.stdout.write(key)
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import counters
+from core.dashboard import build_summary, rebuild
+from core.models import Counter
+
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard counters and sales rollups (after bulk loads, or once after upgrading).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--if-empty', action='store_true', help='Do nothing if the counters already exist')
+        parser.add_argument('--check', action='store_true',
+                            help='Only compare the incremental values with a fresh recompute')
+        parser.add_argument('--fold', action='store_true',
+                            help='Only fold the pending counter deltas into the counters (cheap; fine to run from cron)')
+
+    def handle(self, *args, **options):
+        if options['if_empty'] and Counter.objects.exists():
+            self.stdout.write('Dashboard counters already in place.')
+            return
+        if options['check']:
+            return self.check_drift()
+        if options['fold']:
+            folded = counters.fold()
+            self.stdout.write(self.style.SUCCESS(f'{folded} counter deltas folded.'))
+            return
+        start = time.perf_counter()
+        rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Dashboard rebuilt in {time.perf_counter() - start:.1f}s.'))
+
+    def check_drift(self):
+        live = build_summary()
+        # Recompute inside a transaction that is rolled back
+        with transaction.atomic():
+            rebuild()
+            fresh = build_summary()
+            transaction.set_rollback(True)
+        drift = [key for key in live if key != 'generated_at' and live[key] != fresh[key]]
+        for key in drift:
+            self.stdout.write(self.style.WARNING(f'  {key}: {live[key]} (recomputed: {fresh[key]})'))
+        self.stdout.write(f'{len(drift)} KPIs drifted.' if drift else self.style.SUCCESS('Counters match a full recompute.'))
@@ -0,0 +1,80 @@
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core import jobs
+
+logger = logging.getLogger(__name__)
+
+# Seconds between looks for jobs whose worker died, and between purges of old jobs
+REAP_EVERY = 30
+PURGE_EVERY = 3600
+
+
+class Command(BaseCommand):
+    help = ('Run background jobs (core.jobs) with a pool of worker threads or processes. '
+            'SIGTERM/Ctrl-C stop it once the running jobs finish.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Pool size (default: JOB_WORKERS)')
+        parser.add_argument('--processes', action='store_true',
+                            help='Worker processes instead of threads (CPU-bound jobs)')
+        parser.add_argument('--task', action='append', dest='tasks', metavar='NAME',
+                            help='Only run jobs with this name (repeatable)')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        count = options['workers'] or settings.JOB_WORKERS
+        names = options['tasks']
+        unknown = set(names or ()) - set(jobs.TASKS)
+        if unknown:
+            raise CommandError(f"Unknown job(s): {', '.join(sorted(unknown))}; known: {', '.join(sorted(jobs.TASKS))}")
+        burst = options['burst']
+
+        if options['processes']:
+            stop = multiprocessing.Event()
+            connections.close_all()
+            pool = [multiprocessing.Process(target=jobs.work_in_process, args=(i, names, stop, burst),
+                                            name=f'job-worker-{i}') for i in range(count)]
+        else:
+            stop = threading.Event()
+            pool = [threading.Thread(target=jobs.work, args=(i, names, stop, burst), name=f'job-worker-{i}')
+                    for i in range(count)]
+
+        def shutdown(signum, frame):
+            if not stop.is_set():
+                self.stdout.write('Stopping once the running jobs finish...')
+                stop.set()
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        kind = 'processes' if options['processes'] else 'threads'
+        self.stdout.write(f"{count} worker {kind} for {', '.join(names) if names else 'all jobs'}.")
+        for worker in pool:
+            worker.start()
+
+        last_reap = last_purge = 0.0
+        while True:
+            alive = [worker for worker in pool if worker.is_alive()]
+            if not alive:
+                break
+            now = time.monotonic()
+            try:
+                if now - last_reap >= REAP_EVERY:
+                    last_reap = now
+                    requeued, failed = jobs.reap()
+                    if requeued or failed:
+                        logger.warning('Lost workers: %d job(s) requeued, %d failed', requeued, failed)
+                if now - last_purge >= PURGE_EVERY:
+                    last_purge = now
+                    jobs.purge()
+            except Exception:
+                logger.exception('Job housekeeping failed')
+            alive[0].join(timeout=1)
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
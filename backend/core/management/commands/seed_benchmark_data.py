@@ -0,0 +1,240 @@
+import contextlib
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from contacts.matching import rebuild_keys as rebuild_match_keys
+from contacts.models import Contact
+from core import changes
+from core.cache import bump_version
+from core.dashboard import rebuild as rebuild_dashboard
+from core.models import User
+from inventory.balances import rebuild_balances
+from inventory.models import ArchivedStockMove, Category, Location, Product, StockMove
+from orders.models import Order, OrderItem
+
+PREFIX = 'BENCH'
+
+
+@contextlib.contextmanager
+def historic_timestamps(*models):
+    """Let bulk_create keep our generated created_at/updated_at instead of now()."""
+    fields = [f for m in models for f in m._meta.concrete_fields if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)]
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic catalog, ledger, contacts and orders for benchmarking (bulk_create).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--moves', type=int, default=2_000_000)
+        parser.add_argument('--contacts', type=int, default=50_000)
+        parser.add_argument('--customers', type=int, default=20_000, help='core.User rows used as Order.customer')
+        parser.add_argument('--orders', type=int, default=200_000)
+        parser.add_argument('--max-items', type=int, default=5, help='Items per order (1..N)')
+        parser.add_argument('--days', type=int, default=730, help='History spread over this many days')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true', help='Delete earlier benchmark rows first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.days = options['days']
+
+        if options['clear']:
+            self.clear()
+        elif Product.objects.filter(sku__startswith=f'{PREFIX}-').exists():
+            raise CommandError('Benchmark data already exists, use --clear to regenerate it.')
+
+        with historic_timestamps(Product, StockMove, Contact, Order):
+            categories = self.step('categories', self.seed_categories, options['categories'])
+            products = self.step('products', self.seed_products, options['products'], categories)
+            locations = self.step('locations', self.seed_locations)
+            self.step('stock moves', self.seed_moves, options['moves'], products, locations)
+            self.step('balances', rebuild_balances)
+            self.step('contacts', self.seed_contacts, options['contacts'])
+            customers = self.step('customers', self.seed_customers, options['customers'])
+            self.step('orders', self.seed_orders, options['orders'], customers, products, options['max_items'])
+            self.step('match keys', rebuild_match_keys)
+
+        # bulk_create sends no signals, so invalidate the catalog cache and
+        # recompute the dashboard counters by hand
+        for model in (Category, Product, StockMove):
+            bump_version(model)
+        rebuild_dashboard()
+        self.stdout.write(self.style.SUCCESS(
+            'Load test with: benchmarks/load_test.py '
+            f"--product-ids {min(products, default=0)}:{max(products, default=0)} "
+            f"--category-ids {min(categories, default=0)}:{max(categories, default=0)} "
+            f"--contacts {options['contacts']} --customers {options['customers']}"
+        ))
+
+    def step(self, label, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        count = result if isinstance(result, int) else len(result)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'{label:<12} {count:>10,} rows in {elapsed:6.1f}s ({count / max(elapsed, 1e-9):,.0f}/s)')
+        return result
+
+    def random_time(self):
+        return self.now - timedelta(seconds=self.rng.randrange(self.days * 86400))
+
+    def bulk(self, model, objects):
+        created = 0
+        for batch in batched(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+            created += len(batch)
+        return created
+
+    def clear(self):
+        self.stdout.write('Clearing earlier benchmark data...')
+        # Rows are deleted one signal at a time; the balance rebuild at the end publishes instead
+        with changes.muted():
+            self._clear()
+        for model in (Category, Product, StockMove):
+            bump_version(model)
+
+    def _clear(self):
+        OrderItem.objects.filter(order__external_id__startswith=f'{PREFIX}-').delete()
+        Order.objects.filter(external_id__startswith=f'{PREFIX}-').delete()
+        StockMove.objects.filter(product__sku__startswith=f'{PREFIX}-').delete()
+        # The archive database has no FK to cascade from
+        product_ids = Product.objects.filter(sku__startswith=f'{PREFIX}-').values_list('id', flat=True)
+        for batch in batched(product_ids.iterator(), 500):
+            ArchivedStockMove.objects.filter(product_id__in=batch).delete()
+        Product.objects.filter(sku__startswith=f'{PREFIX}-').delete()
+        Location.objects.filter(code__startswith=f'{PREFIX}-').delete()
+        Category.objects.filter(name__startswith=f'{PREFIX} ').delete()
+        Contact.objects.filter(email__endswith='@bench.local').delete()
+        User.objects.filter(username__startswith=f'{PREFIX.lower()}-').delete()
+
+    # --- generators ---
+
+    def seed_categories(self, count):
+        Category.objects.bulk_create(
+            [Category(name=f'{PREFIX} Category {i}') for i in range(count)], batch_size=self.batch_size,
+        )
+        return list(Category.objects.filter(name__startswith=f'{PREFIX} ').values_list('id', flat=True))
+
+    def seed_products(self, count, categories):
+        def rows():
+            for i in range(count):
+                cost = Decimal(self.rng.randrange(100, 50_000)) / 100
+                created = self.random_time()
+                yield Product(
+                    sku=f'{PREFIX}-{i:07d}',
+                    barcode=f'29{i:011d}',  # 2x: in-store numbering range
+                    name=f'Benchmark product {i}',
+                    price=(cost * Decimal('1.35')).quantize(Decimal('0.01')),
+                    cost_price=cost,
+                    category_id=self.rng.choice(categories) if categories else None,
+                    is_active=self.rng.random() > 0.05,
+                    created_at=created,
+                    updated_at=created,
+                )
+        self.bulk(Product, rows())
+        return list(Product.objects.filter(sku__startswith=f'{PREFIX}-').values_list('id', flat=True))
+
+    def seed_locations(self):
+        shop, _ = Location.objects.get_or_create(code=f'{PREFIX}-SHOP', defaults={'name': 'Benchmark shop'})
+        warehouse, _ = Location.objects.get_or_create(code=f'{PREFIX}-WH', defaults={'name': 'Benchmark warehouse'})
+        return [shop.id, warehouse.id]
+
+    def seed_moves(self, count, products, locations):
+        def rows():
+            for i in range(count):
+                move_type = self.rng.choices(('purchase', 'sale', 'adjustment', 'return'), (25, 65, 5, 5))[0]
+                quantity = self.rng.randint(1, 20)
+                if move_type == 'sale' or (move_type == 'adjustment' and self.rng.random() < 0.5):
+                    quantity = -quantity
+                yield StockMove(
+                    product_id=self.rng.choice(products),
+                    # Purchases land in the warehouse, everything else at the shop
+                    location_id=locations[1] if move_type == 'purchase' else locations[0],
+                    quantity=quantity,
+                    move_type=move_type,
+                    reference=f'{PREFIX}-MV-{i}',
+                    created_at=self.random_time(),
+                )
+        return self.bulk(StockMove, rows())
+
+    def seed_contacts(self, count):
+        return self.bulk(Contact, (
+            Contact(
+                name=f'Bench Contact {i}',
+                email=f'contact{i}@bench.local',
+                phone=f'+9715{self.rng.randrange(10_000_000, 99_999_999)}',
+                is_customer=self.rng.random() > 0.1,
+                is_vendor=self.rng.random() < 0.1,
+                created_at=self.random_time(),
+            )
+            for i in range(count)
+        ))
+
+    def seed_customers(self, count):
+        # Unusable password: no hashing cost, and these accounts can't log in
+        self.bulk(User, (
+            User(username=f'{PREFIX.lower()}-{i}', email=f'customer{i}@bench.local', password='!')
+            for i in range(count)
+        ))
+        return list(User.objects.filter(username__startswith=f'{PREFIX.lower()}-').values_list('id', flat=True))
+
+    def seed_orders(self, count, customers, products, max_items):
+        prices = dict(Product.objects.filter(id__in=products).values_list('id', 'price'))
+        statuses = ('pending', 'processing', 'completed', 'cancelled')
+        created = 0
+        for start in range(0, count, self.batch_size):
+            orders, items = [], []
+            for i in range(start, min(start + self.batch_size, count)):
+                lines = []
+                for product_id in self.rng.sample(products, self.rng.randint(1, min(max_items, len(products)))):
+                    quantity = self.rng.randint(1, 4)
+                    lines.append((product_id, quantity, prices[product_id], prices[product_id] * quantity))
+                timestamp = self.random_time()
+                orders.append(Order(
+                    external_id=f'{PREFIX}-{i}',
+                    customer_id=self.rng.choice(customers),
+                    status=self.rng.choices(statuses, (5, 10, 80, 5))[0],
+                    total_amount=sum(line[3] for line in lines),
+                    created_at=timestamp,
+                    updated_at=timestamp,
+                ))
+                items.append(lines)
+            with transaction.atomic():
+                Order.objects.bulk_create(orders, batch_size=self.batch_size)
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, product_id=p, quantity=q, unit_price=price, subtotal=subtotal)
+                    for order, lines in zip(orders, items)
+                    for p, q, price, subtotal in lines
+                ], batch_size=self.batch_size)
+            created += len(orders)
+        return created
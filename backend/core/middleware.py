@@ -0,0 +1,196 @@
+import logging
+import random
+import secrets
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from . import profiling
+from .queries import collect_queries
+from .routers import REPLICA, _pinned, _wrote
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'erp_primary_until'
+
+
+class PrimaryPinningMiddleware:
+    """
+    Scopes core.routers pinning to one request. Unsafe methods are pinned up
+    front (they usually read before they write), and after a write the client
+    gets a short-lived cookie so the redirect that follows (admin save, API
+    create-then-fetch) is also served by the primary.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if REPLICA not in settings.DATABASES:
+            return self.get_response(request)
+        tokens = self._start(request)
+        try:
+            return self._finish(self.get_response(request))
+        finally:
+            self._reset(tokens)
+
+    async def __acall__(self, request):
+        if REPLICA not in settings.DATABASES:
+            return await self.get_response(request)
+        tokens = self._start(request)
+        try:
+            return self._finish(await self.get_response(request))
+        finally:
+            self._reset(tokens)
+
+    def _start(self, request):
+        pinned = request.method not in ('GET', 'HEAD', 'OPTIONS') or self._cookie_pinned(request)
+        return _pinned.set(pinned), _wrote.set(False)
+
+    def _finish(self, response):
+        if _wrote.get() and settings.REPLICA_PIN_SECONDS:
+            response.set_cookie(
+                PIN_COOKIE,
+                str(int(time.time()) + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    @staticmethod
+    def _reset(tokens):
+        pinned_token, wrote_token = tokens
+        _pinned.reset(pinned_token)
+        _wrote.reset(wrote_token)
+
+    @staticmethod
+    def _cookie_pinned(request):
+        try:
+            return int(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+
+class QueryCountMiddleware:
+    """
+    Opt-in (settings.QUERY_INSPECTOR) per-request SQL accounting.
+
+    Adds ``X-DB-Queries`` and a ``Server-Timing`` db entry to every response,
+    logs requests over the query-count or DB-time thresholds, and reports
+    query shapes repeated QUERY_INSPECTOR_N1_THRESHOLD times or more as
+    N+1 suspects.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with collect_queries() as collector:
+            response = self.get_response(request)
+        return self._report(request, response, collector)
+
+    async def __acall__(self, request):
+        with collect_queries() as collector:
+            response = await self.get_response(request)
+        return self._report(request, response, collector)
+
+    def _report(self, request, response, collector):
+        db_ms = collector.duration * 1000
+        suspects = collector.duplicates(settings.QUERY_INSPECTOR_N1_THRESHOLD)
+        response['X-DB-Queries'] = str(collector.count)
+        if suspects:
+            response['X-DB-N1-Suspects'] = str(len(suspects))
+        response['Server-Timing'] = f'db;dur={db_ms:.1f};desc="{collector.count} queries"'
+
+        if (collector.count > settings.QUERY_INSPECTOR_LOG_QUERIES
+                or db_ms > settings.QUERY_INSPECTOR_LOG_MS):
+            logger.warning('%s %s: %d queries, %.1f ms in the database',
+                           request.method, request.path, collector.count, db_ms)
+        for sql, count in suspects:
+            logger.warning('Possible N+1 on %s %s: %d x %s',
+                           request.method, request.path, count, sql)
+        return response
+
+
+class ProfilerMiddleware:
+    """
+    Opt-in (settings.PROFILER) profiles of sampled or asked-for requests
+    (core.profiling). A profiled response carries ``X-Profile-Id``; every
+    other request pays one random() call.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        wanted = self._wanted(request)
+        if wanted is None:
+            wanted = request.user.is_staff
+        capture = self._start(request) if wanted else None
+        if capture is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            capture.stop()
+        capture.meta['status'] = response.status_code
+        return self._finish(response, capture.save())
+
+    async def __acall__(self, request):
+        wanted = self._wanted(request)
+        if wanted is None:
+            wanted = (await request.auser()).is_staff
+        capture = self._start(request) if wanted else None
+        if capture is None:
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            capture.stop()
+        capture.meta['status'] = response.status_code
+        return self._finish(response, await sync_to_async(capture.save)())
+
+    @staticmethod
+    def _wanted(request):
+        """Whether to profile the request; None when it's up to the session user being staff."""
+        header = request.headers.get('X-Profile')
+        if header is not None:
+            if settings.PROFILER_TOKEN:
+                return secrets.compare_digest(header, settings.PROFILER_TOKEN)
+            return None
+        if random.random() >= settings.PROFILER_SAMPLE_RATE:
+            return False
+        return not settings.PROFILER_PATHS or request.path.startswith(tuple(settings.PROFILER_PATHS))
+
+    @staticmethod
+    def _start(request):
+        return profiling.start('request', f'{request.method} {request.path}', request.headers.get('X-Profile-Mode'))
+
+    @staticmethod
+    def _finish(response, profile):
+        if profile is not None:
+            response['X-Profile-Id'] = str(profile.pk)
+        return response
@@ -1,4 +1,8 @@
+import hashlib
+import secrets
+
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 class User(AbstractUser):
@@ -8,3 +12,171 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.username
+
+class APIToken(models.Model):
+    """
+    API key for machine clients (sync engine, import scripts).
+
+    Only a SHA-256 digest of the key is stored. The key is 256 random bits,
+    so a fast hash is enough here and auth costs microseconds instead of a
+    PBKDF2 run per request.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_tokens')
+    name = models.CharField(max_length=100, help_text="What uses this token, e.g. 'sync-engine'")
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    prefix = models.CharField(max_length=12, editable=False, help_text="First characters of the key, to recognise it")
+    is_active = models.BooleanField(default=True)
+    expires_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(blank=True, null=True, editable=False)
+
+    KEY_PREFIX = 'erp_'
+
+    def __str__(self):
+        return f"{self.name} ({self.prefix}…)"
+
+    @staticmethod
+    def hash_key(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def set_new_key(self, key=None):
+        """Generate a key (or take ``key``), store its hash and return the key (shown once, never stored)."""
+        key = key or self.KEY_PREFIX + secrets.token_urlsafe(32)
+        self.key_hash = self.hash_key(key)
+        self.prefix = key[:12]
+        return key
+
+    @classmethod
+    def issue(cls, user, name, expires_at=None, key=None):
+        token = cls(user=user, name=name, expires_at=expires_at)
+        key = token.set_new_key(key)
+        token.save()
+        return token, key
+
+class Counter(models.Model):
+    """
+    A running total kept up to date on writes (core.counters), so KPIs such
+    as open orders or stock value are a row read instead of a scan.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+class CounterDelta(models.Model):
+    """
+    A change to a Counter not folded into its row yet (core.counters).
+    Writers insert these instead of updating the one shared row, so they
+    never queue on its lock.
+    """
+    name = models.CharField(max_length=100)
+    value = models.DecimalField(max_digits=16, decimal_places=2)
+
+    class Meta:
+        # Covers the per-name sums of counters.values()
+        indexes = [
+            models.Index(fields=['name', 'value'], name='counterdelta_name_value_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} {self.value:+}"
+
+class ChangeEvent(models.Model):
+    """
+    Short log of catalog, stock and order writes behind the change stream
+    (core.changes). Only the last CHANGE_LOG_SIZE events are kept, enough for
+    a client to resume after a reconnect.
+    """
+    KIND_CHOICES = (
+        ('stock', 'Stock move'),
+        ('product', 'Product'),
+        ('order', 'Order'),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    action = models.CharField(max_length=20, help_text="created, updated, deleted, or a bulk operation")
+    object_id = models.BigIntegerField(null=True, blank=True)
+    # Copied from the product so the stream can filter without joins
+    sku = models.CharField(max_length=50, blank=True)
+    category_id = models.BigIntegerField(null=True, blank=True)
+    data = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} {self.action} {self.object_id or ''}".rstrip()
+
+class Job(models.Model):
+    """
+    A unit of background work (core.jobs), run by `manage.py run_workers`.
+    Workers claim the highest-priority queued job and hold it for a lease
+    they keep extending; a job whose worker died is picked up again once the
+    lease runs out.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    )
+
+    name = models.CharField(max_length=100, help_text="Registered task, e.g. inventory.reprice")
+    payload = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    priority = models.SmallIntegerField(default=0, help_text="Higher runs first")
+    run_after = models.DateTimeField(null=True, blank=True, help_text="Not before this time (retries back off)")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    progress_done = models.BigIntegerField(default=0)
+    progress_total = models.BigIntegerField(null=True, blank=True)
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey('User', on_delete=models.SET_NULL, null=True, blank=True, related_name="jobs")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The claim query: next queued job by priority, then age
+            models.Index(fields=['status', '-priority', 'id'], name='job_claim_idx'),
+            models.Index(fields=['status', 'locked_until'], name='job_lease_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.name} ({self.status})"
+
+    @property
+    def percent(self):
+        if not self.progress_total:
+            return 100 if self.status == 'done' else None
+        return min(100, round(100 * self.progress_done / self.progress_total))
+
+class Profile(models.Model):
+    """A profile of one request, job or sync engine run (core.profiling); the data is in PROFILER_DIR."""
+    KIND_CHOICES = (
+        ('request', 'Request'),
+        ('job', 'Job'),
+        ('sync', 'Sync engine run'),
+    )
+    MODE_CHOICES = (
+        ('sample', 'Stack samples'),
+        ('cprofile', 'cProfile'),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    name = models.CharField(max_length=255, help_text="Method and path, job name or store codes")
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    duration_ms = models.FloatField(null=True, blank=True)
+    file = models.CharField(max_length=255)
+    size = models.PositiveIntegerField(default=0)
+    meta = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.name} ({self.created_at:%Y-%m-%d %H:%M})"
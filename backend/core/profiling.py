@@ -0,0 +1,217 @@
+"""
+Opt-in profiles of single requests, jobs and sync engine runs.
+
+Two modes (PROFILER_MODE):
+
+- ``sample``: a thread looks at the stacks of the process's busy threads
+  every PROFILER_INTERVAL_MS and counts what it sees. Costs next to nothing
+  in the profiled code, so it is the one for production. Saved as folded
+  stacks ("thread;a;b;c 12" per line), which speedscope and flamegraph.pl
+  read.
+- ``cprofile``: every call, timed. Exact call counts, but slows the code
+  down noticeably, and only sees the thread it was started on. Under ASGI
+  that is the event loop, while DRF views run in a worker thread: use it
+  for jobs and async views, the sampler for the rest. Saved as a pstats
+  file (snakeviz, ``python -m pstats``).
+
+Only one profile runs at a time per process; a request that would be
+profiled while another one is simply isn't. The sampler sees every thread,
+so work of other requests running at the same time shows up too, under its
+own thread.
+
+Profiles are kept in PROFILER_DIR, listed in the admin (core.Profile), and
+the oldest go once they add up to more than PROFILER_MAX_MB.
+"""
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+MODES = ('sample', 'cprofile')
+EXTENSIONS = {'sample': 'folded', 'cprofile': 'prof'}
+# Lines in the admin summary
+SUMMARY_LINES = 30
+# Innermost Python frames of a thread that is waiting
+IDLE = {
+    'threading.Condition.wait', 'threading.Thread.join', 'threading.Thread._wait_for_tstate_lock',
+    'selectors.EpollSelector.select', 'selectors.PollSelector.select', 'selectors.KqueueSelector.select',
+    'selectors.SelectSelector.select', 'concurrent.futures.thread._worker', 'socket.socket.accept',
+    'queue.Queue.get',
+}
+
+_busy = threading.Lock()
+
+
+class Sampler(threading.Thread):
+    """Counts the stacks of the busy threads, sampled every ``interval`` seconds."""
+
+    def __init__(self, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}")
+                    frame = frame.f_back
+                # A thread blocked in one of these is waiting, not working
+                if not stack or stack[0] in IDLE:
+                    continue
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class Capture:
+    """One profile being taken: start(), stop(), then save() (which touches the database)."""
+
+    def __init__(self, kind, name, mode=None):
+        self.kind = kind
+        self.name = name[:255]
+        self.mode = mode if mode in MODES else settings.PROFILER_MODE
+        self.meta = {}
+        self.started_at = None
+        self.duration_ms = None
+        self._profiler = self._sampler = None
+        self._start = None
+
+    def start(self):
+        self.started_at = timezone.now()
+        self._start = time.perf_counter()
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = Sampler(settings.PROFILER_INTERVAL_MS / 1000)
+            self._sampler.start()
+        return self
+
+    def stop(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+        else:
+            self._sampler.stopped.set()
+            self._sampler.join()
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        _busy.release()
+
+    def _write(self, path):
+        if self._profiler is not None:
+            self._profiler.dump_stats(path)
+        else:
+            path.write_text(self._sampler.folded())
+
+    def save(self):
+        """Store the profile and its metadata; never raises, the profiled work matters more."""
+        try:
+            return store(self.kind, self.name, self.mode, self._write, self.duration_ms, self.meta)
+        except Exception:
+            logger.exception('Could not save the profile of %s', self.name)
+            return None
+
+
+def start(kind, name, mode=None):
+    """A started Capture, or None while another profile is running."""
+    if not _busy.acquire(blocking=False):
+        return None
+    try:
+        return Capture(kind, name, mode).start()
+    except Exception:
+        _busy.release()
+        raise
+
+
+def store(kind, name, mode, write, duration_ms=None, meta=None):
+    """Save a profile: ``write(path)`` puts the data in the file. Returns the Profile."""
+    directory = Path(settings.PROFILER_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    filename = f'{timezone.now():%Y%m%d-%H%M%S}-{kind}-{uuid.uuid4().hex[:8]}.{EXTENSIONS[mode]}'
+    path = directory / filename
+    write(path)
+    profile = Profile.objects.create(
+        kind=kind, name=name[:255], mode=mode, duration_ms=duration_ms, file=filename,
+        size=path.stat().st_size, meta=meta or {},
+    )
+    prune()
+    return profile
+
+
+def delete(profiles):
+    """Delete profiles and their files."""
+    for filename in profiles.values_list('file', flat=True):
+        Path(settings.PROFILER_DIR, filename).unlink(missing_ok=True)
+    return profiles.delete()[0]
+
+
+def prune(max_bytes=None):
+    """Drop the oldest profiles until the rest fit in PROFILER_MAX_MB."""
+    max_bytes = settings.PROFILER_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    excess = (Profile.objects.aggregate(total=Sum('size'))['total'] or 0) - max_bytes
+    if excess <= 0:
+        return 0
+    oldest = []
+    for pk, size in Profile.objects.order_by('id').values_list('pk', 'size').iterator():
+        if excess <= 0:
+            break
+        oldest.append(pk)
+        excess -= size
+    return delete(Profile.objects.filter(pk__in=oldest))
+
+
+def summary(profile, lines=SUMMARY_LINES):
+    """A text summary of a profile: the top functions by cumulative time (cProfile) or by samples."""
+    path = Path(settings.PROFILER_DIR, profile.file)
+    if not path.exists():
+        return 'The file is gone.'
+    if profile.mode == 'cprofile':
+        out = io.StringIO()
+        pstats.Stats(str(path), stream=out).strip_dirs().sort_stats('cumulative').print_stats(lines)
+        return out.getvalue()
+
+    # Samples a function was on the stack for (total) and at the top of it (self)
+    inclusive, own, total = Counter(), Counter(), 0
+    for line in path.read_text().splitlines():
+        stack, _, count = line.rpartition(' ')
+        frames, count = stack.split(';')[1:], int(count)
+        total += count
+        own[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+    if not total:
+        return 'No samples (the work was shorter than the sampling interval).'
+
+    def table(title, counts):
+        rows = ['', title, '   total    self  function']
+        rows += [f'{inclusive[frame] / total:7.1%} {own[frame] / total:7.1%}  {frame}'
+                 for frame, _ in counts.most_common(lines)]
+        return rows
+
+    # The frames under everything (handlers, middleware) say nothing; leave them out of the totals
+    partial = Counter({frame: count for frame, count in inclusive.items() if count < total})
+    rows = [f'{total} samples, every {settings.PROFILER_INTERVAL_MS:g} ms']
+    rows += table('Where the time is spent', own)
+    rows += table('Functions by time below them', partial)
+    return '\n'.join(rows)
@@ -0,0 +1,76 @@
+"""
+Per-request SQL accounting used by QueryCountMiddleware and core.testing.
+
+A single execute wrapper is installed on every connection; it only does work
+while a collector is active in the current context, which also follows the
+request into sync_to_async threads.
+"""
+import contextlib
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.db import connections
+
+# Active collectors, innermost last; nested blocks (a test budget around a
+# request going through the middleware) all see the same queries
+_collectors = ContextVar('query_collectors', default=())
+
+# "IN (%s, %s, %s)" differs per call only in length; fold it so the shapes compare equal
+_IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+
+
+def sql_template(sql):
+    return _IN_LIST.sub('(%s, ...)', sql)
+
+
+class QueryCollector:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0  # seconds
+        self.templates = Counter()
+
+    def record(self, sql, duration):
+        self.count += 1
+        self.duration += duration
+        self.templates[sql_template(sql)] += 1
+
+    def duplicates(self, threshold):
+        """Query shapes executed at least ``threshold`` times: N+1 suspects."""
+        return [(sql, n) for sql, n in self.templates.most_common() if n >= threshold]
+
+
+def record_query(execute, sql, params, many, context):
+    collectors = _collectors.get()
+    if not collectors:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        for collector in collectors:
+            collector.record(sql, duration)
+
+
+def install(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install_on_connection_created(sender, connection, **kwargs):
+    install(connection)
+
+
+@contextlib.contextmanager
+def collect_queries():
+    """Count every query run in this context, on any database alias."""
+    for connection in connections.all():
+        install(connection)
+    collector = QueryCollector()
+    token = _collectors.set(_collectors.get() + (collector,))
+    try:
+        yield collector
+    finally:
+        _collectors.reset(token)
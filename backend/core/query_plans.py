@@ -0,0 +1,116 @@
+"""
+Registry of the hot querysets behind the viewsets, admin changelists and
+reports, plus the EXPLAIN analysis used by ``manage.py audit_query_plans``.
+
+Each app lists its querysets in a ``hot_queries.py`` module:
+
+    from core.query_plans import register
+
+    register('inventory.stockmove.history', lambda: StockMove.objects.filter(product_id=1).order_by('-created_at'))
+
+The factory is called at audit time, so the lookups only need plausible values.
+"""
+import re
+from dataclasses import dataclass, field
+
+from django.db import connections
+from django.db.models.lookups import Exact, In, IsNull
+from django.utils.module_loading import autodiscover_modules
+
+_registry = {}
+
+
+def register(name, factory):
+    _registry[name] = factory
+
+
+def autodiscover():
+    autodiscover_modules('hot_queries')
+    return dict(sorted(_registry.items()))
+
+
+# Plan lines that mean "reads the whole table" or "sorts after the fact"
+SQLITE_FULL_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)\b(?! USING)')
+SQLITE_TEMP_SORT = re.compile(r'USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)')
+PG_FULL_SCAN = re.compile(r'Seq Scan on (\w+)')
+PG_SORT = re.compile(r'^\s*(?:->\s*)?Sort\b', re.MULTILINE)
+
+
+@dataclass
+class PlanReport:
+    name: str
+    plan: str
+    full_scans: list = field(default_factory=list)
+    temp_sorts: list = field(default_factory=list)
+    suggestion: list = field(default_factory=list)  # field names for a composite index
+
+    @property
+    def ok(self):
+        return not (self.full_scans or self.temp_sorts)
+
+
+def _lookups(node):
+    for child in node.children:
+        if hasattr(child, 'children'):
+            yield from _lookups(child)
+        else:
+            yield child
+
+
+def _lookup_field(lookup):
+    lhs = lookup.lhs
+    # Walk through transforms like __year / __date down to the column
+    while not hasattr(lhs, 'target') and hasattr(lhs, 'lhs'):
+        lhs = lhs.lhs
+    return getattr(lhs, 'target', None)
+
+
+def suggest_index(queryset):
+    """
+    Composite index for ``queryset``: equality filters first, then range
+    filters, then the ORDER BY columns, which lets the database seek and
+    return rows already sorted.
+    """
+    opts = queryset.model._meta
+    equality, ranges = [], []
+    for lookup in _lookups(queryset.query.where):
+        target = _lookup_field(lookup)
+        if target is None or target.model is not queryset.model:
+            continue
+        bucket = equality if isinstance(lookup, (Exact, In, IsNull)) else ranges
+        bucket.append(target.name)
+
+    ordering = queryset.query.order_by or (opts.ordering if queryset.query.default_ordering else ())
+    for name in ordering:
+        if not isinstance(name, str):
+            continue
+        name = name.lstrip('-')
+        if name == 'pk':
+            name = opts.pk.name
+        if '__' not in name:
+            ranges.append(name)
+
+    fields = []
+    for name in equality + ranges:
+        if name not in fields:
+            fields.append(name)
+    # A trailing primary key is implied by every index
+    if fields and fields[-1] == opts.pk.name:
+        fields.pop()
+    return fields
+
+
+def analyze(name, queryset):
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        plan = queryset.explain(analyze=True)
+        full_scans = PG_FULL_SCAN.findall(plan)
+        temp_sorts = ['ORDER BY'] * len(PG_SORT.findall(plan))
+    else:
+        plan = queryset.explain()
+        full_scans = SQLITE_FULL_SCAN.findall(plan)
+        temp_sorts = SQLITE_TEMP_SORT.findall(plan)
+    report = PlanReport(name, plan, full_scans, temp_sorts)
+    if not report.ok:
+        report.suggestion = suggest_index(queryset)
+    return report
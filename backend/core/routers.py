@@ -0,0 +1,81 @@
+import contextlib
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+ARCHIVE = 'archive'
+# Models whose rows live in the archive database (cold storage)
+ARCHIVE_MODELS = {'inventory.archivedstockmove'}
+
+# Set once the current request (or block of code) has written to the primary,
+# so its later reads see its own writes instead of a lagging replica.
+_pinned = ContextVar('pinned_to_primary', default=False)
+_wrote = ContextVar('wrote_to_primary', default=False)
+
+
+def pin_to_primary():
+    _pinned.set(True)
+    _wrote.set(True)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+@contextlib.contextmanager
+def use_primary():
+    """Send every query in the block to the primary (reports that must be exact, scripts)."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Reads go to the replica, writes to the primary. The first write pins the
+    rest of the request to the primary (read-your-writes); see
+    core.middleware.PrimaryPinningMiddleware for the request scoping.
+    """
+
+    def db_for_read(self, model, **hints):
+        if is_pinned() or REPLICA not in settings.DATABASES:
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ArchiveRouter:
+    """
+    Cold-storage models (ARCHIVE_MODELS) read, write and migrate on the
+    'archive' database; nothing else is created there. Goes before
+    PrimaryReplicaRouter.
+    """
+
+    def _is_archived(self, model):
+        return model._meta.label_lower in ARCHIVE_MODELS
+
+    def db_for_read(self, model, **hints):
+        return ARCHIVE if self._is_archived(model) else None
+
+    def db_for_write(self, model, **hints):
+        return ARCHIVE if self._is_archived(model) else None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        archived = f'{app_label}.{model_name}' in ARCHIVE_MODELS
+        if db == ARCHIVE or archived:
+            return db == ARCHIVE and archived
+        return None
@@ -0,0 +1,19 @@
+from django.urls import reverse
+from rest_framework import serializers
+from .models import Job
+
+class JobSerializer(serializers.ModelSerializer):
+    percent = serializers.IntegerField(read_only=True)
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = (
+            'id', 'name', 'status', 'priority', 'percent', 'progress_done', 'progress_total', 'message',
+            'result', 'error', 'attempts', 'max_attempts', 'created_at', 'started_at', 'finished_at', 'download',
+        )
+
+    def get_download(self, job):
+        if job.status == 'done' and isinstance(job.result, dict) and job.result.get('file'):
+            return reverse('job-download', args=[job.pk])
+        return None
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import forget_token, forget_user
+from .models import APIToken, User
+
+
+@receiver([post_save, post_delete], sender=APIToken)
+def forget_changed_token(sender, instance, **kwargs):
+    forget_token(instance.key_hash)
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    # Deactivated users lose their cached tokens in this process right away
+    if not created:
+        forget_user(instance.pk)
@@ -0,0 +1,76 @@
+"""
+Query budget assertions for tests.
+
+    class InventoryQueryBudgets(QueryBudgetTestMixin, TestCase):
+        query_budgets = {
+            '/api/v1/inventory/products/': 1,
+            '/api/v1/inventory/moves/': 1,
+        }
+
+        @classmethod
+        def setUpTestData(cls):
+            ...  # enough rows that an N+1 would show up
+
+Or around any block of code. A streamed response runs its queries as it is
+read, so read it inside the block:
+
+    with query_budget(3):
+        consume(client.get('/api/v1/inventory/moves/'))
+"""
+import contextlib
+
+from django.conf import settings
+from django.test import Client
+
+from .queries import collect_queries
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _describe(collector):
+    return '\n'.join(f'  {n} x {sql}' for sql, n in collector.templates.most_common())
+
+
+def consume(response):
+    """Read a streamed response to the end (its queries run as it's read); returns the response."""
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+@contextlib.contextmanager
+def query_budget(max_queries, max_duplicates=None):
+    """
+    Fail if the block runs more than ``max_queries`` queries, or (if given)
+    repeats any one query shape more than ``max_duplicates`` times.
+    """
+    with collect_queries() as collector:
+        yield collector
+    if collector.count > max_queries:
+        raise QueryBudgetExceeded(
+            f'{collector.count} queries executed, budget is {max_queries}:\n{_describe(collector)}'
+        )
+    if max_duplicates is not None:
+        repeated = collector.duplicates(max_duplicates + 1)
+        if repeated:
+            raise QueryBudgetExceeded(
+                f'Query repeated more than {max_duplicates} times (N+1?):\n{_describe(collector)}'
+            )
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin: GET every URL in ``query_budgets`` and check its query count.
+    Duplicated shapes are limited to settings.QUERY_INSPECTOR_N1_THRESHOLD - 1.
+    """
+    query_budgets = {}
+
+    def test_query_budgets(self):
+        client = Client()
+        for url, budget in self.query_budgets.items():
+            with self.subTest(url=url):
+                with query_budget(budget, max_duplicates=settings.QUERY_INSPECTOR_N1_THRESHOLD - 1):
+                    response = consume(client.get(url))
+                self.assertLess(response.status_code, 400)
@@ -0,0 +1,178 @@
+import json
+from functools import wraps
+from inspect import iscoroutinefunction
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import FileResponse, JsonResponse
+from django.urls import reverse
+from rest_framework import exceptions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import BasePermission, IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import jobs, profiling
+from .models import Job, Profile
+from .serializers import JobSerializer
+
+
+def _denied(request):
+    """
+    Run DRF's authentication and permission checks on a plain Django request:
+    None if it may go on (request.user is then whoever the credentials are
+    for), else the rendered 401/403 an APIView would answer.
+    """
+    view = APIView()
+    view.args, view.kwargs, view.headers = (), {}, {}
+    view.request = drf_request = view.initialize_request(request)
+    try:
+        view.perform_authentication(drf_request)
+        view.check_permissions(drf_request)
+    except exceptions.APIException as exc:
+        return view.finalize_response(drf_request, view.handle_exception(exc)).render()
+    return None
+
+
+def _has_credentials(request):
+    return 'HTTP_AUTHORIZATION' in request.META or settings.SESSION_COOKIE_NAME in request.COOKIES
+
+
+def api_auth(view):
+    """
+    Authenticate a plain (sync or async) view the way the DRF views are, so a
+    route answers the same whichever implementation serves it.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            # Token and session lookups hit the database; without credentials
+            # the checks don't, so the hot anonymous path stays on the loop
+            if _has_credentials(request):
+                denied = await sync_to_async(_denied)(request)
+            else:
+                denied = _denied(request)
+            if denied is not None:
+                return denied
+            return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            denied = _denied(request)
+            if denied is not None:
+                return denied
+            return view(request, *args, **kwargs)
+    return wrapped
+
+
+def read_async(async_view, sync_view):
+    """
+    Serve GET/HEAD from ``async_view`` on the event loop and hand every other
+    method to ``sync_view`` (usually a DRF viewset) in a worker thread.
+
+    Lets the hot read paths stay async under ASGI without re-implementing the
+    DRF write side.
+    """
+    threaded_view = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        return await threaded_view(request, *args, **kwargs)
+
+    # DRF views are csrf_exempt and enforce CSRF in SessionAuthentication instead
+    view.csrf_exempt = True
+    return view
+
+
+def not_found():
+    """404 in the same shape DRF uses, for the plain async views."""
+    return JsonResponse({'detail': 'Not found.'}, status=404)
+
+
+def job_accepted(job):
+    """202 with the queued job, for endpoints that hand their work to core.jobs."""
+    response = JsonResponse(JobSerializer(job).data, status=202)
+    response['Location'] = reverse('job-detail', args=[job.pk])
+    return response
+
+
+class IsJobOwnerOrStaff(BasePermission):
+    """The user who started the job, or staff (jobs started anonymously are staff-only)."""
+
+    def has_object_permission(self, request, view, obj):
+        return request.user.is_staff or (obj.created_by_id is not None and obj.created_by_id == request.user.pk)
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Background jobs (core.jobs): poll a job for status and progress, cancel
+    it, and download the file it wrote. ?status= and ?name= filter the list.
+    Users see the jobs they started; staff see them all.
+    """
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated, IsJobOwnerOrStaff]
+
+    def get_queryset(self):
+        queryset = Job.objects.order_by('-id')
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(created_by=self.request.user)
+        for field in ('status', 'name'):
+            if self.request.query_params.get(field):
+                queryset = queryset.filter(**{field: self.request.query_params[field]})
+        return queryset
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        job = self.get_object()
+        jobs.cancel([job.pk])
+        job.refresh_from_db()
+        return Response(JobSerializer(job).data)
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        job = self.get_object()
+        name = job.result.get('file') if job.status == 'done' and isinstance(job.result, dict) else None
+        path = Path(settings.JOB_FILES_DIR, name) if name else None
+        if path is None or not path.exists():
+            return Response({'detail': 'No file for this job.'}, status=status.HTTP_404_NOT_FOUND)
+        # Stored as "<job id>-<name>"; the download keeps the export's own name
+        return FileResponse(path.open('rb'), as_attachment=True, filename=name.split('-', 1)[1])
+
+
+class ProfileUploadView(APIView):
+    """
+    Profiles taken outside the backend (the sync engine) are posted here to
+    be kept and listed with the others: multipart ``file`` plus ``kind``,
+    ``name``, ``mode``, ``duration_ms`` and ``meta`` (JSON).
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        data = request.data
+        upload = data.get('file')
+        kind, mode = data.get('kind', 'sync'), data.get('mode', 'cprofile')
+        if upload is None or kind not in dict(Profile.KIND_CHOICES) or mode not in profiling.MODES:
+            return Response({'detail': 'Needs a file, a known kind and mode.'}, status=status.HTTP_400_BAD_REQUEST)
+        if upload.size > settings.PROFILER_MAX_MB * 1024 * 1024:
+            return Response({'detail': 'Larger than PROFILER_MAX_MB.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            meta = json.loads(data.get('meta') or '{}')
+            duration_ms = float(data['duration_ms']) if data.get('duration_ms') else None
+        except ValueError:
+            meta = None
+        if not isinstance(meta, dict):
+            return Response(
+                {'detail': 'meta must be a JSON object, duration_ms a number.'}, status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        def write(path):
+            with path.open('wb') as f:
+                for chunk in upload.chunks():
+                    f.write(chunk)
+
+        profile = profiling.store(kind, data.get('name', ''), mode, write, duration_ms, meta)
+        return Response({'id': profile.pk}, status=status.HTTP_201_CREATED)
@@ -0,0 +1,19 @@
+# Gunicorn settings for the ASGI deployment (config.asgi).
+#
+# Each uvicorn worker runs an event loop, so the async read views keep many
+# connections open per process while a sync burst is in progress; sync views
+# and the admin still run in threads. Override any value via the environment.
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = 'uvicorn_worker.UvicornWorker'
+workers = int(os.environ.get('GUNICORN_WORKERS', '3'))
+# Pending connections the kernel queues during a burst before refusing
+backlog = int(os.environ.get('GUNICORN_BACKLOG', '2048'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+# Recycle workers now and then to cap slow memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = 500
+accesslog = '-'
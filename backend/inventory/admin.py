@@ -1,5 +1,32 @@
-from django.contrib import admin
-from .models import Product, Category, StockMove
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.db.models import OuterRef, Subquery, Sum
+from django.template.response import TemplateResponse
+from core.admin_mixins import LargeTableAdminMixin
+from core.exports import export_actions
+from . import pricing
+from .exports import export_moves
+from .models import (
+    Product, Category, StockMove, PriceChange, PriceChangeLine, Location, StockBalance,
+    StockCheckpoint, ArchivedPeriod, ArchivedStockMove, ReorderSuggestion,
+)
+
+class RepriceForm(forms.Form):
+    field = forms.ChoiceField(choices=PriceChange.FIELD_CHOICES, initial='price')
+    kind = forms.ChoiceField(label='Rule', choices=list(pricing.RULE_KINDS.items()))
+    value = forms.DecimalField(max_digits=10, decimal_places=4, help_text='Percent for percentage and margin rules')
+    ending = forms.DecimalField(max_digits=3, decimal_places=2, required=False, help_text='Optional, e.g. 0.95')
+    note = forms.CharField(max_length=255, required=False)
+
+    def clean(self):
+        data = super().clean()
+        if not self.errors:
+            try:
+                data['rule'] = pricing.PriceRule(data['kind'], data['value'], data['field'], data.get('ending'))
+            except ValueError as exc:
+                raise forms.ValidationError(str(exc))
+        return data
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -7,15 +34,145 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ('sku', 'name', 'category', 'price', 'current_stock', 'is_active')
+class ProductAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('sku', 'name', 'category', 'price', 'stock_on_hand', 'is_active')
     list_filter = ('category', 'is_active')
-    search_fields = ('sku', 'name')
+    search_fields = ('sku', 'barcode', 'name')
     readonly_fields = ('current_stock',) # Calculated field
+    ordering = ('sku',)
+    actions = ['reprice']
+
+    def get_queryset(self, request):
+        # One correlated SUM over the product's balances per row on the page
+        # (the count ignores it), instead of a query per row
+        stock = (
+            StockBalance.objects.filter(product=OuterRef('pk'))
+            .values('product').annotate(total=Sum('quantity')).values('total')
+        )
+        return super().get_queryset(request).annotate(stock_total=Subquery(stock))
+
+    @admin.display(description='Current stock', ordering='stock_total')
+    def stock_on_hand(self, obj):
+        return obj.stock_total or 0
+
+    @admin.action(description='Reprice selected products', permissions=['change'])
+    def reprice(self, request, queryset):
+        submitted = 'reprice_preview' in request.POST or 'reprice_apply' in request.POST
+        form = RepriceForm(request.POST if submitted else None)
+        select_across = request.POST.get('select_across') == '1'
+        selected = [] if select_across else request.POST.getlist(helpers.ACTION_CHECKBOX_NAME)
+        summary = None
+        if submitted and form.is_valid():
+            rule = form.cleaned_data['rule']
+            if 'reprice_apply' in request.POST:
+                # "Select all" reprices the filtered changelist; record which filter that was
+                selection = {'admin_filters': request.GET.dict()} if select_across else {'admin_ids': selected}
+                change = pricing.apply(queryset, rule, user=request.user, filters=selection,
+                                       note=form.cleaned_data['note'])
+                self.message_user(request, f'{change}: done.', messages.SUCCESS)
+                return None
+            summary = pricing.preview(queryset, rule)
+        return TemplateResponse(request, 'admin/inventory/product/reprice.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Reprice products',
+            'opts': self.model._meta,
+            'form': form,
+            'summary': summary,
+            'selected': selected,
+            'selected_count': queryset.count(),
+            'select_across': select_across,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
 
 @admin.register(StockMove)
-class StockMoveAdmin(admin.ModelAdmin):
-    list_display = ('created_at', 'product', 'move_type', 'quantity', 'reference')
-    list_filter = ('move_type', 'created_at')
+class StockMoveAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('created_at', 'product', 'location', 'move_type', 'quantity', 'reference')
+    list_filter = ('move_type', 'location', 'created_at')
     search_fields = ('product__sku', 'reference')
     date_hierarchy = 'created_at'
+    # (created_at, id) is the created_at index, so pages come straight off it
+    ordering = ('-created_at',)
+    actions = export_actions(export_moves)
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ('code', 'name', 'is_default', 'is_active')
+    search_fields = ('code', 'name')
+
+@admin.register(StockBalance)
+class StockBalanceAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('product', 'location', 'quantity', 'updated_at')
+    list_filter = ('location',)
+    search_fields = ('product__sku', 'product__name')
+    # Balances follow the ledger; change stock with moves or transfers
+    readonly_fields = ('product', 'location', 'quantity', 'updated_at')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(PriceChange)
+class PriceChangeAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created_at', 'user', 'field', 'rule', 'products_count', 'note')
+    list_select_related = ('user',)
+    readonly_fields = ('created_at', 'user', 'field', 'rule', 'filters', 'note', 'products_count')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(PriceChangeLine)
+class PriceChangeLineAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('change', 'product', 'old_value', 'new_value')
+    list_filter = ('change',)
+    search_fields = ('product__sku',)
+    readonly_fields = ('change', 'product', 'old_value', 'new_value')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(StockCheckpoint)
+class StockCheckpointAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('product', 'location', 'quantity', 'moves', 'updated_at')
+    list_filter = ('location',)
+    search_fields = ('product__sku',)
+    # Written by `manage.py archive_stock_moves` only
+    readonly_fields = ('product', 'location', 'quantity', 'moves', 'updated_at')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(ArchivedPeriod)
+class ArchivedPeriodAdmin(admin.ModelAdmin):
+    list_display = ('month', 'moves', 'first_id', 'last_id', 'started_at', 'completed_at')
+    readonly_fields = ('month', 'moves', 'first_id', 'last_id', 'started_at', 'completed_at')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(ArchivedStockMove)
+class ArchivedStockMoveAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('created_at', 'product_id', 'location_id', 'move_type', 'quantity', 'reference')
+    list_filter = ('move_type',)
+    search_fields = ('=product_id', 'reference')
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(ReorderSuggestion)
+class ReorderSuggestionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('product', 'suggested_qty', 'on_hand', 'reorder_point', 'forecast', 'avg_7', 'avg_28',
+                    'days_of_cover', 'computed_at')
+    search_fields = ('product__sku', 'product__name')
+    ordering = ('-suggested_qty',)
+    # Written by `manage.py forecast_demand` / the inventory.forecast job only
+    readonly_fields = [f.name for f in ReorderSuggestion._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
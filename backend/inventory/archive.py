@@ -0,0 +1,186 @@
+"""
+Cold storage for old stock moves.
+
+Closed months (older than STOCK_ARCHIVE_MONTHS) move from StockMove to
+ArchivedStockMove, which lives in its own database (core.routers.ArchiveRouter),
+so the hot table, its indexes and the main SQLite file stay small.
+
+Each batch of moves is copied to the archive first, then added to the
+StockCheckpoint rows and deleted from StockMove in one transaction. The
+ledger of a product is its checkpoint plus its hot moves, and the balances
+don't change. A batch copied but not deleted (crash in between) is copied
+again harmlessly on the next run: same ids.
+
+Reads that need the whole history merge both tables: product_history()
+here and the moves export (inventory.exports).
+"""
+from collections import defaultdict
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Max
+from django.utils import timezone
+
+from core.cache import bump_version
+from core.db import retry_on_lock
+from .lookup import LEDGER_REWRITES
+from .models import ArchivedPeriod, ArchivedStockMove, Location, StockCheckpoint, StockMove
+
+MOVE_FIELDS = ('id', 'product_id', 'location_id', 'quantity', 'move_type', 'reference', 'description', 'created_at')
+ARCHIVE_BATCH = 2000
+# Stay under SQLite's bound-parameter limit in the raw DELETE
+DELETE_BATCH = 500
+
+
+def _month_bounds(month):
+    tz = timezone.get_current_timezone()
+    end = date(month.year + 1, 1, 1) if month.month == 12 else date(month.year, month.month + 1, 1)
+    return (datetime.combine(month, time.min, tzinfo=tz), datetime.combine(end, time.min, tzinfo=tz))
+
+
+def archive_cutoff(months=None):
+    """First day of the oldest month kept hot: moves before it can be archived."""
+    months = settings.STOCK_ARCHIVE_MONTHS if months is None else months
+    today = timezone.localdate()
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def pending_months(cutoff):
+    """Months before ``cutoff`` that still have moves in StockMove, oldest first."""
+    first = StockMove.objects.order_by('created_at').values_list('created_at', flat=True).first()
+    if first is None:
+        return []
+    month = timezone.localtime(first).date().replace(day=1)
+    months = []
+    while month < cutoff:
+        months.append(month)
+        month = _month_bounds(month)[1].date()
+    return [m for m in months if _month_moves(m).exists()]
+
+
+def _month_moves(month):
+    start, end = _month_bounds(month)
+    return StockMove.objects.filter(created_at__gte=start, created_at__lt=end)
+
+
+def archived_until():
+    """Every archived move is older than this (None: nothing archived yet)."""
+    last = ArchivedPeriod.objects.aggregate(last=Max('month'))['last']
+    return _month_bounds(last)[1] if last else None
+
+
+def archive_month(month, batch_size=ARCHIVE_BATCH):
+    """Move one month of StockMove to cold storage; returns its ArchivedPeriod."""
+    period, _ = ArchivedPeriod.objects.get_or_create(month=month)
+    default_location = Location.get_default().pk
+    try:
+        while _archive_batch(period, month, default_location, batch_size):
+            pass
+    finally:
+        # Hot history and the code index's stock totals have changed shape
+        bump_version(StockMove)
+        bump_version(LEDGER_REWRITES)
+    period.completed_at = timezone.now()
+    period.save(update_fields=['completed_at'])
+    return period
+
+
+@retry_on_lock
+def _archive_batch(period, month, default_location, batch_size):
+    rows = list(
+        _month_moves(month).order_by('created_at', 'id').values_list(*MOVE_FIELDS)[:batch_size]
+    )
+    if not rows:
+        return 0
+    moves = [ArchivedStockMove(**dict(zip(MOVE_FIELDS, row))) for row in rows]
+    deltas = defaultdict(lambda: [0, 0])
+    for move in moves:
+        # Moves from before locations existed count at the default location
+        move.location_id = move.location_id or default_location
+        delta = deltas[(move.product_id, move.location_id)]
+        delta[0] += move.quantity
+        delta[1] += 1
+    # Committed on the archive database before anything is deleted here
+    ArchivedStockMove.objects.bulk_create(moves, ignore_conflicts=True)
+
+    ids = [move.id for move in moves]
+    _add_to_checkpoints(deltas)
+    _delete_moves(ids)
+    period.moves += len(moves)
+    period.first_id = min(ids + ([period.first_id] if period.first_id else []))
+    period.last_id = max(ids + ([period.last_id] if period.last_id else []))
+    period.save(update_fields=['moves', 'first_id', 'last_id'])
+    return len(moves)
+
+
+def _add_to_checkpoints(deltas):
+    existing = dict(
+        ((product_id, location_id), pk) for pk, product_id, location_id in StockCheckpoint.objects.filter(
+            product_id__in={key[0] for key in deltas},
+        ).values_list('pk', 'product_id', 'location_id')
+    )
+    created, changed = [], []
+    for (product_id, location_id), (quantity, count) in deltas.items():
+        pk = existing.get((product_id, location_id))
+        if pk is None:
+            created.append(StockCheckpoint(product_id=product_id, location_id=location_id,
+                                           quantity=quantity, moves=count))
+        else:
+            changed.append((quantity, count, pk))
+    StockCheckpoint.objects.bulk_create(created, batch_size=500)
+    # One prepared statement for all rows (bulk_update builds a CASE per field)
+    connection = connections[router.db_for_write(StockCheckpoint)]
+    quote = connection.ops.quote_name
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {quote(StockCheckpoint._meta.db_table)} SET quantity = quantity + %s, '
+            f'moves = moves + %s, updated_at = %s WHERE id = %s',
+            [(connection.ops.adapt_decimalfield_value(quantity), count, now, pk) for quantity, count, pk in changed],
+        )
+
+
+def _delete_moves(ids):
+    # Raw DELETE: queryset.delete() sends post_delete, which would take the
+    # archived quantities off the balances
+    using = router.db_for_write(StockMove)
+    connection = connections[using]
+    table = connection.ops.quote_name(StockMove._meta.db_table)
+    with connection.cursor() as cursor:
+        for i in range(0, len(ids), DELETE_BATCH):
+            batch = ids[i:i + DELETE_BATCH]
+            cursor.execute(f'DELETE FROM {table} WHERE id IN ({", ".join(["%s"] * len(batch))})', batch)
+
+
+def checkpoint_totals(product_ids=None):
+    """``{product_id: archived quantity}`` over all locations."""
+    checkpoints = StockCheckpoint.objects.all()
+    if product_ids is not None:
+        checkpoints = checkpoints.filter(product_id__in=product_ids)
+    totals = defaultdict(int)
+    for product_id, quantity in checkpoints.values_list('product_id', 'quantity').iterator(chunk_size=5000):
+        totals[product_id] += quantity
+    return totals
+
+
+# --- Reads across hot and archived moves ---
+
+def product_history(product_id, limit=100, before=None):
+    """The newest ``limit`` moves of a product (older than ``before``), from both tables."""
+    def newest(queryset, archived):
+        queryset = queryset.filter(product_id=product_id)
+        if before is not None:
+            queryset = queryset.filter(created_at__lt=before)
+        rows = queryset.order_by('-created_at', '-id').values_list(*MOVE_FIELDS)[:limit]
+        return [{**dict(zip(MOVE_FIELDS, row)), 'archived': archived} for row in rows]
+
+    moves = newest(StockMove.objects.all(), False)
+    boundary = archived_until()
+    # The archive only holds moves older than its last month
+    if boundary is not None and (len(moves) < limit or moves[-1]['created_at'] < boundary):
+        moves = sorted(moves + newest(ArchivedStockMove.objects.all(), True),
+                       key=lambda move: (move['created_at'], move['id']), reverse=True)[:limit]
+    return moves
+
@@ -0,0 +1,122 @@
+"""
+Per-(product, location) stock balances.
+
+StockBalance holds the ledger summed per product and location. Every
+StockMove save/delete adjusts one or two balance rows in the same
+transaction (see inventory.signals), so "how many at the shop" is a single
+row read instead of a SUM over the ledger.
+
+bulk_create and queryset.update() skip signals: call rebuild_balances()
+after loading moves in bulk (the benchmark seeder does).
+"""
+import uuid
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from core import changes
+from core.cache import bump_version
+from core.db import retry_on_lock
+from . import kpis
+from .models import Location, StockBalance, StockCheckpoint, StockMove
+
+
+def apply_delta(product_id, location_id, delta, create=True):
+    """Add ``delta`` to a balance row, creating it on the first move there."""
+    if not delta:
+        return
+    balance = StockBalance.objects.filter(product_id=product_id, location_id=location_id)
+    if not balance.update(quantity=F('quantity') + delta, updated_at=timezone.now()):
+        if not create:
+            return
+        try:
+            with transaction.atomic():
+                StockBalance.objects.create(product_id=product_id, location_id=location_id, quantity=delta)
+        except IntegrityError:
+            # Someone else created it first
+            balance.update(quantity=F('quantity') + delta, updated_at=timezone.now())
+    kpis.stock_changed(product_id, delta)
+
+
+def rebuild_balances(product_ids=None):
+    """
+    Recompute balances from the ledger (all products, or ``product_ids``):
+    hot moves plus archive checkpoints. Moves without a location are
+    assigned to the default one first.
+    """
+    moves = StockMove.objects.all()
+    balances = StockBalance.objects.all()
+    checkpoints = StockCheckpoint.objects.all()
+    if product_ids is not None:
+        moves = moves.filter(product_id__in=product_ids)
+        balances = balances.filter(product_id__in=product_ids)
+        checkpoints = checkpoints.filter(product_id__in=product_ids)
+    with transaction.atomic():
+        default = Location.get_default()
+        moves.filter(location__isnull=True).update(location=default)
+        balances.delete()
+        # Archived moves (inventory.archive) only survive as checkpoints
+        archived = {(p, l): q for p, l, q in checkpoints.values_list('product_id', 'location_id', 'quantity')}
+        totals = moves.order_by().values_list('product_id', 'location_id').annotate(total=Sum('quantity'))
+
+        def rows():
+            for product_id, location_id, total in totals.iterator(chunk_size=5000):
+                yield product_id, location_id, total + archived.pop((product_id, location_id), 0)
+            for (product_id, location_id), quantity in archived.items():
+                yield product_id, location_id, quantity
+
+        created = StockBalance.objects.bulk_create(
+            (StockBalance(product_id=product_id, location_id=location_id, quantity=quantity)
+             for product_id, location_id, quantity in rows()),
+            batch_size=5000,
+        )
+        kpis.rebuild_stock_kpis()
+        # Stream clients showing stock refetch it
+        changes.record('stock', 'rebuilt', products=len(product_ids) if product_ids is not None else None)
+        # Cached stock payloads are versioned by the ledger table
+        bump_version(StockMove)
+    return len(created)
+
+
+def stock_by_location(product_ids):
+    """``{product_id: {location code: quantity}}`` in one query."""
+    stock = {product_id: {} for product_id in product_ids}
+    rows = StockBalance.objects.filter(product_id__in=product_ids).values_list(
+        'product_id', 'location__code', 'quantity',
+    )
+    for product_id, code, quantity in rows:
+        stock[product_id][code] = quantity
+    return stock
+
+
+@retry_on_lock
+def transfer(product, source, destination, quantity, reference=None, description=None):
+    """Move ``quantity`` of ``product`` between locations: one OUT and one IN move."""
+    if source == destination:
+        raise ValueError('Source and destination are the same location.')
+    if quantity <= 0:
+        raise ValueError('Transfer a positive quantity.')
+    reference = reference or f'TRF-{uuid.uuid4().hex[:10].upper()}'
+    # Lock both balance rows up front, lowest location first: two opposite
+    # transfers updating them source-then-destination would deadlock
+    for location in (source, destination):
+        if not StockBalance.objects.filter(product=product, location=location).exists():
+            try:
+                with transaction.atomic():
+                    StockBalance.objects.create(product=product, location=location, quantity=0)
+            except IntegrityError:
+                pass  # someone else created it first
+    list(
+        StockBalance.objects.select_for_update()
+        .filter(product=product, location__in=(source, destination)).order_by('location_id')
+    )
+    out_move = StockMove.objects.create(
+        product=product, location=source, quantity=-quantity, move_type='transfer',
+        reference=reference, description=description,
+    )
+    in_move = StockMove.objects.create(
+        product=product, location=destination, quantity=quantity, move_type='transfer',
+        reference=reference, description=description,
+    )
+    return out_move, in_move
@@ -0,0 +1,70 @@
+import heapq
+from itertools import islice
+
+from core.exports import CHUNK_ROWS, export_queryset, export_rows, local_row, register
+from .models import ArchivedStockMove, Product, StockMove
+
+MOVE_COLUMNS = [
+    ('id', 'id'),
+    ('created_at', 'created_at'),
+    ('product_id', 'product_id'),
+    ('sku', 'product__sku'),
+    ('move_type', 'move_type'),
+    ('quantity', 'quantity'),
+    ('reference', 'reference'),
+    ('description', 'description'),
+]
+SKU_COLUMN = 3
+
+
+def filter_moves(queryset, params, query):
+    """
+    Ledger filters: date range plus ?product=<id>, ?sku=<sku>, ?move_type=<type>.
+    Works on StockMove and ArchivedStockMove alike.
+    """
+    queryset = params.filter_dates(queryset)
+    if query.get('product'):
+        queryset = queryset.filter(product_id=query['product'])
+    if query.get('sku'):
+        # By id: the archive has no join to Product
+        queryset = queryset.filter(product_id__in=list(
+            Product.objects.filter(sku=query['sku']).values_list('id', flat=True)))
+    if query.get('move_type'):
+        queryset = queryset.filter(move_type=query['move_type'])
+    return queryset
+
+
+def export_moves(queryset, params):
+    queryset = queryset.order_by('created_at', 'id')
+    return export_queryset(queryset, MOVE_COLUMNS, params, 'stock-moves')
+
+
+def ledger_querysets():
+    """Hot and archived moves (inventory.archive), for the full-history export."""
+    return StockMove.objects.all(), ArchivedStockMove.objects.all()
+
+
+def filter_ledger(querysets, params, query):
+    return tuple(filter_moves(queryset, params, query) for queryset in querysets)
+
+
+def _archived_rows(queryset):
+    # Same columns as the hot rows, SKUs looked up a chunk at a time
+    lookups = [lookup if lookup != 'product__sku' else 'product_id' for _, lookup in MOVE_COLUMNS]
+    rows = queryset.values_list(*lookups).iterator(chunk_size=CHUNK_ROWS)
+    while chunk := list(islice(rows, CHUNK_ROWS)):
+        skus = dict(Product.objects.filter(id__in={row[SKU_COLUMN] for row in chunk}).values_list('id', 'sku'))
+        for row in chunk:
+            yield row[:SKU_COLUMN] + (skus.get(row[SKU_COLUMN]),) + row[SKU_COLUMN + 1:]
+
+
+def export_ledger(querysets, params):
+    """Hot and archived moves merged in (created_at, id) order."""
+    hot, archived = (queryset.order_by('created_at', 'id') for queryset in querysets)
+    hot_rows = hot.values_list(*[lookup for _, lookup in MOVE_COLUMNS]).iterator(chunk_size=CHUNK_ROWS)
+    rows = heapq.merge(_archived_rows(archived), hot_rows, key=lambda row: (row[1], row[0]))
+    header = [name for name, _ in MOVE_COLUMNS]
+    return export_rows(header, (local_row(row) for row in rows), params, 'stock-moves')
+
+
+LEDGER_EXPORT = register('inventory.ledger', ledger_querysets, filter_ledger, export_ledger)
@@ -0,0 +1,217 @@
+"""
+Demand forecasts and reorder suggestions for the whole catalog in one pass.
+
+Daily units sold of every active product over the last FORECAST_DAYS days
+come from one grouped query over the ledger's sale moves and go into a
+dense products x days NumPy matrix. Every statistic is then an array
+operation over all products at once:
+
+- avg_7, avg_28: moving averages of the last 7 and 28 days
+- forecast: exponentially smoothed daily sales (FORECAST_ALPHA)
+- safety_stock: z * std of daily sales * sqrt(lead time + review period),
+  z for FORECAST_SERVICE_LEVEL
+- reorder_point: forecast * lead time + safety stock
+- order_up_to: forecast * (lead time + review period) + safety stock
+- suggested_qty: up to order_up_to once on hand is at or below the reorder
+  point, else 0
+
+Days before a product existed don't count as days without sales. The
+suggestions table is rewritten in bulk on every run.
+"""
+import math
+import time
+from datetime import date, datetime, timedelta
+from statistics import NormalDist
+
+import numpy as np
+from django.conf import settings
+from django.db import NotSupportedError, connections, router, transaction
+from django.db.models import FloatField, Func, IntegerField, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import Product, ReorderSuggestion, StockBalance, StockMove
+
+EPOCH = date(1970, 1, 1)
+EPOCH_JULIAN_DAY = 2440587.5
+WRITE_BATCH = 5000
+SHORT_WINDOW = 7
+LONG_WINDOW = 28
+
+
+class LocalDay(Func):
+    """
+    Days since 1970-01-01 of a datetime column, cut at local midnight
+    (``offset`` seconds east of UTC). Computed by the database itself;
+    TruncDate runs a Python function per row on SQLite.
+    """
+    output_field = IntegerField()
+
+    def __init__(self, expression, offset):
+        super().__init__(expression)
+        self.offset = offset
+
+    def as_sql(self, compiler, connection, **extra):
+        raise NotSupportedError(f'LocalDay is not implemented for {connection.vendor}')
+
+    def as_sqlite(self, compiler, connection, **extra):
+        sql, params = compiler.compile(self.source_expressions[0])
+        return f'CAST(julianday({sql}) - {EPOCH_JULIAN_DAY} + %s AS INTEGER)', [*params, self.offset / 86400]
+
+    def as_postgresql(self, compiler, connection, **extra):
+        sql, params = compiler.compile(self.source_expressions[0])
+        return f'FLOOR((EXTRACT(EPOCH FROM {sql}) + %s) / 86400)::integer', [*params, self.offset]
+
+
+def _rows_for(ids, keys):
+    """Row index of each key in the sorted ``ids``, and which keys were found."""
+    index = np.searchsorted(ids, keys)
+    found = index < len(ids)
+    found[found] = ids[index[found]] == keys[found]
+    return index, found
+
+
+def load_sales(days, today=None):
+    """
+    ``(ids, sales, known)`` for the active products in id order: units sold
+    per day (the last column is yesterday) and whether the product existed
+    that day.
+    """
+    today = today or timezone.localdate()
+    # Dubai has no DST, so today's offset holds for the whole window
+    offset = timezone.localtime().utcoffset().total_seconds()
+    first_day = (today - EPOCH).days - days
+
+    products = Product.objects.filter(is_active=True).order_by('id').values_list('id', LocalDay('created_at', offset))
+    ids, created = np.array(list(products), dtype=np.int64).reshape(-1, 2).T
+    known = np.arange(first_day, first_day + days) >= created[:, None]
+
+    start = timezone.make_aware(datetime.combine(today - timedelta(days=days), datetime.min.time()))
+    end = timezone.make_aware(datetime.combine(today, datetime.min.time()))
+    sold = (
+        StockMove.objects.filter(move_type='sale', created_at__gte=start, created_at__lt=end)
+        .annotate(day=LocalDay('created_at', offset)).order_by()
+        .values_list('product_id', 'day').annotate(units=Cast(Sum('quantity'), FloatField()))
+    )
+    rows = np.array(list(sold), dtype=np.float64).reshape(-1, 3)
+    sales = np.zeros((len(ids), days))
+    index, found = _rows_for(ids, rows[:, 0].astype(np.int64))
+    columns = rows[:, 1].astype(np.int64) - first_day
+    found &= (columns >= 0) & (columns < days)
+    # Sales leave the ledger as negative quantities
+    sales[index[found], columns[found]] = -rows[found, 2]
+    return ids, sales, known
+
+
+def load_on_hand(ids):
+    """Stock on hand per product (all locations), aligned with ``ids``."""
+    totals = (
+        StockBalance.objects.filter(product__is_active=True).order_by()
+        .values_list('product_id').annotate(total=Cast(Sum('quantity'), FloatField()))
+    )
+    rows = np.array(list(totals), dtype=np.float64).reshape(-1, 2)
+    on_hand = np.zeros(len(ids))
+    index, found = _rows_for(ids, rows[:, 0].astype(np.int64))
+    on_hand[index[found]] = rows[found, 1]
+    return on_hand
+
+
+def _mean(values, known):
+    count = known.sum(axis=1)
+    return np.divide(values.sum(axis=1), count, out=np.zeros(len(values)), where=count > 0)
+
+
+def forecast(sales, known, on_hand, lead_time, review, service_level, alpha):
+    """Every statistic for every product (row), as ``{name: array}``."""
+    values = np.where(known, sales, 0.0)
+    days = values.shape[1]
+    avg_7 = _mean(values[:, -SHORT_WINDOW:], known[:, -SHORT_WINDOW:])
+    avg_28 = _mean(values[:, -LONG_WINDOW:], known[:, -LONG_WINDOW:])
+
+    # Exponential smoothing as one weighted sum: yesterday weighs alpha, the
+    # day before alpha * (1 - alpha), ...; normalised over the known days
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1)
+    weight_known = known @ weights
+    level = np.divide(values @ weights, weight_known, out=np.zeros(len(values)), where=weight_known > 0)
+
+    count = known.sum(axis=1)
+    deviations = np.where(known, values - _mean(values, known)[:, None], 0.0)
+    variance = np.divide((deviations ** 2).sum(axis=1), count - 1, out=np.zeros(len(values)), where=count > 1)
+    std = np.sqrt(variance)
+
+    z = NormalDist().inv_cdf(service_level)
+    safety_stock = z * std * math.sqrt(lead_time + review)
+    reorder_point = level * lead_time + safety_stock
+    order_up_to = level * (lead_time + review) + safety_stock
+    reorder = (on_hand <= reorder_point) & (level > 0)
+    suggested = np.where(reorder, np.ceil(np.maximum(order_up_to - on_hand, 0)), 0)
+    days_of_cover = np.divide(np.maximum(on_hand, 0), level, out=np.full(len(values), np.nan), where=level > 0)
+    return {
+        'avg_7': avg_7, 'avg_28': avg_28, 'forecast': level, 'demand_std': std,
+        'safety_stock': safety_stock, 'reorder_point': reorder_point, 'order_up_to': order_up_to,
+        'on_hand': on_hand, 'days_of_cover': days_of_cover, 'suggested_qty': suggested.astype(np.int64),
+    }
+
+
+def write_suggestions(ids, stats, computed_at):
+    """Replace all suggestions with ``stats`` (rows aligned with ``ids``)."""
+    connection = connections[router.db_for_write(ReorderSuggestion)]
+    quote = connection.ops.quote_name
+    names = list(stats)
+    columns = ['product_id', *names, 'computed_at']
+    values = [np.round(stats[name], 4) if stats[name].dtype.kind == 'f' else stats[name] for name in names]
+    # NaN (no demand) goes in as NULL
+    cells = [np.where(np.isnan(value), None, value).tolist() if value.dtype.kind == 'f' else value.tolist()
+             for value in values]
+    now = connection.ops.adapt_datetimefield_value(computed_at)
+    rows = [(*row, now) for row in zip(ids.tolist(), *cells)]
+    # One prepared statement for all rows; bulk_create builds a statement per
+    # few dozen rows on SQLite
+    sql = (f'INSERT INTO {quote(ReorderSuggestion._meta.db_table)} ({", ".join(map(quote, columns))}) '
+           f'VALUES ({", ".join(["%s"] * len(columns))})')
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        ReorderSuggestion.objects.using(connection.alias).all().delete()
+        for i in range(0, len(rows), WRITE_BATCH):
+            cursor.executemany(sql, rows[i:i + WRITE_BATCH])
+
+
+def run(days=None, lead_time=None, review=None, service_level=None, alpha=None, write=True, progress=None):
+    """Forecast the catalog and (unless ``write`` is false) store the suggestions; returns a summary."""
+    days = days or settings.FORECAST_DAYS
+    lead_time = settings.FORECAST_LEAD_TIME_DAYS if lead_time is None else lead_time
+    review = settings.FORECAST_REVIEW_DAYS if review is None else review
+    service_level = service_level or settings.FORECAST_SERVICE_LEVEL
+    alpha = alpha or settings.FORECAST_ALPHA
+    if not 0 < service_level < 1:
+        raise ValueError('The service level is a fraction between 0 and 1, e.g. 0.95.')
+    if not 0 < alpha <= 1:
+        raise ValueError('Alpha is between 0 (exclusive) and 1.')
+    report = progress or (lambda *args, **kwargs: None)
+    timings = {}
+
+    start = time.perf_counter()
+    report(0, 3, 'Loading sales')
+    ids, sales, known = load_sales(days)
+    on_hand = load_on_hand(ids)
+    timings['load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    report(1, 3, 'Forecasting')
+    stats = forecast(sales, known, on_hand, lead_time, review, service_level, alpha)
+    timings['forecast'] = time.perf_counter() - start
+
+    if write:
+        start = time.perf_counter()
+        report(2, 3, 'Writing suggestions')
+        write_suggestions(ids, stats, timezone.now())
+        timings['write'] = time.perf_counter() - start
+    report(3, 3, 'Done')
+
+    suggested = stats['suggested_qty']
+    return {
+        'products': len(ids),
+        'days': days,
+        'to_reorder': int((suggested > 0).sum()),
+        'units': int(suggested.sum()),
+        'seconds': {step: round(seconds, 3) for step, seconds in timings.items()},
+    }
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from core.query_plans import register
+from .models import ArchivedStockMove, Product, StockBalance, StockMove
+
+
+def _last_month():
+    return timezone.now() - timedelta(days=30)
+
+# API
+register('inventory.product.by_sku', lambda: Product.objects.filter(sku='SKU-1'))
+register('inventory.stockmove.balance', lambda: StockMove.objects.filter(product_id=1).values('quantity'))
+register('inventory.stockmove.history', lambda: StockMove.objects.filter(product_id=1).order_by('-created_at'))
+register('inventory.stockmove.history_since', lambda: StockMove.objects.filter(
+    product_id=1, created_at__gte=_last_month()).order_by('-created_at'))
+register('inventory.archivedstockmove.history', lambda: ArchivedStockMove.objects.filter(
+    product_id=1).order_by('-created_at'))
+register('inventory.stockbalance.product', lambda: StockBalance.objects.filter(product_id=1))
+register('inventory.stockbalance.available_at', lambda: StockBalance.objects.filter(
+    location_id=1, quantity__gt=0))
+
+# Admin changelists
+register('admin.product.by_category', lambda: Product.objects.filter(
+    category_id=1, is_active=True).order_by('-pk'))
+register('admin.stockmove.date_hierarchy', lambda: StockMove.objects.filter(
+    created_at__gte=_last_month()).order_by('-created_at'))
+register('admin.stockmove.by_type', lambda: StockMove.objects.filter(
+    move_type='sale', created_at__gte=_last_month()).order_by('-created_at'))
@@ -0,0 +1,21 @@
+"""Background jobs (core.jobs) for inventory."""
+from core import jobs
+from . import forecasting, pricing
+
+
+@jobs.task('inventory.reprice')
+def reprice(job, progress):
+    """Apply a repricing rule (RepriceView with dry_run false) and return its PriceChange."""
+    data = job.payload
+    rule = pricing.PriceRule(field=data['field'], **data['rule'])
+    queryset = pricing.filter_products(data['filter'])
+    # One UPDATE in one transaction: there is nothing to report until it commits
+    progress(0, queryset.count(), 'Repricing')
+    change = pricing.apply(queryset, rule, user=job.created_by, filters=data['filter'], note=data['note'])
+    return {'price_change': change.pk, 'products': change.products_count}
+
+
+@jobs.task('inventory.forecast')
+def forecast(job, progress):
+    """Recompute every reorder suggestion (POST reorder-suggestions/refresh/)."""
+    return forecasting.run(progress=progress, **job.payload)
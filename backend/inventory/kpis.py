@@ -0,0 +1,80 @@
+"""
+Stock KPIs for the dashboard, kept as counters (core.counters).
+
+- STOCK_VALUE: on-hand stock at cost, sum of max(stock, 0) * cost_price.
+- LOW_STOCK: active products with stock at or below LOW_STOCK_THRESHOLD.
+
+Every balance change (inventory.balances.apply_delta) and every product
+save/delete (inventory.signals) moves them by the difference it makes to
+that one product. Bulk paths call rebuild_stock_kpis().
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from core import counters
+from .models import Product, StockBalance
+
+STOCK_VALUE = 'inventory.stock_value'
+LOW_STOCK = 'inventory.low_stock'
+
+
+def _is_low(stock, active):
+    return int(bool(active) and stock <= settings.LOW_STOCK_THRESHOLD)
+
+
+def _product_state(product_id):
+    """(cost_price, is_active, stock) of a product, or None."""
+    row = (
+        Product.objects.filter(id=product_id)
+        .annotate(stock=Sum('balances__quantity'))
+        .values_list('cost_price', 'is_active', 'stock').first()
+    )
+    if row is None:
+        return None
+    cost, active, stock = row
+    return cost, active, stock or 0
+
+
+def stock_changed(product_id, delta):
+    """After ``delta`` was added to one of the product's balances."""
+    state = _product_state(product_id)
+    if state is None or not delta:
+        return
+    cost, active, after = state
+    before = after - delta
+    counters.add(STOCK_VALUE, (max(after, 0) - max(before, 0)) * cost)
+    counters.add(LOW_STOCK, _is_low(after, active) - _is_low(before, active))
+
+
+def product_changed(product_id, before, after):
+    """``before``/``after``: (cost_price, is_active), None for created/deleted."""
+    if before == after:
+        return
+    state = _product_state(product_id)
+    stock = state[2] if state else 0
+    old_cost, old_active = before or (0, False)
+    new_cost, new_active = after or (0, False)
+    counters.add(STOCK_VALUE, max(stock, 0) * (Decimal(new_cost) - Decimal(old_cost)))
+    counters.add(LOW_STOCK, _is_low(stock, new_active) - _is_low(stock, old_active))
+
+
+def rebuild_stock_kpis():
+    """Recompute both counters from the balances (after bulk loads and bulk repricing)."""
+    stock = (
+        StockBalance.objects.filter(product=OuterRef('pk')).order_by()
+        .values('product').annotate(total=Sum('quantity')).values('total')
+    )
+    money = DecimalField(max_digits=16, decimal_places=2)
+    products = Product.objects.annotate(
+        stock=Coalesce(Subquery(stock), Value(Decimal('0')), output_field=money),
+    )
+    totals = products.aggregate(
+        value=Sum(Greatest(F('stock'), Value(Decimal('0'))) * F('cost_price'), output_field=money),
+        low=Count('id', filter=Q(is_active=True, stock__lte=settings.LOW_STOCK_THRESHOLD)),
+    )
+    counters.set_value(STOCK_VALUE, totals['value'] or 0)
+    counters.set_value(LOW_STOCK, totals['low'])
+    return totals
@@ -0,0 +1,208 @@
+"""
+In-process barcode/SKU index for the point-of-sale lookup.
+
+Every worker keeps a map of barcode and SKU to {price, stock, active...} for
+the whole catalog, so a scan is a dict lookup. It follows the same table
+versions as the catalog cache (bumped by inventory.signals on commit):
+
+- Product changed: reload products updated recently.
+- Product deleted (PRODUCT_DELETES): full reload. Nothing left to re-read
+  shows a deletion, and a count can't tell one apart from a delete plus an
+  insert.
+- StockMove changed: add up the moves past the last id seen, and those
+  created within UPDATE_SLACK of the last sync that weren't counted yet. Ids
+  come from a sequence at INSERT, so on PostgreSQL a move can commit after
+  one with a higher id; the window catches it.
+- Ledger rows edited, deleted or archived (LEDGER_REWRITES): full reload.
+
+It is also fully rebuilt every MAX_AGE seconds as a backstop. Full reloads
+after the first one happen in the background.
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connections
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from core.cache import table_version
+from .models import Product, StockCheckpoint, StockMove
+
+# Version bumped when existing ledger rows change, which id-based catch-up misses
+LEDGER_REWRITES = 'inventory.ledger_rewrites'
+# Version bumped when products are deleted, which re-reading by updated_at misses
+PRODUCT_DELETES = 'inventory.product_deletes'
+MAX_AGE = 600
+# Re-read products saved (and moves created) this long before the last
+# sync, to cover rows committed after it by transactions that started earlier
+UPDATE_SLACK = timedelta(seconds=60)
+
+PRODUCT_FIELDS = ('id', 'sku', 'barcode', 'name', 'price', 'is_active')
+
+
+def _versions():
+    return (
+        table_version(Product), table_version(StockMove), table_version(LEDGER_REWRITES),
+        table_version(PRODUCT_DELETES),
+    )
+
+
+class CodeIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}     # product id -> entry dict
+        self._by_barcode = {}  # barcode -> product id
+        self._by_sku = {}      # sku -> product id
+        self._versions = None
+        self._loaded_at = 0.0
+        self._synced_at = None
+        self._moves_synced_at = None
+        self._last_move_id = 0
+        self._recent_moves = {}  # move id -> created_at, moves counted inside the window
+        self._reloading = False
+
+    def is_stale(self):
+        return (
+            self._versions != _versions()
+            or time.monotonic() - self._loaded_at > MAX_AGE
+        )
+
+    def refresh(self):
+        """
+        Bring the index up to date; does nothing if no one wrote since the
+        last call. Only the first load blocks: later full reloads run in a
+        background thread and lookups keep using the current map meanwhile.
+        """
+        if self._reloading or not self._lock.acquire(blocking=not self._entries):
+            return  # someone else is on it
+        try:
+            versions = _versions()
+            if self._versions is None:
+                self._load()
+            elif versions[2:] != self._versions[2:] or time.monotonic() - self._loaded_at > MAX_AGE:
+                self._reloading = True
+                threading.Thread(target=self._background_load, name='code-index-load', daemon=True).start()
+                return
+            elif versions != self._versions:
+                if versions[0] != self._versions[0]:
+                    self._sync_products()
+                if versions[1] != self._versions[1]:
+                    self._sync_moves()
+            self._versions = versions
+        finally:
+            self._lock.release()
+
+    def _background_load(self):
+        try:
+            with self._lock:
+                versions = _versions()
+                self._load()
+                self._versions = versions
+        finally:
+            self._reloading = False
+            connections.close_all()  # this thread's connections only
+
+    def resolve(self, codes):
+        """``{code: entry or None}``; barcodes win over SKUs when both match."""
+        found = {}
+        for code in codes:
+            product_id = self._by_barcode.get(code) or self._by_sku.get(code)
+            found[code] = self._entries.get(product_id)
+        return found
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- loading ---
+
+    def _load(self):
+        synced_at = timezone.now()
+        floor = synced_at - UPDATE_SLACK
+        last_move_id = 0
+        stock = defaultdict(int)
+        # Archived moves (inventory.archive) only survive as checkpoints
+        for product_id, quantity in StockCheckpoint.objects.values_list('product_id', 'quantity').iterator(chunk_size=5000):
+            stock[product_id] += quantity
+        # Moves older than the window in one sum, the window's one by one so
+        # _sync_moves knows which of them are already counted
+        for product_id, total, last in (
+            StockMove.objects.filter(created_at__lt=floor)
+            .values('product_id').annotate(total=Sum('quantity'), last=Max('id'))
+            .values_list('product_id', 'total', 'last')
+        ):
+            stock[product_id] += total
+            last_move_id = max(last_move_id, last)
+        recent_moves = {}
+        for move_id, product_id, quantity, created_at in (
+            StockMove.objects.filter(created_at__gte=floor).values_list('id', 'product_id', 'quantity', 'created_at')
+        ):
+            stock[product_id] += quantity
+            recent_moves[move_id] = created_at
+            last_move_id = max(last_move_id, move_id)
+        entries, by_barcode, by_sku = {}, {}, {}
+        for row in Product.objects.values_list(*PRODUCT_FIELDS).iterator(chunk_size=5000):
+            entry = dict(zip(PRODUCT_FIELDS, row))
+            entry['stock'] = stock.get(entry['id']) or 0
+            entries[entry['id']] = entry
+            by_sku[entry['sku']] = entry['id']
+            if entry['barcode']:
+                by_barcode[entry['barcode']] = entry['id']
+        # Swap whole dicts so lookups on other threads never see a half-built index
+        self._entries, self._by_barcode, self._by_sku = entries, by_barcode, by_sku
+        self._last_move_id = last_move_id
+        self._recent_moves = recent_moves
+        self._synced_at = self._moves_synced_at = synced_at
+        self._loaded_at = time.monotonic()
+
+    def _sync_products(self):
+        synced_at = timezone.now()
+        changed = Product.objects.filter(updated_at__gte=self._synced_at - UPDATE_SLACK)
+        for row in changed.values_list(*PRODUCT_FIELDS):
+            entry = dict(zip(PRODUCT_FIELDS, row))
+            old = self._entries.get(entry['id'])
+            if old is None:
+                entry['stock'] = self._counted_stock(entry['id'])
+            else:
+                entry['stock'] = old['stock']
+                self._by_sku.pop(old['sku'], None)
+                if old['barcode']:
+                    self._by_barcode.pop(old['barcode'], None)
+            self._entries[entry['id']] = entry
+            self._by_sku[entry['sku']] = entry['id']
+            if entry['barcode']:
+                self._by_barcode[entry['barcode']] = entry['id']
+        self._synced_at = synced_at
+
+    def _counted_stock(self, product_id):
+        """Stock of a product new to the index, from the moves _sync_moves has already been through."""
+        floor = self._moves_synced_at - UPDATE_SLACK
+        moves = StockMove.objects.filter(product_id=product_id, id__lte=self._last_move_id)
+        return sum(
+            quantity for move_id, quantity, created_at in moves.values_list('id', 'quantity', 'created_at')
+            if created_at < floor or move_id in self._recent_moves
+        )
+
+    def _sync_moves(self):
+        synced_at = timezone.now()
+        moves = StockMove.objects.filter(
+            Q(id__gt=self._last_move_id) | Q(created_at__gte=self._moves_synced_at - UPDATE_SLACK),
+        )
+        for move_id, product_id, quantity, created_at in moves.values_list('id', 'product_id', 'quantity', 'created_at'):
+            if move_id in self._recent_moves:
+                continue
+            entry = self._entries.get(product_id)
+            if entry is not None:
+                entry['stock'] += quantity
+            self._recent_moves[move_id] = created_at
+            self._last_move_id = max(self._last_move_id, move_id)
+        # Older ones can only come back through id > _last_move_id, and they're below it
+        floor = synced_at - UPDATE_SLACK
+        self._recent_moves = {
+            move_id: created_at for move_id, created_at in self._recent_moves.items() if created_at >= floor
+        }
+        self._moves_synced_at = synced_at
+
+
+code_index = CodeIndex()
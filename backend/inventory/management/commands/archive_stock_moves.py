@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections, router
+
+from inventory.archive import ARCHIVE_BATCH, archive_cutoff, archive_month, pending_months
+from inventory.models import StockMove
+
+
+class Command(BaseCommand):
+    help = ('Move closed months of stock moves to the archive database, keeping their totals '
+            'as checkpoints (balances are unchanged).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=None,
+                            help='Months kept in the main database (default: STOCK_ARCHIVE_MONTHS)')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH, help='Moves per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the months that would move')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='VACUUM the main SQLite file afterwards to give the space back (locks it meanwhile)')
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['months'])
+        months = pending_months(cutoff)
+        if not months:
+            self.stdout.write(f'Nothing to archive before {cutoff:%Y-%m}.')
+            return
+        if options['dry_run']:
+            for month in months:
+                self.stdout.write(f'  {month:%Y-%m}')
+            self.stdout.write(f'{len(months)} months would be archived (before {cutoff:%Y-%m}).')
+            return
+
+        total = 0
+        for month in months:
+            start = time.perf_counter()
+            period = archive_month(month, options['batch_size'])
+            total += period.moves
+            self.stdout.write(f'  {month:%Y-%m}: {period.moves:,} moves in {time.perf_counter() - start:.1f}s')
+        self.stdout.write(self.style.SUCCESS(f'{total:,} moves archived from {len(months)} months.'))
+
+        connection = connections[router.db_for_write(StockMove)]
+        if options['vacuum'] and connection.vendor == 'sqlite':
+            start = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+                cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self.stdout.write(f'Main database vacuumed in {time.perf_counter() - start:.1f}s.')
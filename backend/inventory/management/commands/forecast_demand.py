@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import forecasting
+from inventory.models import ReorderSuggestion
+
+
+class Command(BaseCommand):
+    help = ('Forecast daily demand of every active product from its sales and rewrite the reorder '
+            'suggestions (inventory.forecasting). Defaults come from the FORECAST_* settings.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Days of sales history')
+        parser.add_argument('--lead-time', type=int, default=None, help='Supplier lead time in days')
+        parser.add_argument('--review', type=int, default=None, help='Days between orders')
+        parser.add_argument('--service-level', type=float, default=None, help='e.g. 0.95')
+        parser.add_argument('--alpha', type=float, default=None, help='Smoothing factor, 0 to 1')
+        parser.add_argument('--dry-run', action='store_true', help='Compute only, keep the stored suggestions')
+        parser.add_argument('--show', type=int, default=10, help='Largest suggestions to list')
+
+    def handle(self, *args, **options):
+        try:
+            summary = forecasting.run(
+                days=options['days'], lead_time=options['lead_time'], review=options['review'],
+                service_level=options['service_level'], alpha=options['alpha'], write=not options['dry_run'],
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        seconds = ', '.join(f'{step} {value:.2f}s' for step, value in summary['seconds'].items())
+        self.stdout.write(
+            f"{summary['products']:,} products over {summary['days']} days ({seconds}): "
+            f"{summary['to_reorder']:,} to reorder, {summary['units']:,} units."
+        )
+        if options['dry_run']:
+            self.stdout.write('Dry run, suggestions not stored.')
+            return
+        top = (ReorderSuggestion.objects.filter(suggested_qty__gt=0).select_related('product')
+               .order_by('-suggested_qty')[:options['show']])
+        for row in top:
+            self.stdout.write(
+                f'  {row.product.sku}: order {row.suggested_qty} '
+                f'(on hand {row.on_hand:g}, reorder point {row.reorder_point:.1f}, {row.forecast:.2f}/day)'
+            )
+        self.stdout.write(self.style.SUCCESS('Reorder suggestions updated.'))
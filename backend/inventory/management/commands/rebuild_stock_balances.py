@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.balances import rebuild_balances
+from inventory.models import StockBalance, StockMove
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-location stock balances from the ledger (after bulk loads, or once after upgrading).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', help='Only this product id (repeatable)')
+        parser.add_argument('--if-empty', action='store_true', help='Do nothing if balances already exist')
+
+    def handle(self, *args, **options):
+        if options['if_empty'] and (StockBalance.objects.exists() or not StockMove.objects.exists()):
+            self.stdout.write('Stock balances already in place.')
+            return
+        start = time.perf_counter()
+        count = rebuild_balances(options['product'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{count:,} balances rebuilt in {time.perf_counter() - start:.1f}s.'
+        ))
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.balances import rebuild_balances
+from inventory.models import Location
+from inventory.verification import verify
+
+REPAIR_BATCH = 500
+
+
+class Command(BaseCommand):
+    help = ('Check stock balances against the StockMove ledger, one product range per worker process; '
+            'report mismatches and optionally rebuild them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per core)')
+        parser.add_argument('--range-size', type=int, default=2000, help='Product ids per task')
+        parser.add_argument('--checksum', action='store_true',
+                            help='Compare a checksum per range first; only ranges that differ are checked in full')
+        parser.add_argument('--repair', action='store_true', help='Rebuild the balances of mismatched products')
+        parser.add_argument('--show', type=int, default=20, help='Mismatches to list')
+        parser.add_argument('--fail', action='store_true', help='Exit non-zero on mismatches (for cron/CI)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        ranges = moves = full = 0
+        mismatches = []
+        for lo, hi, scanned, found, checked_in_full in verify(
+            options['range_size'], options['workers'], options['checksum'],
+        ):
+            ranges += 1
+            moves += scanned
+            full += checked_in_full
+            mismatches.extend(found)
+        elapsed = time.perf_counter() - start
+
+        mode = f'checksum, {full} checked in full' if options['checksum'] else 'full'
+        self.stdout.write(f'{ranges:,} ranges ({mode}), {moves:,} moves in {elapsed:.1f}s.')
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Balances match the ledger.'))
+            return
+
+        mismatches.sort()
+        codes = dict(Location.objects.values_list('id', 'code'))
+        for product_id, location_id, ledger, stored in mismatches[:options['show']]:
+            self.stdout.write(self.style.WARNING(
+                f'  product {product_id} at {codes.get(location_id, location_id)}: '
+                f'ledger {ledger}, balance {stored}'
+            ))
+        if len(mismatches) > options['show']:
+            self.stdout.write(f'  ... and {len(mismatches) - options["show"]:,} more')
+
+        product_ids = sorted({row[0] for row in mismatches})
+        summary = f'{len(mismatches):,} mismatched balances on {len(product_ids):,} products'
+        if options['repair']:
+            for i in range(0, len(product_ids), REPAIR_BATCH):
+                rebuild_balances(product_ids[i:i + REPAIR_BATCH])
+            self.stdout.write(self.style.SUCCESS(f'{summary}: rebuilt.'))
+            return
+        if options['fail']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.WARNING(summary))
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -11,8 +12,32 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class Location(models.Model):
+    """A place stock is held: the shop, the warehouse..."""
+    code = models.CharField(max_length=20, unique=True, help_text="Short code used by the API, e.g. SHOP")
+    name = models.CharField(max_length=100)
+    is_default = models.BooleanField(default=False, help_text="Where moves without a location go")
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if self.is_default:
+            Location.objects.filter(is_default=True).exclude(pk=self.pk).update(is_default=False)
+
+    @classmethod
+    def get_default(cls):
+        location = cls.objects.filter(is_default=True).first() or cls.objects.order_by('pk').first()
+        if location is None:
+            location, _ = cls.objects.get_or_create(code='MAIN', defaults={'name': 'Main', 'is_default': True})
+        return location
+
 class Product(models.Model):
     sku = models.CharField(max_length=50, unique=True, db_index=True)
+    # Unique index; NULL (no barcode) is allowed on any number of products
+    barcode = models.CharField(max_length=64, unique=True, blank=True, null=True, help_text="EAN/UPC printed on the item")
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     
@@ -26,14 +51,25 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # The POS code index (inventory.lookup) re-reads recently updated products
+        indexes = [
+            models.Index(fields=['updated_at'], name='product_updated_idx'),
+        ]
+
     def __str__(self):
         return f"{self.sku} - {self.name}"
 
+    def save(self, *args, **kwargs):
+        # '' from forms and the API means no barcode; store NULL so the unique index doesn't trip
+        if not self.barcode:
+            self.barcode = None
+        super().save(*args, **kwargs)
+
     @property
     def current_stock(self):
-        # Calculate from stock moves
-        # For simplicity in Admin display, we might want to cache this or use an annotated query
-        total = self.stock_moves.aggregate(total=models.Sum('quantity'))['total']
+        # Sum of the per-location balances (kept up to date by inventory.signals)
+        total = self.balances.aggregate(total=models.Sum('quantity'))['total']
         return total or 0
 
 class StockMove(models.Model):
@@ -42,14 +78,168 @@ class StockMove(models.Model):
         ('sale', 'Sale (OUT)'),
         ('adjustment', 'Adjustment'),
         ('return', 'Return (IN)'),
+        ('transfer', 'Transfer between locations'),
     ]
 
-    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_moves")
+    # Indexed through the (product, created_at) composite below
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_moves", db_index=False)
     quantity = models.DecimalField(max_digits=10, decimal_places=2, help_text="Positive for IN, Negative for OUT")
     move_type = models.CharField(max_length=20, choices=TYPE_CHOICES, default='adjustment')
+    # Blank on moves from before locations existed: those count as the default location
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name="stock_moves", null=True, blank=True)
     reference = models.CharField(max_length=100, blank=True, null=True)
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Found by `manage.py audit_query_plans`: product history, the admin
+        # date hierarchy and the move-type filter all sorted in a temp B-tree
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='stockmove_product_created_idx'),
+            models.Index(fields=['created_at'], name='stockmove_created_idx'),
+            models.Index(fields=['move_type', 'created_at'], name='stockmove_type_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.product.sku} ({self.quantity}) - {self.move_type}"
+
+    def save(self, *args, **kwargs):
+        if self.location_id is None:
+            self.location = Location.get_default()
+        super().save(*args, **kwargs)
+
+class StockBalance(models.Model):
+    """
+    On-hand quantity of a product at a location: the ledger summed per
+    (product, location), maintained move by move (inventory.balances).
+    """
+    # Both indexed through the unique constraint / the location index below
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="balances", db_index=False)
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name="balances", db_index=False)
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'location'], name='stockbalance_product_location_uniq'),
+        ]
+        # "What is available at the shop"
+        indexes = [
+            models.Index(fields=['location', 'quantity'], name='stockbalance_location_qty_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.location_id}: {self.quantity}"
+
+class PriceChange(models.Model):
+    """Audit record of one bulk repricing run (see inventory.pricing)."""
+    FIELD_CHOICES = [
+        ('price', 'Selling price'),
+        ('cost_price', 'Cost price'),
+    ]
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES, default='price')
+    rule = models.JSONField(help_text="kind, value, ending")
+    filters = models.JSONField(default=dict, blank=True, help_text="What was selected (API filter or admin ids)")
+    note = models.CharField(max_length=255, blank=True)
+    products_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Repricing #{self.pk} ({self.products_count} products)"
+
+class PriceChangeLine(models.Model):
+    """Old and new value of one product in a repricing run."""
+    change = models.ForeignKey(PriceChange, on_delete=models.CASCADE, related_name="lines")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="price_changes")
+    old_value = models.DecimalField(max_digits=10, decimal_places=2)
+    new_value = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.old_value} -> {self.new_value}"
+
+class StockCheckpoint(models.Model):
+    """
+    Archived moves summed per (product, location) (inventory.archive). The
+    ledger of a product is its checkpoint plus the moves still in StockMove.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="checkpoints", db_index=False)
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name="checkpoints", db_index=False)
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    moves = models.PositiveIntegerField(default=0, help_text="Archived moves behind the quantity")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'location'], name='stockcheckpoint_product_location_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.location_id}: {self.quantity}"
+
+class ArchivedPeriod(models.Model):
+    """A month of stock moves moved to cold storage."""
+    month = models.DateField(unique=True, help_text="First day of the month")
+    moves = models.PositiveIntegerField(default=0)
+    first_id = models.BigIntegerField(null=True, blank=True)
+    last_id = models.BigIntegerField(null=True, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    # Empty while the month is still being moved (an interrupted run resumes it)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-month']
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} ({self.moves} moves)"
+
+class ArchivedStockMove(models.Model):
+    """
+    A StockMove in cold storage: same id and values, kept in the 'archive'
+    database (core.routers.ArchiveRouter), so plain ids instead of FKs.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    product_id = models.BigIntegerField()
+    location_id = models.BigIntegerField(null=True, blank=True)
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    move_type = models.CharField(max_length=20, choices=StockMove.TYPE_CHOICES)
+    reference = models.CharField(max_length=100, blank=True, null=True)
+    description = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product_id', 'created_at'], name='archivedmove_product_idx'),
+            models.Index(fields=['created_at'], name='archivedmove_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} ({self.quantity}) - {self.move_type}"
+
+class ReorderSuggestion(models.Model):
+    """
+    Demand forecast and suggested purchase quantity of one active product,
+    rewritten for the whole catalog by each run of inventory.forecasting.
+    Quantities are per day unless named otherwise.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="reorder")
+    avg_7 = models.FloatField(help_text="Mean daily sales, last 7 days")
+    avg_28 = models.FloatField(help_text="Mean daily sales, last 28 days")
+    forecast = models.FloatField(help_text="Expected daily sales (exponential smoothing)")
+    demand_std = models.FloatField(help_text="Standard deviation of daily sales")
+    safety_stock = models.FloatField()
+    reorder_point = models.FloatField()
+    order_up_to = models.FloatField()
+    on_hand = models.FloatField()
+    days_of_cover = models.FloatField(null=True, blank=True, help_text="On hand / forecast; empty without demand")
+    suggested_qty = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['suggested_qty'], name='reorder_suggested_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: order {self.suggested_qty}"
@@ -0,0 +1,168 @@
+"""
+Set-based bulk repricing.
+
+A rule becomes one SQL expression over the product row. The preview
+annotates the selected products with it, and applying runs the same
+expression as a single UPDATE, so 50k products cost one statement instead of
+50k saves. Each applied run leaves a PriceChange with a line per product
+whose value moved.
+
+Bulk UPDATE sends no signals, so this bumps updated_at and the Product table
+version by hand (catalog cache, POS code index), and recomputes the stock
+value after a cost price change.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Floor, Greatest, Round
+from django.utils import timezone
+
+from core import changes
+from core.cache import bump_version
+from core.db import retry_on_lock
+from . import kpis
+from .models import PriceChange, PriceChangeLine, Product
+
+RULE_KINDS = {
+    'percent': 'Change by a percentage (+7, -10)',
+    'absolute': 'Change by an amount (+5, -2.50)',
+    'margin': 'Price = cost price plus a percentage margin',
+}
+FIELDS = ('price', 'cost_price')
+LINE_BATCH = 5000
+SAMPLE_ROWS = 20
+
+MONEY = DecimalField(max_digits=10, decimal_places=2)
+CENT = Decimal('0.01')
+
+
+class PriceRule:
+    """
+    ``kind`` is one of RULE_KINDS, ``value`` a Decimal and ``ending`` an
+    optional price ending such as 0.95 (results go to the nearest X.95).
+    """
+
+    def __init__(self, kind, value, field='price', ending=None):
+        if kind not in RULE_KINDS:
+            raise ValueError(f"Unknown rule '{kind}', expected one of: {', '.join(RULE_KINDS)}")
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field '{field}', expected one of: {', '.join(FIELDS)}")
+        if kind == 'margin' and field != 'price':
+            raise ValueError('A margin rule sets the selling price.')
+        value = Decimal(value)
+        if ending is not None:
+            ending = Decimal(ending)
+            if not Decimal('0') <= ending < Decimal('1'):
+                raise ValueError('The ending is the cents part, between 0 and 0.99.')
+        self.kind, self.value, self.field, self.ending = kind, value, field, ending
+
+    def as_dict(self):
+        rule = {'kind': self.kind, 'value': format(self.value.normalize(), 'f')}
+        if self.ending is not None:
+            rule['ending'] = format(self.ending, 'f')
+        return rule
+
+    def expression(self):
+        if self.kind == 'percent':
+            new = F(self.field) * Value(1 + self.value / 100)
+        elif self.kind == 'absolute':
+            new = F(self.field) + Value(self.value)
+        else:
+            new = F('cost_price') * Value(1 + self.value / 100)
+        new = Round(ExpressionWrapper(new, output_field=MONEY), 2, output_field=MONEY)
+        if self.ending is not None:
+            # Nearest price ending in .95: floor(x - 0.95 + 0.5) + 0.95
+            new = Floor(new - Value(self.ending) + Value(Decimal('0.5')), output_field=MONEY) + Value(self.ending)
+        # Never below zero, or below the ending itself (0.21 -> 0.95, not 0)
+        floor = Value(self.ending if self.ending is not None else Decimal('0'))
+        return Greatest(ExpressionWrapper(new, output_field=MONEY), floor, output_field=MONEY)
+
+    def applies_to(self, queryset):
+        # No margin on products without a cost price
+        if self.kind == 'margin':
+            queryset = queryset.filter(cost_price__gt=0)
+        return queryset
+
+
+def filter_products(filters):
+    """Products for an API filter: category (id or list), skus, is_active."""
+    queryset = Product.objects.all()
+    category = filters.get('category')
+    if category is not None:
+        queryset = queryset.filter(category_id__in=category if isinstance(category, list) else [category])
+    if filters.get('skus'):
+        queryset = queryset.filter(sku__in=filters['skus'])
+    if filters.get('is_active') is not None:
+        queryset = queryset.filter(is_active=filters['is_active'])
+    return queryset
+
+
+def _changes(queryset, rule):
+    """(id, sku, old, new) for every selected product, computed by the database."""
+    return (
+        rule.applies_to(queryset).order_by()
+        .annotate(new_value=rule.expression())
+        .values_list('id', 'sku', rule.field, 'new_value')
+    )
+
+
+def preview(queryset, rule, sample=SAMPLE_ROWS):
+    """What :func:`apply` would do, without writing anything."""
+    selected = changed = 0
+    before = after = Decimal('0')
+    rows = []
+    for product_id, sku, old, new in _changes(queryset, rule).iterator(chunk_size=LINE_BATCH):
+        selected += 1
+        new = new.quantize(CENT)
+        if old == new:
+            continue
+        changed += 1
+        before += old
+        after += new
+        if len(rows) < sample:
+            rows.append({'id': product_id, 'sku': sku, 'old': old, 'new': new})
+    return {
+        'field': rule.field,
+        'rule': rule.as_dict(),
+        'selected': selected,
+        'changed': changed,
+        'total_before': before,
+        'total_after': after,
+        'sample': rows,
+    }
+
+
+@retry_on_lock
+def apply(queryset, rule, user=None, filters=None, note=''):
+    """Reprice the selected products in one UPDATE and record a PriceChange."""
+    now = timezone.now()
+    change = PriceChange.objects.create(
+        user=user, field=rule.field, rule=rule.as_dict(), filters=filters or {}, note=note,
+    )
+    lines = (
+        PriceChangeLine(change=change, product_id=product_id, old_value=old, new_value=new)
+        for product_id, _, old, new in _changes(queryset, rule).iterator(chunk_size=LINE_BATCH)
+        if old != new
+    )
+    count = 0
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= LINE_BATCH:
+            PriceChangeLine.objects.bulk_create(batch)
+            count += len(batch)
+            batch = []
+    PriceChangeLine.objects.bulk_create(batch)
+    count += len(batch)
+
+    # Only rows whose value moves, so updated_at stays meaningful
+    targets = rule.applies_to(queryset).order_by().exclude(**{rule.field: rule.expression()})
+    targets.update(**{rule.field: rule.expression(), 'updated_at': now})
+    change.products_count = count
+    change.save(update_fields=['products_count'])
+    if rule.field == 'cost_price':
+        kpis.rebuild_stock_kpis()
+    # One event for the whole batch; stream clients refetch the prices
+    changes.record('product', 'repriced', price_change=change.pk, field=rule.field, count=count)
+    bump_version(Product)
+    return change
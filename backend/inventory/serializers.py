@@ -1,5 +1,8 @@
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import Product, Category, StockMove
+from .models import Product, Category, StockMove, PriceChange, Location, StockBalance, ReorderSuggestion
+from .pricing import FIELDS, RULE_KINDS, PriceRule
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
@@ -15,3 +18,68 @@ class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
+
+class LocationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Location
+        fields = '__all__'
+
+class StockBalanceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockBalance
+        fields = '__all__'
+
+class TransferSerializer(serializers.Serializer):
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    from_location = serializers.SlugRelatedField(slug_field='code', queryset=Location.objects.all())
+    to_location = serializers.SlugRelatedField(slug_field='code', queryset=Location.objects.all())
+    quantity = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    reference = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    description = serializers.CharField(required=False, allow_blank=True)
+
+    def validate(self, attrs):
+        if attrs['from_location'] == attrs['to_location']:
+            raise serializers.ValidationError('Source and destination are the same location.')
+        return attrs
+
+class RepriceFilterSerializer(serializers.Serializer):
+    category = serializers.ListField(child=serializers.IntegerField(), required=False)
+    skus = serializers.ListField(child=serializers.CharField(), required=False, max_length=100_000)
+    is_active = serializers.BooleanField(required=False, allow_null=True, default=None)
+
+    def to_internal_value(self, data):
+        # Accept a single category id as well as a list
+        if isinstance(data, dict) and isinstance(data.get('category'), int):
+            data = {**data, 'category': [data['category']]}
+        return super().to_internal_value(data)
+
+    def validate(self, attrs):
+        if not attrs.get('category') and not attrs.get('skus') and attrs.get('is_active') is None:
+            raise serializers.ValidationError('Give at least one of category, skus or is_active.')
+        return attrs
+
+class RepriceSerializer(serializers.Serializer):
+    filter = RepriceFilterSerializer()
+    field = serializers.ChoiceField(choices=FIELDS, default='price')
+    kind = serializers.ChoiceField(choices=list(RULE_KINDS.items()))
+    value = serializers.DecimalField(max_digits=10, decimal_places=4)
+    ending = serializers.DecimalField(max_digits=3, decimal_places=2, required=False, allow_null=True)
+    dry_run = serializers.BooleanField(default=True)
+    note = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+
+    def validate(self, attrs):
+        try:
+            attrs['rule'] = PriceRule(attrs['kind'], attrs['value'], attrs['field'], attrs.get('ending'))
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
+        return attrs
+
+class PriceChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PriceChange
+        fields = '__all__'
+
+class ReorderSuggestionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReorderSuggestion
+        fields = '__all__'
@@ -0,0 +1,154 @@
+from contextvars import ContextVar
+
+from django.db.models import Sum
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core import changes
+from core.cache import bump_version
+from . import kpis
+from .balances import apply_delta
+from .lookup import LEDGER_REWRITES, PRODUCT_DELETES
+from .models import Category, Product, StockMove
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=StockMove)
+def invalidate_catalog(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_categories(sender, **kwargs):
+    bump_version(Category)
+    # Deleting a category nulls Product.category with a bare UPDATE (no signals)
+    bump_version(Product)
+
+
+@receiver(post_save, sender=StockMove)
+@receiver(post_delete, sender=StockMove)
+def track_ledger_rewrites(sender, created=False, **kwargs):
+    # New moves are picked up by id and creation time; edits and deletes need a full reload of the code index
+    if not created:
+        bump_version(LEDGER_REWRITES)
+
+
+@receiver(post_delete, sender=Product)
+def track_product_deletes(sender, **kwargs):
+    # The code index re-reads recently updated products, which can't show a deletion
+    bump_version(PRODUCT_DELETES)
+
+
+# --- Per-location balances (inventory.balances) ---
+
+@receiver(pre_save, sender=StockMove)
+def remember_move(sender, instance, raw=False, **kwargs):
+    # An edit has to take the old quantity off the old balance first
+    instance._balance_before = None
+    if instance.pk and not raw:
+        instance._balance_before = (
+            StockMove.objects.filter(pk=instance.pk)
+            .values_list('product_id', 'location_id', 'quantity').first()
+        )
+
+
+@receiver(post_save, sender=StockMove)
+def update_balance(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_balance_before', None)
+    # Moves from before locations existed aren't in any balance until rebuild_stock_balances
+    if before and before[1] is not None:
+        apply_delta(before[0], before[1], -before[2], create=False)
+    apply_delta(instance.product_id, instance.location_id, instance.quantity)
+
+
+@receiver(post_delete, sender=StockMove)
+def release_balance(sender, instance, **kwargs):
+    # When the product itself is being deleted its balances (and KPIs) are going too
+    if instance.location_id is not None and instance.product_id not in _deleting_products.get():
+        apply_delta(instance.product_id, instance.location_id, -instance.quantity, create=False)
+
+
+# --- Dashboard stock KPIs (inventory.kpis); moves go through apply_delta ---
+
+# Products being deleted in this context: their moves cascade after pre_delete
+_deleting_products = ContextVar('deleting_products', default=frozenset())
+
+
+@receiver(pre_save, sender=Product)
+def remember_product(sender, instance, raw=False, **kwargs):
+    instance._kpis_before = None
+    if instance.pk and not raw:
+        instance._kpis_before = (
+            Product.objects.filter(pk=instance.pk).values_list('cost_price', 'is_active').first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def track_product_kpis(sender, instance, raw=False, **kwargs):
+    if not raw:
+        kpis.product_changed(instance.pk, getattr(instance, '_kpis_before', None),
+                             (instance.cost_price, instance.is_active))
+
+
+@receiver(pre_delete, sender=Product)
+def forget_product_kpis(sender, instance, **kwargs):
+    # While the balances are still there to say how much stock goes away
+    before = Product.objects.filter(pk=instance.pk).values_list('cost_price', 'is_active').first()
+    kpis.product_changed(instance.pk, before, None)
+    _deleting_products.set(_deleting_products.get() | {instance.pk})
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    _deleting_products.set(_deleting_products.get() - {instance.pk})
+
+
+# --- Change stream (core.changes); after the balance receivers, so stock is current ---
+
+def _publish_move(move, action):
+    if changes.is_muted():
+        return
+    # The product's total stock rides along so screens don't have to refetch it
+    sku, category_id, stock = (
+        Product.objects.filter(pk=move.product_id)
+        .annotate(stock=Sum('balances__quantity'))
+        .values_list('sku', 'category_id', 'stock').first()
+    )
+    changes.record(
+        'stock', action, move.pk, sku, category_id,
+        product=move.product_id, location=move.location_id, quantity=move.quantity,
+        move_type=move.move_type, stock=stock or 0,
+    )
+
+
+@receiver(post_save, sender=StockMove)
+def publish_move_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        _publish_move(instance, 'created' if created else 'updated')
+
+
+@receiver(post_delete, sender=StockMove)
+def publish_move_deleted(sender, instance, **kwargs):
+    # A deleted product's moves go with it; its own event says so
+    if instance.product_id not in _deleting_products.get():
+        _publish_move(instance, 'deleted')
+
+
+def _publish_product(product, action):
+    changes.record(
+        'product', action, product.pk, product.sku, product.category_id,
+        name=product.name, price=product.price, is_active=product.is_active,
+    )
+
+
+@receiver(post_save, sender=Product)
+def publish_product_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        _publish_product(instance, 'created' if created else 'updated')
+
+
+@receiver(post_delete, sender=Product)
+def publish_product_deleted(sender, instance, **kwargs):
+    _publish_product(instance, 'deleted')
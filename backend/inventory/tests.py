@@ -0,0 +1,33 @@
+from django.test import Client, TestCase
+
+from core.testing import QueryBudgetExceeded, QueryBudgetTestMixin, consume, query_budget
+from .models import Category, Location, Product, StockMove
+
+
+class InventoryQueryBudgets(QueryBudgetTestMixin, TestCase):
+    # The POS and stock screens' hot paths; none may grow with the row count
+    query_budgets = {
+        '/api/v1/inventory/products/': 1,
+        '/api/v1/inventory/moves/': 1,
+        '/api/v1/inventory/stock/': 1,
+        '/api/v1/inventory/stock/?available=1': 1,
+        '/api/v1/inventory/categories/': 1,
+        '/api/v1/inventory/products/by-sku/SKU-1/': 2,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+        locations = [Location.get_default(), Location.objects.create(code='SHOP', name='Shop')]
+        for i in range(1, 31):
+            product = Product.objects.create(
+                sku=f'SKU-{i}', name=f'Product {i}', price=10, cost_price=4, category=categories[i % 3],
+            )
+            for location in locations:
+                StockMove.objects.create(product=product, location=location, quantity=5, move_type='purchase')
+
+    def test_streamed_queries_count(self):
+        # The ledger list streams: its query runs while the body is read
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(0):
+                consume(Client().get('/api/v1/inventory/moves/'))
@@ -1,12 +1,39 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductViewSet, StockMoveViewSet, CategoryViewSet
+from core.exports import export_view
+from core.views import read_async
+from . import views
+from .exports import LEDGER_EXPORT
+from .views import (
+    ProductViewSet, StockMoveViewSet, CategoryViewSet, PriceChangeViewSet, RepriceView,
+    LocationViewSet, StockBalanceViewSet, TransferView, ProductHistoryView, ReorderSuggestionViewSet,
+)
 
 router = DefaultRouter()
 router.register(r'products', ProductViewSet)
 router.register(r'moves', StockMoveViewSet)
 router.register(r'categories', CategoryViewSet)
+router.register(r'price-changes', PriceChangeViewSet)
+router.register(r'locations', LocationViewSet)
+router.register(r'stock', StockBalanceViewSet, basename='stockbalance')
+router.register(r'reorder-suggestions', ReorderSuggestionViewSet, basename='reordersuggestion')
+
+# Hot read paths are async; writes on the same URLs still go through the viewset
+product_list = ProductViewSet.as_view({'get': 'list', 'post': 'create'})
+product_detail = ProductViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+})
 
 urlpatterns = [
+    path('products/', read_async(views.product_list, product_list), name='product-list'),
+    path('products/<int:id>/', read_async(views.product_detail, product_detail), name='product-detail'),
+    path('products/<int:id>/stock/', views.product_stock, name='product-stock'),
+    path('products/by-sku/<str:sku>/', views.product_by_sku, name='product-by-sku'),
+    path('products/<int:id>/moves/', ProductHistoryView.as_view(), name='product-history'),
+    path('lookup/', views.product_lookup, name='product-lookup'),
+    path('products/reprice/', RepriceView.as_view(), name='product-reprice'),
+    path('transfers/', TransferView.as_view(), name='stock-transfer'),
+    # Whole ledger: hot and archived moves (inventory.archive)
+    path('moves/export/', export_view(LEDGER_EXPORT), name='stockmove-export'),
     path('', include(router.urls)),
 ]
@@ -0,0 +1,137 @@
+"""
+Ledger integrity check: StockBalance rows against the StockMove ledger
+(plus the checkpoints of archived moves, see inventory.archive).
+
+Products are split into id ranges and each range is checked in a worker
+process. A full check streams the ledger summed per (product, location)
+and compares it with the balance rows. A checksum check only compares two
+integer aggregates per range, computed by the database. Ranges that
+disagree are then checked in full.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.db import connections
+from django.db.models import BigIntegerField, Count, F, Max, Min, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Round
+
+from .models import Location, Product, StockBalance, StockCheckpoint, StockMove
+
+CHUNK_ROWS = 5000
+
+
+def product_ranges(width):
+    """Half-open ``(lo, hi)`` product id ranges covering every product."""
+    bounds = Product.objects.aggregate(lo=Min('id'), hi=Max('id'))
+    if bounds['lo'] is None:
+        return []
+    last = bounds['hi'] + 1
+    return [(lo, min(lo + width, last)) for lo in range(bounds['lo'], last, width)]
+
+
+def _ledger(lo, hi, default_location):
+    # Moves from before locations existed count at the default location
+    return (
+        StockMove.objects.filter(product_id__gte=lo, product_id__lt=hi).order_by()
+        .annotate(loc=Coalesce('location_id', Value(default_location)))
+    )
+
+
+def _checksum(queryset, lo, location, locations):
+    """
+    (sum, weighted sum) in integer cents: exact on SQLite's floats too. Each
+    (product, location) pair of the range gets its own weight; ``locations``
+    is above every location id.
+    """
+    cents = Cast(Round(F('quantity') * 100), BigIntegerField())
+    weight = (F('product_id') - lo + 1) * locations + F(location)
+    return queryset.aggregate(
+        rows=Count('id'),
+        total=Coalesce(Sum(cents), 0),
+        weighted=Coalesce(Sum(cents * weight, output_field=BigIntegerField()), 0),
+    )
+
+
+def checksum_matches(lo, hi, default_location):
+    locations = max(Location.objects.aggregate(top=Max('id'))['top'] or 0, default_location) + 1
+    ledger = _checksum(_ledger(lo, hi, default_location), lo, 'loc', locations)
+    archived = _checksum(
+        StockCheckpoint.objects.filter(product_id__gte=lo, product_id__lt=hi), lo, 'location_id', locations,
+    )
+    stored = _checksum(StockBalance.objects.filter(product_id__gte=lo, product_id__lt=hi), lo, 'location_id', locations)
+    matches = (
+        (ledger['total'] + archived['total'], ledger['weighted'] + archived['weighted'])
+        == (stored['total'], stored['weighted'])
+    )
+    return matches, ledger['rows']
+
+
+def compare_range(lo, hi, default_location):
+    """``([(product_id, location_id, ledger, stored), ...], moves scanned)`` for one range."""
+    stored = dict(
+        ((product_id, location_id), quantity)
+        for product_id, location_id, quantity in StockBalance.objects.filter(
+            product_id__gte=lo, product_id__lt=hi,
+        ).values_list('product_id', 'location_id', 'quantity').iterator(chunk_size=CHUNK_ROWS)
+    )
+    totals = (
+        _ledger(lo, hi, default_location)
+        .values('product_id', 'loc').annotate(total=Sum('quantity'), moves=Count('id'))
+        .values_list('product_id', 'loc', 'total', 'moves')
+    )
+    # Archived moves (inventory.archive) count through their checkpoint
+    archived = dict(
+        ((product_id, location_id), quantity)
+        for product_id, location_id, quantity in StockCheckpoint.objects.filter(
+            product_id__gte=lo, product_id__lt=hi,
+        ).values_list('product_id', 'location_id', 'quantity')
+    )
+    mismatches = []
+    moves = 0
+    for product_id, location_id, total, count in totals.iterator(chunk_size=CHUNK_ROWS):
+        moves += count
+        total += archived.pop((product_id, location_id), 0)
+        balance = stored.pop((product_id, location_id), 0)
+        if balance != total:
+            mismatches.append((product_id, location_id, total, balance))
+    for key, total in archived.items():
+        balance = stored.pop(key, 0)
+        if balance != total:
+            mismatches.append((*key, total, balance))
+    # Balances with no moves behind them should be zero
+    mismatches.extend((product_id, location_id, 0, balance)
+                      for (product_id, location_id), balance in stored.items() if balance)
+    return mismatches, moves
+
+
+def check_range(lo, hi, default_location, checksum=False):
+    """Worker task: ``(lo, hi, moves scanned, mismatches, checked in full)``."""
+    if checksum:
+        matches, moves = checksum_matches(lo, hi, default_location)
+        if matches:
+            return lo, hi, moves, [], False
+    mismatches, moves = compare_range(lo, hi, default_location)
+    return lo, hi, moves, mismatches, True
+
+
+def _init_worker():
+    import django
+    django.setup()
+    # Never reuse a connection inherited from the parent process
+    connections.close_all()
+
+
+def verify(width=2000, workers=None, checksum=False):
+    """Yield :func:`check_range` results as ranges finish (in any order)."""
+    default_location = Location.get_default().pk
+    ranges = product_ranges(width)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for lo, hi in ranges:
+            yield check_range(lo, hi, default_location, checksum)
+        return
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = [pool.submit(check_range, lo, hi, default_location, checksum) for lo, hi in ranges]
+        for future in as_completed(futures):
+            yield future.result()
@@ -1,17 +1,241 @@
+import orjson
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-from .models import Product, StockMove, Category
-from .serializers import ProductSerializer, StockMoveSerializer, CategorySerializer
+from rest_framework.views import APIView
+from core import jobs
+from core.cache import CachedReadMixin, acached
+from core.db import RetryOnLockMixin
+from core.serialization import FastListMixin, afast_rows, dumps, serializer_columns
+from core.views import api_auth, job_accepted, not_found
+from . import archive, balances, pricing
+from .lookup import code_index
+from .models import Product, StockMove, Category, PriceChange, Location, StockBalance, ReorderSuggestion
+from .serializers import (
+    ProductSerializer, StockMoveSerializer, CategorySerializer, PriceChangeSerializer, RepriceSerializer,
+    LocationSerializer, StockBalanceSerializer, TransferSerializer, ReorderSuggestionSerializer,
+)
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CachedReadMixin, RetryOnLockMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     lookup_field = 'id'
+    cache_models = (Product,)
 
-class StockMoveViewSet(viewsets.ModelViewSet):
+class StockMoveViewSet(FastListMixin, RetryOnLockMixin, viewsets.ModelViewSet):
     queryset = StockMove.objects.all()
     serializer_class = StockMoveSerializer
+    # The ledger can be millions of rows: stream it rather than build one big body
+    fast_list_stream = True
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedReadMixin, RetryOnLockMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cache_models = (Category,)
+
+class LocationViewSet(RetryOnLockMixin, viewsets.ModelViewSet):
+    queryset = Location.objects.order_by('code')
+    serializer_class = LocationSerializer
+
+class StockBalanceViewSet(FastListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Per-location balances. Filters: ?location=<code or id>, ?product=<id>
+    (repeatable), ?sku=<sku>, ?available=1 (quantity above zero).
+    """
+    serializer_class = StockBalanceSerializer
+
+    def get_queryset(self):
+        queryset = StockBalance.objects.all()
+        params = self.request.query_params
+        location = params.get('location')
+        if location:
+            queryset = queryset.filter(location_id=location) if location.isdigit() else queryset.filter(location__code=location)
+        if params.getlist('product'):
+            queryset = queryset.filter(product_id__in=params.getlist('product'))
+        if params.get('sku'):
+            queryset = queryset.filter(product__sku=params['sku'])
+        if params.get('available') in ('1', 'true'):
+            queryset = queryset.filter(quantity__gt=0)
+        return queryset
+
+class TransferView(APIView):
+    """Move stock between locations: {"product", "from_location", "to_location", "quantity"}."""
+
+    def post(self, request):
+        serializer = TransferSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        moves = balances.transfer(
+            data['product'], data['from_location'], data['to_location'], data['quantity'],
+            reference=data.get('reference'), description=data.get('description'),
+        )
+        return Response(StockMoveSerializer(moves, many=True).data, status=status.HTTP_201_CREATED)
+
+class ProductHistoryView(APIView):
+    """
+    Moves of one product, newest first, hot and archived alike
+    (inventory.archive). ?limit=<n> (default 100, at most 1000); the next
+    page is ?before=<created_at of the last row>.
+    """
+    MAX_LIMIT = 1000
+
+    def get(self, request, id):
+        if not Product.objects.filter(id=id).exists():
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            limit = min(int(request.query_params.get('limit', 100)), self.MAX_LIMIT)
+        except ValueError:
+            return Response({'detail': 'limit must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+        before = request.query_params.get('before')
+        if before:
+            before = parse_datetime(before.replace(' ', '+'))
+            if before is None:
+                return Response({'detail': 'Invalid before.'}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(before):
+                before = timezone.make_aware(before)
+        moves = archive.product_history(id, max(limit, 1), before or None)
+        return Response({'results': moves, 'before': moves[-1]['created_at'] if moves else None})
+
+class RepriceView(APIView):
+    """
+    Bulk repricing (inventory.pricing). Dry run by default: returns a preview;
+    with "dry_run": false queues the rule as a background job (202 and the
+    job, whose result points at the PriceChange audit record).
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = RepriceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if data['dry_run']:
+            return Response(pricing.preview(pricing.filter_products(data['filter']), data['rule']))
+        rule = data['rule']
+        job = jobs.enqueue('inventory.reprice', {
+            'filter': dict(data['filter']), 'rule': rule.as_dict(), 'field': rule.field, 'note': data['note'],
+        }, priority=10, user=request.user)
+        return job_accepted(job)
+
+class PriceChangeViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = PriceChange.objects.order_by('-id')
+    serializer_class = PriceChangeSerializer
+    permission_classes = [IsAdminUser]
+
+class ReorderSuggestionViewSet(FastListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Reorder suggestions from the last forecast (inventory.forecasting),
+    largest first. Filters: ?needed=1 (something to order), ?category=<id>,
+    ?product=<id> (repeatable). POST refresh/ recomputes them in the
+    background.
+    """
+    serializer_class = ReorderSuggestionSerializer
+
+    def get_queryset(self):
+        queryset = ReorderSuggestion.objects.order_by('-suggested_qty', 'product_id')
+        params = self.request.query_params
+        if params.get('needed') in ('1', 'true'):
+            queryset = queryset.filter(suggested_qty__gt=0)
+        if params.get('category'):
+            queryset = queryset.filter(product__category_id=params['category'])
+        if params.getlist('product'):
+            queryset = queryset.filter(product_id__in=params.getlist('product'))
+        return queryset
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def refresh(self, request):
+        return job_accepted(jobs.enqueue('inventory.forecast', user=request.user))
+
+
+# --- Async read paths (served on the event loop under config.asgi) ---
+# Payloads come from the catalog cache (core.cache), versioned by the tables they read.
+
+@api_auth
+async def product_list(request):
+    # Cached as encoded JSON, so a hit skips both the query and the encoding
+    async def build():
+        return dumps(await afast_rows(Product.objects.all(), serializer_columns(ProductSerializer)))
+    body = await acached('products:list', (Product,), request.GET.lists(), build)
+    return HttpResponse(body, content_type='application/json')
+
+@api_auth
+async def product_detail(request, id):
+    async def build():
+        product = await Product.objects.filter(id=id).afirst()
+        return ProductSerializer(product).data if product else {}
+    data = await acached('products:detail', (Product,), {'id': id}, build)
+    if not data:
+        return not_found()
+    return JsonResponse(data)
+
+@api_auth
+async def product_stock(request, id):
+    """Total and per-location stock, from the balances in one query."""
+    async def build():
+        rows = [row async for row in Product.objects.filter(id=id).values_list(
+            'sku', 'balances__location__code', 'balances__quantity')]
+        if not rows:
+            return {}
+        locations = {code: quantity for _, code, quantity in rows if code is not None}
+        return {'id': id, 'sku': rows[0][0], 'stock': sum(locations.values()), 'locations': locations}
+    data = await acached('products:stock', (Product, StockMove), {'id': id}, build)
+    if not data:
+        return not_found()
+    return JsonResponse(data)
+
+@api_auth
+async def product_by_sku(request, sku):
+    """Exact SKU lookup with the current stock level, in total and per location."""
+    async def build():
+        product = await Product.objects.filter(sku=sku).afirst()
+        if product is None:
+            return {}
+        locations = {code: quantity async for code, quantity in StockBalance.objects.filter(
+            product=product).values_list('location__code', 'quantity')}
+        return {**ProductSerializer(product).data, 'current_stock': sum(locations.values()), 'locations': locations}
+    data = await acached('products:sku', (Product, StockMove), {'sku': sku}, build)
+    if not data:
+        return not_found()
+    return JsonResponse(data)
+
+
+MAX_LOOKUP_CODES = 200
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+@api_auth
+async def product_lookup(request):
+    """
+    Barcode / exact SKU lookup for the point of sale, from the in-process
+    code index (inventory.lookup). Batches: GET ?code=A&code=B (or
+    ?codes=A,B) or POST {"codes": [...]}.
+    """
+    if request.method == 'POST':
+        try:
+            codes = orjson.loads(request.body).get('codes')
+        except (orjson.JSONDecodeError, AttributeError):
+            codes = None
+        if not isinstance(codes, list) or not all(isinstance(c, str) for c in codes):
+            return JsonResponse({'detail': 'Expected {"codes": ["...", ...]}.'}, status=400)
+    else:
+        codes = request.GET.getlist('code') + [c for v in request.GET.getlist('codes') for c in v.split(',')]
+    codes = list(dict.fromkeys(c.strip() for c in codes if c.strip()))
+    if not codes:
+        return JsonResponse({'detail': 'No codes given.'}, status=400)
+    if len(codes) > MAX_LOOKUP_CODES:
+        return JsonResponse({'detail': f'At most {MAX_LOOKUP_CODES} codes per call.'}, status=400)
+
+    if code_index.is_stale():
+        await sync_to_async(code_index.refresh)()
+    found = code_index.resolve(codes)
+    body = {
+        'results': {code: entry for code, entry in found.items() if entry is not None},
+        'missing': [code for code, entry in found.items() if entry is None],
+    }
+    return HttpResponse(dumps(body), content_type='application/json')
@@ -1,15 +1,54 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from core.admin_mixins import AutocompleteMixin, LargeTableAdminMixin
+from core.exports import export_actions
+from .exports import export_orders
+from .models import CategorySales, CustomerSales, DailySales, Order, OrderItem
 
-class OrderItemInline(admin.TabularInline):
+class OrderItemInline(AutocompleteMixin, admin.TabularInline):
     model = OrderItem
     extra = 0
-    readonly_fields = ('subtotal',)
+    readonly_fields = ('subtotal', 'unit_cost')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ('external_id', 'customer', 'status', 'total_amount', 'created_at', 'ai_risk_score')
+class OrderAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('external_id', 'customer', 'status', 'total_amount', 'placed_at', 'created_at', 'ai_risk_score')
     list_filter = ('status', 'created_at')
     search_fields = ('external_id', 'customer__username', 'customer__email')
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
     inlines = [OrderItemInline]
     readonly_fields = ('ai_risk_score', 'ai_notes')
+    actions = export_actions(export_orders)
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = ('day', 'orders', 'amount', 'units', 'item_amount', 'cost')
+    date_hierarchy = 'day'
+    # Kept by orders.sales from the orders themselves
+    readonly_fields = ('day', 'orders', 'amount', 'units', 'item_amount', 'cost')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(CategorySales)
+class CategorySalesAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('day', 'category', 'quantity', 'amount', 'cost')
+    list_filter = ('category',)
+    date_hierarchy = 'day'
+    readonly_fields = ('day', 'category', 'quantity', 'amount', 'cost')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(CustomerSales)
+class CustomerSalesAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('day', 'customer', 'orders', 'amount', 'units', 'item_amount', 'cost')
+    search_fields = ('customer__username', 'customer__email')
+    date_hierarchy = 'day'
+    readonly_fields = ('day', 'customer', 'orders', 'amount', 'units', 'item_amount', 'cost')
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,64 @@
+from itertools import groupby
+
+from core.exports import (
+    CHUNK_ROWS, csv_chunks, export_response, local_row, ndjson_chunks, register,
+)
+from .models import Order
+
+ORDER_FIELDS = [
+    ('order_id', 'id'),
+    ('external_id', 'external_id'),
+    ('created_at', 'created_at'),
+    ('placed_at', 'placed_at'),
+    ('status', 'status'),
+    ('customer', 'customer__email'),
+    ('currency', 'currency'),
+    ('total_amount', 'total_amount'),
+]
+ITEM_FIELDS = [
+    ('sku', 'items__product__sku'),
+    ('quantity', 'items__quantity'),
+    ('unit_price', 'items__unit_price'),
+    ('subtotal', 'items__subtotal'),
+]
+
+
+def filter_orders(queryset, params, query):
+    """Order filters: date range plus ?status=<status>."""
+    queryset = params.filter_dates(queryset)
+    if query.get('status'):
+        queryset = queryset.filter(status=query['status'])
+    return queryset
+
+
+def _rows(queryset):
+    # One row per item (LEFT JOIN, so orders without items still appear once)
+    lookups = [lookup for _, lookup in ORDER_FIELDS + ITEM_FIELDS]
+    rows = queryset.order_by('created_at', 'id', 'items__id').values_list(*lookups)
+    for row in rows.iterator(chunk_size=CHUNK_ROWS):
+        yield local_row(row)
+
+
+def _order_records(rows):
+    """Fold the consecutive item rows of each order into one NDJSON record."""
+    order_keys = [name for name, _ in ORDER_FIELDS]
+    item_keys = [name for name, _ in ITEM_FIELDS]
+    split = len(order_keys)
+    for _, group in groupby(rows, key=lambda row: row[0]):
+        group = list(group)
+        record = dict(zip(order_keys, group[0][:split]))
+        record['items'] = [dict(zip(item_keys, row[split:])) for row in group if row[split] is not None]
+        yield record
+
+
+def export_orders(queryset, params):
+    """CSV: one line per order item. NDJSON: one line per order with its items."""
+    rows = _rows(queryset)
+    if params.format == 'csv':
+        chunks = csv_chunks([name for name, _ in ORDER_FIELDS + ITEM_FIELDS], rows)
+    else:
+        chunks = ndjson_chunks(_order_records(rows))
+    return export_response(chunks, params.format, 'orders', params.compress)
+
+
+ORDERS_EXPORT = register('orders', Order.objects.all, filter_orders, export_orders)
@@ -0,0 +1,12 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from core.query_plans import register
+from .models import Order
+
+register('orders.order.by_status', lambda: Order.objects.filter(status='processing').order_by('-created_at'))
+register('orders.order.recent', lambda: Order.objects.filter(
+    created_at__gte=timezone.now() - timedelta(days=1)).order_by('-created_at'))
+register('admin.order.by_status', lambda: Order.objects.filter(
+    status='pending', created_at__gte=timezone.now() - timedelta(days=30)).order_by('-created_at'))
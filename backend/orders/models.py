@@ -1,6 +1,6 @@
 from django.db import models
 from django.conf import settings
-from inventory.models import Product
+from inventory.models import Category, Product
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -8,6 +8,11 @@ class Order(models.Model):
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
+        # The rest of WooCommerce's, kept as the store has them so the
+        # reconciler's hashes match (orders.reconciliation)
+        ('on-hold', 'On hold'),
+        ('refunded', 'Refunded'),
+        ('failed', 'Failed'),
     ]
 
     external_id = models.CharField(max_length=100, unique=True, db_index=True, help_text="WooCommerce Order ID")
@@ -19,9 +24,20 @@ class Order(models.Model):
     ai_risk_score = models.FloatField(blank=True, null=True)
     ai_notes = models.TextField(blank=True, null=True)
     
+    # When the order was placed in the store (WooCommerce date_created); older
+    # rows only have created_at, the time they were synced
+    placed_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Status tabs and "recent orders" both filter then sort by date
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            models.Index(fields=['placed_at'], name='order_placed_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.external_id} - {self.customer}"
 
@@ -31,6 +47,108 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField()
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    # The product's cost price when the item was sold, so margins (orders.sales)
+    # don't move when the cost price does; blank on items from before
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
 
     def __str__(self):
         return f"{self.quantity}x {self.product.sku} in #{self.order.external_id}"
+
+    def save(self, *args, **kwargs):
+        if self.unit_cost is None:
+            self.unit_cost = Product.objects.filter(pk=self.product_id).values_list('cost_price', flat=True).first()
+        super().save(*args, **kwargs)
+
+class DailySales(models.Model):
+    """
+    Orders and revenue per local day, cancelled orders left out (orders.sales).
+    ``amount`` is what the orders came to; units, item_amount and cost are
+    from their items, item_amount - cost being the margin.
+    """
+    day = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+    item_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily sales"
+
+    def __str__(self):
+        return f"{self.day}: {self.orders} orders, {self.amount}"
+
+class ProductSales(models.Model):
+    """Units and revenue of one product per local day (orders.sales)."""
+    day = models.DateField()
+    # Indexed through productsales_product_day_idx
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_sales", db_index=False)
+    quantity = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Product sales"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='productsales_day_product_uniq'),
+        ]
+        # Best sellers of a day straight off the index, however many products sold
+        indexes = [
+            models.Index(fields=['day', 'quantity', 'product'], name='productsales_day_qty_idx'),
+            # Covers the report's sums by product over long ranges (orders.sales.report)
+            models.Index(fields=['product', 'day', 'quantity', 'amount', 'cost'], name='productsales_product_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.product_id}: {self.quantity}"
+
+class CategorySales(models.Model):
+    """
+    Units, revenue and cost of a category per local day (orders.sales). A
+    product moved to another category takes its sales along; products
+    without one are what DailySales has beyond these.
+    """
+    day = models.DateField()
+    # Indexed through the unique constraint below
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="daily_sales", db_index=False)
+    quantity = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Category sales"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='categorysales_day_category_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.category_id}: {self.amount}"
+
+class CustomerSales(models.Model):
+    """Orders, units, revenue and cost of one customer per local day (orders.sales)."""
+    day = models.DateField()
+    # Indexed through customersales_customer_day_idx
+    customer = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="daily_sales", db_index=False,
+    )
+    orders = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+    item_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Customer sales"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'customer'], name='customersales_day_customer_uniq'),
+        ]
+        # Covers the report's sums by customer over long ranges (orders.sales.report)
+        indexes = [
+            models.Index(
+                fields=['customer', 'day', 'orders', 'amount', 'units', 'item_amount', 'cost'],
+                name='customersales_customer_day_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.customer_id}: {self.amount}"
@@ -0,0 +1,86 @@
+"""
+Range digests of orders, for reconciling with WooCommerce
+(middleware/reconcile.py).
+
+A digest of a time range is the number of orders placed in it plus a hash
+of their ids, totals and statuses. The hash of a range is the sum (mod
+2**64) of one hash per order, so it doesn't depend on row order and the
+digests of many sub-ranges come out of a single scan. The reconciler hashes
+what WooCommerce returns the same way (order_hash() there must stay in
+step with this one) and only drills into ranges whose digests differ.
+
+Orders fall into ranges by placed_at (the store's order date), or by
+created_at for rows synced before placed_at existed. With several stores
+each one's external ids start with its prefix (middleware/sync_engine.py),
+so a store's orders are those with its prefix, less the other stores'.
+"""
+import bisect
+import hashlib
+from decimal import Decimal
+
+from django.db.models import Q
+
+from .models import Order
+
+MASK = 2 ** 64 - 1
+CENT = Decimal('0.01')
+MAX_PARTS = 1000
+MAX_ROWS = 10_000
+
+
+def order_hash(external_id, total, status):
+    value = f'{external_id}|{Decimal(total).quantize(CENT)}|{status}'
+    return int.from_bytes(hashlib.sha1(value.encode()).digest()[:8], 'big')
+
+
+def combine(hashes):
+    return f'{sum(hashes) & MASK:016x}'
+
+
+def placed_between(after, before, statuses=None, prefix='', exclude=()):
+    """
+    Orders placed in [after, before); an OR of two index ranges, not a scan.
+    ``prefix``/``exclude``: external id prefixes to keep / leave out.
+    """
+    orders = Order.objects.filter(
+        Q(placed_at__gte=after, placed_at__lt=before)
+        | Q(placed_at__isnull=True, created_at__gte=after, created_at__lt=before)
+    )
+    if prefix:
+        orders = orders.filter(external_id__startswith=prefix)
+    for other in exclude:
+        orders = orders.exclude(external_id__startswith=other)
+    return orders.filter(status__in=statuses) if statuses else orders
+
+
+def _rows(after, before, statuses, prefix='', exclude=()):
+    rows = placed_between(after, before, statuses, prefix, exclude).values_list(
+        'external_id', 'total_amount', 'status', 'placed_at', 'created_at',
+    )
+    for external_id, total, status, placed_at, created_at in rows.iterator(chunk_size=5000):
+        yield external_id, total, status, placed_at or created_at
+
+
+def digests(after, before, parts=1, statuses=None, prefix='', exclude=()):
+    """``parts`` equal sub-ranges of [after, before), each with its count and hash."""
+    step = (before - after) / parts
+    # Cut at whole seconds, WooCommerce's resolution
+    bounds = [after] + [(after + step * i).replace(microsecond=0) for i in range(1, parts)] + [before]
+    counts = [0] * parts
+    hashes = [[] for _ in range(parts)]
+    for external_id, total, status, at in _rows(after, before, statuses, prefix, exclude):
+        i = min(bisect.bisect_right(bounds, at) - 1, parts - 1)
+        counts[i] += 1
+        hashes[i].append(order_hash(external_id, total, status))
+    return [
+        {'after': bounds[i], 'before': bounds[i + 1], 'count': counts[i], 'hash': combine(hashes[i])}
+        for i in range(parts)
+    ]
+
+
+def rows(after, before, statuses=None, ids=None, prefix='', exclude=()):
+    """``[external_id, total, status]`` of the orders in the range (or with these external ids)."""
+    if ids is not None:
+        orders = Order.objects.filter(external_id__in=ids).values_list('external_id', 'total_amount', 'status')
+        return [[external_id, total, status] for external_id, total, status in orders]
+    return [[external_id, total, status] for external_id, total, status, _ in _rows(after, before, statuses, prefix, exclude)]
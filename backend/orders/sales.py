@@ -0,0 +1,388 @@
+"""
+Sales rollups and the open-orders counter, for the dashboard and reports.
+
+Per local day, cancelled, refunded and failed orders left out:
+- DailySales: orders and what they came to, plus units, revenue and cost
+  of their items.
+- ProductSales and CategorySales: units, revenue and cost per product and
+  per category. A product keeps its sales when it changes category; they
+  move with it.
+- CustomerSales: the same as DailySales, per customer.
+The 'orders.open' counter holds how many orders are pending, on hold or
+processing.
+
+An order counts on the day it was placed (placed_at; created_at for orders
+synced before that existed). Cost is quantity * OrderItem.unit_cost, the
+cost price when the item was sold, so a margin doesn't move afterwards.
+
+orders.signals moves the rollups on every Order, OrderItem and Product
+save/delete, in the same transaction: a cancelled or refunded order takes
+its amounts back off. rebuild_sales() (`manage.py rebuild_sales`)
+recomputes them after bulk loads. report() answers any date range from the
+rollups alone.
+"""
+from collections import defaultdict
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import DateField, F, Func, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from core import counters
+from inventory.models import Category, Product
+from .models import CategorySales, CustomerSales, DailySales, Order, OrderItem, ProductSales
+
+# Customers being deleted in this context (set by orders.signals)
+deleting_customers = ContextVar('deleting_customers', default=frozenset())
+
+OPEN_STATUSES = ('pending', 'on-hold', 'processing')
+UNCOUNTED_STATUSES = ('cancelled', 'refunded', 'failed')
+OPEN_ORDERS = 'orders.open'
+CENT = Decimal('0.01')
+ZERO = Decimal('0')
+REPORT_GROUPS = ('day', 'month', 'product', 'category', 'customer')
+REPORT_ORDERS = ('revenue', 'units', 'margin')
+REPORT_MAX_ROWS = 1000
+# Product and customer rankings over more days than this read the covering indexes
+INDEX_SCAN_DAYS = 62
+WRITE_BATCH = 5000
+
+
+def _counted(status):
+    return status not in UNCOUNTED_STATUSES
+
+
+def _day(placed_at, created_at):
+    return timezone.localdate(placed_at or created_at)
+
+
+def _bump(model, lookup, **deltas):
+    """Add ``deltas`` to the row matching ``lookup``, creating it the first time."""
+    rows = model.objects.filter(**lookup)
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Someone else created it first
+        rows.update(**changes)
+
+
+def _bump_customer(day, customer_id, **deltas):
+    # A customer being deleted takes their rows along; the cascading order
+    # deletes mustn't write new ones for them
+    if customer_id not in deleting_customers.get():
+        _bump(CustomerSales, {'day': day, 'customer_id': customer_id}, **deltas)
+
+
+def _cost(quantity, unit_cost, cost_price):
+    # Items from before unit_cost have none until rebuild_sales() fills it in
+    return quantity * Decimal(unit_cost if unit_cost is not None else cost_price or 0)
+
+
+def _apply(day, customer_id, lines, sign):
+    """Add (or take off) item ``lines``: (product_id, category_id, quantity, amount, cost)."""
+    units, amount, cost = 0, ZERO, ZERO
+    for product_id, category_id, line_quantity, line_amount, line_cost in lines:
+        deltas = {'quantity': sign * line_quantity, 'amount': sign * line_amount, 'cost': sign * line_cost}
+        _bump(ProductSales, {'day': day, 'product_id': product_id}, **deltas)
+        if category_id is not None:
+            _bump(CategorySales, {'day': day, 'category_id': category_id}, **deltas)
+        units += line_quantity
+        amount += line_amount
+        cost += line_cost
+    if lines:
+        deltas = {'units': sign * units, 'item_amount': sign * amount, 'cost': sign * cost}
+        _bump(DailySales, {'day': day}, **deltas)
+        _bump_customer(day, customer_id, **deltas)
+
+
+def _add_items(order_id, day, customer_id, sign):
+    items = OrderItem.objects.filter(order_id=order_id).values_list(
+        'product_id', 'product__category_id', 'quantity', 'subtotal', 'unit_cost', 'product__cost_price',
+    )
+    lines = [
+        (product_id, category_id, quantity, Decimal(subtotal), _cost(quantity, unit_cost, cost_price))
+        for product_id, category_id, quantity, subtotal, unit_cost, cost_price in items
+    ]
+    _apply(day, customer_id, lines, sign)
+
+
+def order_changed(order_id, before, after):
+    """
+    ``before``/``after``: (status, total_amount, created_at, placed_at,
+    customer_id), None for created/deleted.
+    """
+    if before == after:
+        return
+    for state, sign in ((before, -1), (after, 1)):
+        if state is None:
+            continue
+        status, total, created_at, placed_at, customer_id = state
+        if status in OPEN_STATUSES:
+            counters.add(OPEN_ORDERS, sign)
+        if _counted(status):
+            day = _day(placed_at, created_at)
+            _bump(DailySales, {'day': day}, orders=sign, amount=sign * Decimal(total))
+            _bump_customer(day, customer_id, orders=sign, amount=sign * Decimal(total))
+    # Items follow their order into or out of the rollups (cancelled, moved to
+    # another day or customer). On create and delete the item signals do it.
+    if before and after:
+        old = (_counted(before[0]), _day(before[3], before[2]), before[4])
+        new = (_counted(after[0]), _day(after[3], after[2]), after[4])
+        if old != new:
+            if old[0]:
+                _add_items(order_id, old[1], old[2], -1)
+            if new[0]:
+                _add_items(order_id, new[1], new[2], 1)
+
+
+def item_changed(before, after):
+    """``before``/``after``: (order_id, product_id, quantity, subtotal, unit_cost), None for created/deleted."""
+    if before == after:
+        return
+    for state, sign in ((before, -1), (after, 1)):
+        if state is None:
+            continue
+        order_id, product_id, quantity, subtotal, unit_cost = state
+        order = Order.objects.filter(pk=order_id).values_list(
+            'status', 'created_at', 'placed_at', 'customer_id',
+        ).first()
+        if order is None or not _counted(order[0]):
+            continue
+        status, created_at, placed_at, customer_id = order
+        category_id, cost_price = Product.objects.filter(pk=product_id).values_list(
+            'category_id', 'cost_price',
+        ).first()
+        line = (product_id, category_id, quantity, Decimal(subtotal), _cost(quantity, unit_cost, cost_price))
+        _apply(_day(placed_at, created_at), customer_id, [line], sign)
+
+
+def product_recategorized(product_id, old_category_id, new_category_id):
+    """Move a product's sales from its old category's rollups to the new one's."""
+    history = ProductSales.objects.filter(product_id=product_id).values_list('day', 'quantity', 'amount', 'cost')
+    for day, quantity, amount, cost in history:
+        for category_id, sign in ((old_category_id, -1), (new_category_id, 1)):
+            if category_id is not None:
+                _bump(CategorySales, {'day': day, 'category_id': category_id},
+                      quantity=sign * quantity, amount=sign * amount, cost=sign * cost)
+
+
+def customers_merged(from_ids, to_id):
+    """Orders of ``from_ids`` were moved to ``to_id`` (bulk update, no signals): move their rollups too."""
+    rows = CustomerSales.objects.filter(customer_id__in=from_ids)
+    for day, orders, amount, units, item_amount, cost in rows.values_list(
+        'day', 'orders', 'amount', 'units', 'item_amount', 'cost',
+    ):
+        _bump(CustomerSales, {'day': day, 'customer_id': to_id},
+              orders=orders, amount=amount, units=units, item_amount=item_amount, cost=cost)
+    rows.delete()
+
+
+def _insert(cursor, model, columns, rows):
+    """Write ``rows`` (tuples in ``columns`` order) with one prepared statement, WRITE_BATCH at a time."""
+    quote = cursor.db.ops.quote_name
+    sql = (f'INSERT INTO {quote(model._meta.db_table)} ({", ".join(quote(column) for column in columns)}) '
+           f'VALUES ({", ".join(["%s"] * len(columns))})')
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= WRITE_BATCH:
+            cursor.executemany(sql, batch)
+            batch = []
+    cursor.executemany(sql, batch)
+
+
+def _figures_row():
+    # orders, amount, units, item amount, cost
+    return [0, ZERO, 0, ZERO, ZERO]
+
+
+def rebuild_sales():
+    """Recompute the rollups and the open-orders counter from the orders."""
+    connection = connections[router.db_for_write(DailySales)]
+    counted = Order.objects.using(connection.alias).exclude(status__in=UNCOUNTED_STATUSES)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        # Items from before unit_cost: today's cost price is the best there is
+        OrderItem.objects.using(connection.alias).filter(unit_cost=None).update(
+            unit_cost=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('cost_price')[:1]),
+        )
+        for model in (DailySales, ProductSales, CategorySales, CustomerSales):
+            model.objects.using(connection.alias).all().delete()
+
+        # Local days are worked out here rather than in SQL: SQLite converts
+        # time zones in a Python function, row by row
+        days, customers, placed = defaultdict(_figures_row), defaultdict(_figures_row), {}
+        for pk, placed_at, created_at, customer_id, total in counted.values_list(
+            'pk', 'placed_at', 'created_at', 'customer_id', 'total_amount',
+        ).iterator(chunk_size=WRITE_BATCH):
+            day = _day(placed_at, created_at)
+            placed[pk] = (day, customer_id)
+            for figures in (days[day], customers[day, customer_id]):
+                figures[0] += 1
+                figures[1] += total
+
+        # Items come in the order of their days, so the per-product and
+        # per-category sums of a day can be written once the next one starts
+        items = (
+            OrderItem.objects.using(connection.alias).filter(order__in=counted)
+            .order_by(Coalesce('order__placed_at', 'order__created_at'))
+            .values_list('order_id', 'product_id', 'product__category_id', 'quantity', 'subtotal', 'unit_cost')
+        )
+
+        category_rows = []
+
+        def product_rows():
+            current, products, categories = None, defaultdict(_figures_row), defaultdict(_figures_row)
+
+            def flush():
+                category_rows.extend((current, pk, f[2], f[3], f[4]) for pk, f in categories.items())
+                return ((current, pk, f[2], f[3], f[4]) for pk, f in products.items())
+
+            for order_id, product_id, category_id, quantity, amount, unit_cost in items.iterator(
+                chunk_size=WRITE_BATCH,
+            ):
+                day, customer_id = placed[order_id]
+                if day != current:
+                    yield from flush()
+                    current, products, categories = day, defaultdict(_figures_row), defaultdict(_figures_row)
+                cost = quantity * (unit_cost or ZERO)
+                touched = [products[product_id], days[day], customers[day, customer_id]]
+                if category_id is not None:
+                    touched.append(categories[category_id])
+                for figures in touched:
+                    figures[2] += quantity
+                    figures[3] += amount
+                    figures[4] += cost
+            yield from flush()
+
+        _insert(cursor, ProductSales, ('day', 'product_id', 'quantity', 'amount', 'cost'), product_rows())
+        _insert(cursor, CategorySales, ('day', 'category_id', 'quantity', 'amount', 'cost'), category_rows)
+        _insert(cursor, DailySales, ('day', 'orders', 'amount', 'units', 'item_amount', 'cost'),
+                ((day, *figures) for day, figures in days.items()))
+        _insert(cursor, CustomerSales, ('day', 'customer_id', 'orders', 'amount', 'units', 'item_amount', 'cost'),
+                ((day, customer_id, *figures) for (day, customer_id), figures in customers.items()))
+        counters.set_value(OPEN_ORDERS, counted.filter(status__in=OPEN_STATUSES).count())
+
+
+def sales_since(day):
+    """(orders, amount) from ``day`` to today."""
+    totals = DailySales.objects.filter(day__gte=day).aggregate(orders=Sum('orders'), amount=Sum('amount'))
+    return totals['orders'] or 0, (totals['amount'] or Decimal('0')).quantize(CENT)
+
+
+def top_products(day, limit=10):
+    """Best sellers of one day by units (a backward scan of the day's index range)."""
+    return list(
+        ProductSales.objects.filter(day=day, quantity__gt=0)
+        .order_by('-quantity', '-product_id')
+        .values('product_id', 'product__sku', 'product__name', 'quantity', 'amount')[:limit]
+    )
+
+
+# --- Reports ---
+
+def _figures(units, revenue, cost, **extra):
+    revenue, cost = (revenue or ZERO).quantize(CENT), (cost or ZERO).quantize(CENT)
+    margin = revenue - cost
+    return {
+        **extra, 'units': units or 0, 'revenue': revenue, 'cost': cost, 'margin': margin,
+        'margin_pct': float(round(margin / revenue * 100, 1)) if revenue else None,
+    }
+
+
+def _in_days(queryset, start, end):
+    if (end - start).days > INDEX_SCAN_DAYS and connections[queryset.db].vendor == 'sqlite':
+        # SQLite takes any day range on the (day, ...) indexes and then groups
+        # in a temporary b-tree, ten times slower over a year or two than
+        # reading the (product|customer, day, ...) covering index in order.
+        # A unary + on the column keeps it off the day indexes.
+        day = Func(F('day'), template='+%(expressions)s', output_field=DateField())
+        return queryset.alias(index_day=day).filter(index_day__gte=start, index_day__lte=end)
+    return queryset.filter(day__gte=start, day__lte=end)
+
+
+def _ranked(queryset, key, order, limit, units='quantity', revenue='amount', **extra):
+    """``queryset`` grouped by ``key``, best first by ``order``."""
+    sums = {'units_sum': Sum(units), 'revenue_sum': Sum(revenue), 'cost_sum': Sum('cost'), **extra}
+    ranking = {'revenue': '-revenue_sum', 'units': '-units_sum', 'margin': '-margin_sum'}[order]
+    # Cancellations and moves leave rows at zero behind; dropping them before
+    # grouping is cheaper than a HAVING on the sums
+    return list(
+        queryset.exclude(**{units: 0, revenue: 0}).order_by().values(key).annotate(**sums)
+        .annotate(margin_sum=F('revenue_sum') - F('cost_sum')).order_by(ranking, key)[:limit]
+    )
+
+
+def report(start, end, by='day', order='revenue', limit=100):
+    """
+    Sales of the local days ``start`` to ``end`` (inclusive), in total and
+    by day, month, product, category or customer. Amounts in revenue, cost
+    and margin are items; ``amount`` is what the orders came to.
+    """
+    days = {'day__gte': start, 'day__lte': end}
+    totals = DailySales.objects.filter(**days).aggregate(
+        orders=Sum('orders'), amount=Sum('amount'), units=Sum('units'), revenue=Sum('item_amount'), cost=Sum('cost'),
+    )
+    summary = _figures(totals['units'], totals['revenue'], totals['cost'],
+                       orders=totals['orders'] or 0, amount=(totals['amount'] or ZERO).quantize(CENT))
+    result = {'from': start, 'to': end, 'by': by, 'totals': summary}
+
+    if by in ('day', 'month'):
+        rows = DailySales.objects.filter(**days).order_by()
+        if by == 'month':
+            rows = rows.annotate(month=TruncMonth('day')).values('month').annotate(
+                orders=Sum('orders'), amount=Sum('amount'), units=Sum('units'),
+                item_amount=Sum('item_amount'), cost=Sum('cost'),
+            ).order_by('month')
+        else:
+            rows = rows.values('day', 'orders', 'amount', 'units', 'item_amount', 'cost').order_by('day')
+        result['rows'] = [
+            _figures(row['units'], row['item_amount'], row['cost'], **{by: row[by]},
+                     orders=row['orders'], amount=row['amount'].quantize(CENT))
+            for row in rows
+        ]
+    elif by == 'product':
+        rows = _ranked(_in_days(ProductSales.objects.all(), start, end), 'product_id', order, limit)
+        products = Product.objects.in_bulk([row['product_id'] for row in rows])
+        result['rows'] = [
+            _figures(row['units_sum'], row['revenue_sum'], row['cost_sum'], product_id=row['product_id'],
+                     sku=products[row['product_id']].sku, name=products[row['product_id']].name)
+            for row in rows
+        ]
+    elif by == 'category':
+        rows = _ranked(CategorySales.objects.filter(**days), 'category_id', order, limit)
+        names = dict(Category.objects.filter(pk__in=[row['category_id'] for row in rows]).values_list('pk', 'name'))
+        result['rows'] = [
+            _figures(row['units_sum'], row['revenue_sum'], row['cost_sum'],
+                     category_id=row['category_id'], name=names.get(row['category_id']))
+            for row in rows
+        ]
+        # Products without a category: whatever the days have beyond the categories
+        categorized = CategorySales.objects.filter(**days).aggregate(
+            units=Sum('quantity'), revenue=Sum('amount'), cost=Sum('cost'),
+        )
+        rest = _figures(
+            summary['units'] - (categorized['units'] or 0),
+            summary['revenue'] - (categorized['revenue'] or ZERO),
+            summary['cost'] - (categorized['cost'] or ZERO),
+        )
+        result['uncategorized'] = rest if rest['units'] or rest['revenue'] else None
+    elif by == 'customer':
+        rows = _ranked(_in_days(CustomerSales.objects.all(), start, end), 'customer_id', order, limit,
+                       units='units', revenue='item_amount', orders_sum=Sum('orders'), amount_sum=Sum('amount'))
+        users = get_user_model().objects.in_bulk([row['customer_id'] for row in rows])
+        result['rows'] = [
+            _figures(row['units_sum'], row['revenue_sum'], row['cost_sum'], customer_id=row['customer_id'],
+                     username=users[row['customer_id']].username, email=users[row['customer_id']].email,
+                     orders=row['orders_sum'], amount=row['amount_sum'].quantize(CENT))
+            for row in rows
+        ]
+    else:
+        raise ValueError(f'by is one of {", ".join(REPORT_GROUPS)}')
+    return result
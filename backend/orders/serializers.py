@@ -0,0 +1,123 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+from contacts.matching import normalize_email
+from contacts.models import Contact
+from inventory.models import Product
+from .models import Order, OrderItem
+
+
+class RoundedDecimalField(serializers.DecimalField):
+    """DecimalField that rounds extra decimals (WooCommerce line prices carry them) instead of refusing them."""
+
+    def validate_precision(self, value):
+        return super().validate_precision(value.quantize(Decimal(1).scaleb(-self.decimal_places), ROUND_HALF_UP))
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    product_sku = serializers.CharField(source='product.sku', max_length=50)
+    unit_price = RoundedDecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        model = OrderItem
+        fields = ['product_sku', 'quantity', 'unit_price', 'subtotal']
+        read_only_fields = ['subtotal']
+        extra_kwargs = {'quantity': {'min_value': 1}}
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    """
+    Orders as middleware/sync_engine.py sends them (its OrderCreate):
+    the customer by email, items by SKU, placed_at the store's order date.
+    Saving replaces the order's items.
+    """
+    wc_id = serializers.IntegerField(write_only=True, required=False)
+    store = serializers.CharField(write_only=True, required=False, allow_blank=True)
+    customer_email = serializers.EmailField(write_only=True)
+    # The contact /customers/resolve matched, placeholder email or not
+    customer_contact_id = serializers.PrimaryKeyRelatedField(
+        queryset=Contact.objects.select_related('user'), write_only=True, required=False, allow_null=True,
+    )
+    total_amount = RoundedDecimalField(max_digits=10, decimal_places=2)
+    items = OrderItemSerializer(many=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'external_id', 'wc_id', 'store', 'customer', 'customer_email', 'customer_contact_id', 'status',
+            'total_amount',
+            'currency', 'placed_at', 'items', 'ai_risk_score', 'ai_notes', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['customer']
+        extra_kwargs = {'external_id': {'required': False}}
+
+    def validate(self, attrs):
+        if self.instance is None and not attrs.get('external_id'):
+            if attrs.get('wc_id') is None:
+                raise serializers.ValidationError({'external_id': 'Give external_id or wc_id.'})
+            attrs['external_id'] = str(attrs['wc_id'])
+        skus = {item['product']['sku'] for item in attrs.get('items', [])}
+        products = dict(Product.objects.filter(sku__in=skus).values_list('sku', 'id'))
+        unknown = sorted(skus - products.keys())
+        if unknown:
+            raise serializers.ValidationError({'items': f'Unknown SKUs: {", ".join(unknown)}.'})
+        attrs['products'] = products
+        return attrs
+
+    def _customer(self, email, contact=None):
+        """
+        The account for ``email``: the one the matched ``contact`` (else the
+        contact with that email) is linked to, a user with the email, or a
+        new one. The contact ends up linked to it, and gets the real email
+        if it only had a placeholder.
+        """
+        User = get_user_model()
+        if contact is None:
+            contact = Contact.objects.filter(email__iexact=email).select_related('user').first()
+        user = contact.user if contact is not None else None
+        if user is None:
+            user = User.objects.filter(email__iexact=email).order_by('pk').first()
+        if user is None:
+            user, created = User.objects.get_or_create(username=email[:150], defaults={'email': email})
+            if created:
+                user.set_unusable_password()
+                user.save(update_fields=['password'])
+        if contact is not None:
+            update = []
+            if contact.user_id is None:
+                contact.user = user
+                update.append('user')
+            if not normalize_email(contact.email) and not Contact.objects.filter(email__iexact=email).exists():
+                contact.email = email
+                update.append('email')
+            if update:
+                contact.save(update_fields=update)
+        return user
+
+    def _save(self, order, data):
+        for field in ('wc_id', 'store'):
+            data.pop(field, None)
+        items, products = data.pop('items'), data.pop('products')
+        order.customer = self._customer(data.pop('customer_email'), data.pop('customer_contact_id', None))
+        for field, value in data.items():
+            setattr(order, field, value)
+        order.save()
+        # Items sold before keep the cost price they were sold at
+        costs = dict(order.items.values_list('product_id', 'unit_cost'))
+        order.items.all().delete()
+        for item in items:
+            product_id = products[item['product']['sku']]
+            OrderItem.objects.create(
+                order=order, product_id=product_id, quantity=item['quantity'], unit_price=item['unit_price'],
+                subtotal=item['quantity'] * item['unit_price'], unit_cost=costs.get(product_id),
+            )
+        return order
+
+    def create(self, validated_data):
+        return self._save(Order(), validated_data)
+
+    def update(self, instance, validated_data):
+        # The URL names the order
+        validated_data.pop('external_id', None)
+        return self._save(instance, validated_data)
@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core import changes
+from inventory.models import Product
+from . import sales
+from .models import Order, OrderItem
+
+ORDER_FIELDS = ('status', 'total_amount', 'created_at', 'placed_at', 'customer_id')
+ITEM_FIELDS = ('order_id', 'product_id', 'quantity', 'subtotal', 'unit_cost')
+
+
+def _state(instance, fields):
+    return tuple(getattr(instance, field) for field in fields)
+
+
+# --- Dashboard rollups (orders.sales) ---
+
+@receiver(pre_save, sender=Order)
+@receiver(pre_save, sender=OrderItem)
+def remember_sales(sender, instance, raw=False, **kwargs):
+    # An edit has to take the old values off the rollups first
+    instance._sales_before = None
+    if instance.pk and not raw:
+        fields = ORDER_FIELDS if sender is Order else ITEM_FIELDS
+        instance._sales_before = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(post_save, sender=Order)
+def track_order(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sales.order_changed(instance.pk, getattr(instance, '_sales_before', None), _state(instance, ORDER_FIELDS))
+
+
+@receiver(post_delete, sender=Order)
+def forget_order(sender, instance, **kwargs):
+    sales.order_changed(instance.pk, _state(instance, ORDER_FIELDS), None)
+
+
+@receiver(post_save, sender=OrderItem)
+def track_item(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sales.item_changed(getattr(instance, '_sales_before', None), _state(instance, ITEM_FIELDS))
+
+
+@receiver(post_delete, sender=OrderItem)
+def forget_item(sender, instance, **kwargs):
+    # Deleted before their order (cascade), so the order's status is still readable
+    sales.item_changed(_state(instance, ITEM_FIELDS), None)
+
+
+@receiver(pre_save, sender=Product)
+def remember_category(sender, instance, raw=False, **kwargs):
+    instance._sales_category = None
+    if instance.pk and not raw:
+        instance._sales_category = Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+def move_category_sales(sender, instance, created, raw=False, **kwargs):
+    # A product's sales go with it to its new category
+    old = getattr(instance, '_sales_category', None)
+    if not created and not raw and old != instance.category_id:
+        sales.product_recategorized(instance.pk, old, instance.category_id)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def remember_deleted_customer(sender, instance, **kwargs):
+    # Their orders cascade after this; CustomerSales rows go with the user
+    sales.deleting_customers.set(sales.deleting_customers.get() | {instance.pk})
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_deleted_customer(sender, instance, **kwargs):
+    sales.deleting_customers.set(sales.deleting_customers.get() - {instance.pk})
+
+
+# --- Change stream (core.changes) ---
+
+def _publish_order(order, action):
+    changes.record(
+        'order', action, order.pk,
+        external_id=order.external_id, status=order.status, total=order.total_amount, currency=order.currency,
+    )
+
+
+@receiver(post_save, sender=Order)
+def publish_order_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        _publish_order(instance, 'created' if created else 'updated')
+
+
+@receiver(post_delete, sender=Order)
+def publish_order_deleted(sender, instance, **kwargs):
+    _publish_order(instance, 'deleted')
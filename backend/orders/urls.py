@@ -0,0 +1,14 @@
+from django.urls import path, re_path
+from core.exports import export_view
+from .exports import ORDERS_EXPORT
+from .views import OrderByExternalIdView, OrderDigestView, OrderIngestView, SalesReportView
+
+urlpatterns = [
+    # SyncEngine calls these without a trailing slash (POST /orders is routed in config.urls)
+    path('', OrderIngestView.as_view(), name='order-ingest'),
+    re_path(r'^by-wc-id/(?P<external_id>[^/]+)/?$', OrderByExternalIdView.as_view(), name='order-by-external-id'),
+    path('export/', export_view(ORDERS_EXPORT), name='order-export'),
+    # Digests for middleware/reconcile.py
+    path('digests/', OrderDigestView.as_view(), name='order-digests'),
+    path('sales/', SalesReportView.as_view(), name='sales-report'),
+]
@@ -0,0 +1,132 @@
+from datetime import timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from core.db import retry_on_lock
+from . import reconciliation, sales
+from .models import Order
+from .serializers import OrderSerializer
+
+
+def _moment(value):
+    value = parse_datetime((value or '').replace(' ', '+'))
+    if value is not None and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def _list(value):
+    return [v.strip() for v in (value or '').split(',') if v.strip()]
+
+
+class OrderIngestView(APIView):
+    """POST an order from the sync engine (orders.serializers.OrderSerializer). 201 and the order."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = OrderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        retry_on_lock(serializer.save)()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class OrderByExternalIdView(APIView):
+    """
+    One order by its external id (the store prefix plus the WooCommerce id):
+    GET for the sync engine's "already there?" check, PUT to resync it
+    (the reconciler's repairs come through here).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self, external_id):
+        return get_object_or_404(Order.objects.prefetch_related('items__product'), external_id=external_id)
+
+    def get(self, request, external_id):
+        return Response(OrderSerializer(self.get_object(external_id)).data)
+
+    def put(self, request, external_id):
+        serializer = OrderSerializer(self.get_object(external_id), data=request.data)
+        serializer.is_valid(raise_exception=True)
+        retry_on_lock(serializer.save)()
+        return Response(serializer.data)
+
+
+class OrderDigestView(APIView):
+    """
+    Range digests for the WooCommerce reconciler (orders.reconciliation).
+    ?after=<ISO>&before=<ISO> (half-open), ?parts=<n> equal sub-ranges,
+    ?status=processing,completed. With ?rows=1 the orders of the range
+    instead ([external_id, total, status]); with ?ids=<id>,<id> those
+    orders, whatever their date or status. ?prefix=<p> and
+    ?exclude=<p>,<p> narrow ranges down to one store's external ids.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        if params.get('ids'):
+            ids = _list(params['ids'])
+            if len(ids) > reconciliation.MAX_ROWS:
+                return self.error(f'At most {reconciliation.MAX_ROWS} ids.')
+            return Response({'rows': reconciliation.rows(None, None, ids=ids)})
+
+        after, before = _moment(params.get('after')), _moment(params.get('before'))
+        if after is None or before is None or after >= before:
+            return self.error('after and before must be ISO datetimes, after < before.')
+        statuses = _list(params.get('status'))
+        scope = {'prefix': params.get('prefix', ''), 'exclude': _list(params.get('exclude'))}
+        if params.get('rows') in ('1', 'true'):
+            rows = reconciliation.rows(after, before, statuses, **scope)
+            if len(rows) > reconciliation.MAX_ROWS:
+                return self.error(f'More than {reconciliation.MAX_ROWS} orders, ask for a shorter range.')
+            return Response({'rows': rows})
+        try:
+            parts = int(params.get('parts', 1))
+        except ValueError:
+            return self.error('parts must be a number.')
+        if not 1 <= parts <= reconciliation.MAX_PARTS:
+            return self.error(f'parts must be between 1 and {reconciliation.MAX_PARTS}.')
+        return Response({'ranges': reconciliation.digests(after, before, parts, statuses, **scope)})
+
+    def error(self, detail):
+        return Response({'detail': detail}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SalesReportView(APIView):
+    """
+    Sales from the rollups (orders.sales): ?from=<date>&to=<date> (local
+    days, inclusive; the last 30 days by default), ?by=day|month|product|
+    category|customer, and for the rankings ?order=revenue|units|margin
+    and ?limit=<n>. Staff only: ?by=customer lists customers and their spend.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        # parse_date: None when malformed, ValueError when well-formed but impossible
+        try:
+            end = parse_date(params['to']) if params.get('to') else timezone.localdate()
+            start = parse_date(params['from']) if params.get('from') else end and end - timedelta(days=29)
+        except ValueError:
+            start = end = None
+        if start is None or end is None or start > end:
+            return self.error('from and to must be dates (YYYY-MM-DD), from <= to.')
+        by, order = params.get('by', 'day'), params.get('order', 'revenue')
+        if by not in sales.REPORT_GROUPS:
+            return self.error(f'by is one of {", ".join(sales.REPORT_GROUPS)}.')
+        if order not in sales.REPORT_ORDERS:
+            return self.error(f'order is one of {", ".join(sales.REPORT_ORDERS)}.')
+        try:
+            limit = int(params.get('limit', 100))
+        except ValueError:
+            return self.error('limit must be a number.')
+        if not 1 <= limit <= sales.REPORT_MAX_ROWS:
+            return self.error(f'limit must be between 1 and {sales.REPORT_MAX_ROWS}.')
+        return Response(sales.report(start, end, by, order, limit))
+
+    def error(self, detail):
+        return Response({'detail': detail}, status=status.HTTP_400_BAD_REQUEST)
@@ -15,6 +15,13 @@ python manage.py makemigrations core inventory orders contacts --noinput
 
 echo "📦 Applying migrations..."
 python manage.py migrate
+python manage.py migrate --database archive
+
+echo "📦 Building per-location stock balances (first run only)..."
+python manage.py rebuild_stock_balances --if-empty
+python manage.py rebuild_dashboard --if-empty
+python manage.py rebuild_sales --if-empty
+python manage.py rebuild_match_keys --if-empty
 
 echo "👤 Creating admin user..."
 python manage.py shell << EOF
@@ -30,5 +37,15 @@ else:
     print('ℹ️ Admin user already exists')
 EOF
 
-echo "🔥 Starting Gunicorn..."
-exec gunicorn config.wsgi:application --bind 0.0.0.0:8000 --workers 3
+# The sync engine's token: the same ERP_API_TOKEN in both .env files, a long
+# random string (python -c "import secrets; print(secrets.token_urlsafe(32))")
+if [ -n "$ERP_API_TOKEN" ]; then
+    echo "🔑 Provisioning the sync engine's API token..."
+    python manage.py create_api_token saeed --name sync-engine --key "$ERP_API_TOKEN" --if-missing > /dev/null \
+        || echo "⚠️ ERP_API_TOKEN was not provisioned; the sync engine's calls will be refused"
+else
+    echo "ℹ️ ERP_API_TOKEN not set; issue the sync engine a token with create_api_token"
+fi
+
+echo "🔥 Starting Gunicorn (uvicorn workers)..."
+exec gunicorn config.asgi:application -c gunicorn.conf.py
@@ -0,0 +1,304 @@
+"""
+Reconcile WooCommerce orders with the ERP without re-fetching everything.
+
+Time is split into ranges and each side gives a digest per range: the
+number of orders (WooCommerce: the X-WP-Total header of a one-row page;
+ERP: /api/v1/orders/digests/) and a hash of their ids, totals and statuses.
+Ranges whose counts agree are done; the others are split again, until a
+range is small enough to list in one call (LEAF_ORDERS), where the hashes
+are compared and, if they differ, the orders themselves.
+
+Orders changed in WooCommerce without changing any count (a new total, a
+status moving between two reconciled statuses) are caught by listing the
+orders modified since the last run (modified_after, WooCommerce 5.8+).
+That listing comes first: an order it finds leaving or entering the
+reconciled statuses shifts the count expected of its range, so it can't
+hide a missing order in the same range.
+
+A clean month costs a handful of calls: one count, one digest, one listing
+of recently modified orders and one lookup of those in the ERP. Missing and
+changed orders go to the sync queue (SyncQueue) that the next
+sync_engine.py run works through.
+
+With several stores (STORES_FILE) each is reconciled on its own: the ERP
+side is narrowed to the store's external id prefix.
+
+    python reconcile.py --after 2026-09-01 --before 2026-10-01 --store ae
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from woocommerce import API
+
+from sync_engine import ERP_API_URL, ERP_HEADERS, SyncQueue, load_stores, other_prefixes
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_STATE_FILE = os.getenv("RECONCILE_STATE_FILE", "reconcile_state.json")
+# WooCommerce lists at most 100 orders per page: smaller ranges are compared row by row
+LEAF_ORDERS = 100
+SPLIT = 4
+# WooCommerce dates have second resolution; no point splitting finer
+MIN_SPAN = timedelta(seconds=60)
+DEFAULT_STATUSES = "processing,completed"
+MASK = 2 ** 64 - 1
+CENT = Decimal("0.01")
+
+
+def order_hash(external_id, total, status) -> int:
+    """Same as orders.reconciliation.order_hash in the ERP."""
+    value = f"{external_id}|{Decimal(str(total)).quantize(CENT)}|{status}"
+    return int.from_bytes(hashlib.sha1(value.encode()).digest()[:8], "big")
+
+
+def combine(hashes) -> str:
+    return f"{sum(hashes) & MASK:016x}"
+
+
+def _iso(moment: datetime) -> str:
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class Reconciler:
+    def __init__(self, wcapi, erp_client, statuses: str = DEFAULT_STATUSES, deep: bool = False,
+                 prefix: str = "", exclude: Tuple[str, ...] = ()):
+        self.wcapi = wcapi
+        self.erp = erp_client
+        self.statuses = statuses
+        self.deep = deep
+        # The store's namespace in the ERP: orders are keyed by external id (prefix + WooCommerce id)
+        self.prefix = prefix
+        self.exclude = exclude
+        self.calls = {"woocommerce": 0, "erp": 0}
+        self.missing: Dict[str, str] = {}
+        self.changed: Dict[str, str] = {}
+        self.ranges_checked = 0
+        # (placed, +1/-1): what known changes do to the ERP's count of a range
+        self.adjustments: List[Tuple[datetime, int]] = []
+
+    # --- WooCommerce side ---
+
+    def _wc_get(self, params: Dict):
+        self.calls["woocommerce"] += 1
+        resp = self.wcapi.get("orders", params=params)
+        resp.raise_for_status()
+        return resp
+
+    def _wc_range(self, after: datetime, before: datetime) -> Dict:
+        # WooCommerce's after/before are exclusive: one second back makes it [after, before)
+        return {
+            "after": _iso(after - timedelta(seconds=1)), "before": _iso(before),
+            "dates_are_gmt": "true", "status": self.statuses,
+        }
+
+    def wc_count(self, after: datetime, before: datetime) -> int:
+        resp = self._wc_get({**self._wc_range(after, before), "per_page": 1, "_fields": "id"})
+        return int(resp.headers.get("X-WP-Total", 0))
+
+    def _wc_rows(self, params: Dict) -> Dict[str, Dict]:
+        rows, page = {}, 1
+        while True:
+            resp = self._wc_get({
+                **params, "per_page": LEAF_ORDERS, "page": page, "_fields": "id,total,status,date_created_gmt",
+            })
+            for order in resp.json():
+                rows[f"{self.prefix}{order['id']}"] = order
+            if page >= int(resp.headers.get("X-WP-TotalPages", 1)):
+                return rows
+            page += 1
+
+    # --- ERP side ---
+
+    def _erp_get(self, params: Dict) -> Dict:
+        self.calls["erp"] += 1
+        if "ids" not in params:
+            params = {**params, "prefix": self.prefix, "exclude": ",".join(self.exclude)}
+        resp = self.erp.get("/api/v1/orders/digests/", params=params)
+        resp.raise_for_status()
+        return resp.json()
+
+    def erp_digests(self, after: datetime, before: datetime, parts: int = 1) -> List[Dict]:
+        return self._erp_get({
+            "after": after.isoformat(), "before": before.isoformat(), "parts": parts, "status": self.statuses,
+        })["ranges"]
+
+    def erp_rows(self, after: Optional[datetime] = None, before: Optional[datetime] = None,
+                 ids: Optional[List[str]] = None) -> Dict[str, Tuple[str, str]]:
+        if ids is not None:
+            params = {"ids": ",".join(ids)}
+        else:
+            params = {"after": after.isoformat(), "before": before.isoformat(), "rows": 1, "status": self.statuses}
+        return {external_id: (total, status) for external_id, total, status in self._erp_get(params)["rows"]}
+
+    # --- Comparison ---
+
+    @staticmethod
+    def _change(wc_row, erp_row) -> Optional[str]:
+        """What differs between the two (total, status) rows, or None."""
+        (wc_total, wc_status), (erp_total, erp_status) = wc_row, erp_row
+        wc_total, erp_total = Decimal(str(wc_total)).quantize(CENT), Decimal(str(erp_total)).quantize(CENT)
+        if (wc_total, wc_status) == (erp_total, erp_status):
+            return None
+        return f"changed: ERP {erp_status} {erp_total}, WooCommerce {wc_status} {wc_total}"
+
+    def _compare(self, wc_rows: Dict, erp_rows: Dict):
+        for external_id, order in wc_rows.items():
+            row = (order["total"], order["status"])
+            if external_id not in erp_rows:
+                self.missing[external_id] = "missing"
+            elif self._change(row, erp_rows[external_id]):
+                self.changed[external_id] = self._change(row, erp_rows[external_id])
+        for external_id in erp_rows.keys() - wc_rows.keys():
+            # In the ERP under these statuses but not in WooCommerce: status changed there, or deleted
+            self.changed.setdefault(external_id, "stale: no longer matches in WooCommerce")
+
+    def _leaf(self, after: datetime, before: datetime, digest: Dict, wc_count: int):
+        wc_rows = self._wc_rows(self._wc_range(after, before)) if wc_count else {}
+        wc_hash = combine(order_hash(key, order["total"], order["status"]) for key, order in wc_rows.items())
+        if len(wc_rows) == digest["count"] and wc_hash == digest["hash"]:
+            return
+        self._compare(wc_rows, self.erp_rows(after, before) if digest["count"] else {})
+
+    def _expected(self, after: datetime, before: datetime, digest: Dict) -> int:
+        """The WooCommerce count the ERP digest predicts, known changes included."""
+        return digest["count"] + sum(delta for placed, delta in self.adjustments if after <= placed < before)
+
+    def walk(self, after: datetime, before: datetime):
+        """Compare [after, before), drilling only into ranges whose digests differ."""
+        pending = [(after, before, self.erp_digests(after, before)[0])]
+        while pending:
+            after, before, digest = pending.pop()
+            self.ranges_checked += 1
+            wc_count = self.wc_count(after, before)
+            if wc_count == self._expected(after, before, digest) and not self.deep:
+                continue
+            if wc_count == 0 and digest["count"] == 0:
+                continue
+            if wc_count <= LEAF_ORDERS or before - after <= MIN_SPAN:
+                self._leaf(after, before, digest, wc_count)
+                continue
+            for child in self.erp_digests(after, before, SPLIT):
+                bounds = datetime.fromisoformat(child["after"]), datetime.fromisoformat(child["before"])
+                pending.append((*bounds, child))
+
+    def modified_since(self, after: datetime, before: datetime, since: datetime):
+        """
+        Orders of the range modified in WooCommerce since ``since``, against
+        the ERP. Runs before walk(): what it finds is noted as adjustments, so
+        a known change can't cancel out an unknown one in a range's count.
+        """
+        params = {**self._wc_range(after, before), "modified_after": _iso(since)}
+        # Every status: an order leaving the reconciled statuses is a change too
+        params.pop("status")
+        wc_rows = self._wc_rows(params)
+        if not wc_rows:
+            return
+        erp_rows = {}
+        ids = list(wc_rows)
+        for i in range(0, len(ids), 500):
+            erp_rows.update(self.erp_rows(ids=ids[i:i + 500]))
+        wanted = set(self.statuses.split(","))
+        for external_id, order in wc_rows.items():
+            erp_row = erp_rows.get(external_id)
+            in_wc, in_erp = order["status"] in wanted, erp_row is not None and erp_row[1] in wanted
+            if in_wc != in_erp and order.get("date_created_gmt"):
+                placed = datetime.fromisoformat(order["date_created_gmt"]).replace(tzinfo=timezone.utc)
+                self.adjustments.append((placed, int(in_wc) - int(in_erp)))
+            if erp_row is not None:
+                change = self._change((order["total"], order["status"]), erp_row)
+                if change:
+                    self.changed.setdefault(external_id, change)
+            elif in_wc:
+                self.missing.setdefault(external_id, "missing")
+
+    def run(self, after: datetime, before: datetime, since: Optional[datetime] = None):
+        if since is not None:
+            self.modified_since(after, before, since)
+        self.walk(after, before)
+        return self
+
+
+def _load_state() -> Dict:
+    try:
+        with open(RECONCILE_STATE_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _load_since(code: str) -> Optional[datetime]:
+    state = _load_state()
+    # Before several stores, the file held the one store's last_run
+    value = state.get(code, {}).get("last_run") or (state.get("last_run") if code == "default" else None)
+    return datetime.fromisoformat(value) if value else None
+
+
+def _save_since(code: str, moment: datetime):
+    state = {key: value for key, value in _load_state().items() if key != "last_run"}
+    state[code] = {"last_run": moment.isoformat()}
+    with open(RECONCILE_STATE_FILE, "w") as f:
+        json.dump(state, f)
+
+
+def _moment(value: str) -> datetime:
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    now = datetime.now(timezone.utc)
+    parser = argparse.ArgumentParser(description="Find WooCommerce orders missing or different in the ERP.")
+    parser.add_argument("--after", type=_moment, default=now - timedelta(days=30),
+                        help="ISO date (UTC), default 30 days ago")
+    parser.add_argument("--before", type=_moment, default=now, help="ISO date (UTC), default now")
+    parser.add_argument("--status", default=DEFAULT_STATUSES, help="WooCommerce statuses the sync brings over")
+    parser.add_argument("--since", type=_moment, default=None,
+                        help="Check orders modified since then (default: the last run)")
+    parser.add_argument("--deep", action="store_true", help="Compare hashes of every range, not just counts")
+    parser.add_argument("--store", default=None, help="Store code (STORES_FILE); needed with more than one")
+    parser.add_argument("--dry-run", action="store_true", help="Report only, queue nothing")
+    args = parser.parse_args()
+
+    stores = load_stores()
+    matching = [store for store in stores if args.store in (None, store.code)]
+    if len(matching) != 1:
+        parser.error(f"--store must be one of: {', '.join(store.code for store in stores) or '(no stores)'}")
+    store = matching[0]
+
+    # Whole seconds, like WooCommerce's dates
+    after, before = args.after.replace(microsecond=0), args.before.replace(microsecond=0)
+    wcapi = API(url=store.url, consumer_key=store.key, consumer_secret=store.secret, version="wc/v3", timeout=30)
+    since = args.since or _load_since(store.code)
+    if since is None and not args.deep:
+        logger.warning("No earlier run: changed orders are only found where counts differ (use --deep once).")
+    with httpx.Client(base_url=ERP_API_URL, headers=ERP_HEADERS, timeout=30) as erp:
+        reconciler = Reconciler(
+            wcapi, erp, args.status, args.deep, store.prefix, tuple(other_prefixes(store, stores)),
+        ).run(after, before, since)
+
+    for external_id, reason in {**reconciler.missing, **reconciler.changed}.items():
+        logger.info(f"Order {external_id}: {reason}")
+    logger.info(
+        f"{reconciler.ranges_checked} ranges, {len(reconciler.missing)} missing, {len(reconciler.changed)} changed "
+        f"({reconciler.calls['woocommerce']} WooCommerce and {reconciler.calls['erp']} ERP calls)."
+    )
+    if args.dry_run:
+        return
+    queue = SyncQueue(store.queue_file)
+    # The queue holds WooCommerce ids
+    for found, reason in ((reconciler.missing, "missing"), (reconciler.changed, "changed")):
+        if found:
+            queue.add([external_id[len(store.prefix):] for external_id in found], reason)
+    _save_since(store.code, now)
+
+
+if __name__ == "__main__":
+    main()
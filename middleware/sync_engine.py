@@ -1,9 +1,15 @@
 import os
 import asyncio
+import cProfile
 import logging
 import json
-from datetime import datetime
-from typing import Optional, List, Dict
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional, List, Dict, Iterable, Tuple
 from dotenv import load_dotenv
 from woocommerce import API
 import httpx
@@ -17,7 +23,26 @@ WC_URL = os.getenv("WC_URL")
 WC_KEY = os.getenv("WC_KEY")
 WC_SECRET = os.getenv("WC_SECRET")
 ERP_API_URL = os.getenv("ERP_API_URL", "http://localhost:8000")
-ERP_API_TOKEN = os.getenv("ERP_API_TOKEN", "system-admin-token")
+# Key of an ERP API token for a staff user. The backend's run.sh issues it
+# from the same ERP_API_TOKEN (or: manage.py create_api_token). Without one
+# the engine calls the ERP anonymously, and the profile upload is refused.
+ERP_API_TOKEN = os.getenv("ERP_API_TOKEN", "")
+ERP_HEADERS = {"Authorization": f"Bearer {ERP_API_TOKEN}"} if ERP_API_TOKEN else {}
+# Orders to (re)sync on the next run, filled by reconcile.py
+SYNC_QUEUE_FILE = os.getenv("SYNC_QUEUE_FILE", "sync_queue.json")
+# Several storefronts: a JSON list of stores (see StoreConfig); without it
+# the one store of WC_URL/WC_KEY/WC_SECRET
+STORES_FILE = os.getenv("STORES_FILE", "stores.json")
+# Per store: orders modified up to when are synced
+SYNC_STATE_FILE = os.getenv("SYNC_STATE_FILE", "sync_state.json")
+# Connections to the ERP, shared by all stores
+ERP_MAX_CONNECTIONS = int(os.getenv("ERP_MAX_CONNECTIONS", "10"))
+# Listing again a little before the watermark covers clock skew with WooCommerce
+WATERMARK_OVERLAP = timedelta(minutes=1)
+# Fraction of runs profiled (cProfile) and sent to the ERP's admin (Profiles);
+# kept in SYNC_PROFILE_DIR when the upload fails
+SYNC_PROFILE_RATE = float(os.getenv("SYNC_PROFILE_RATE", "0"))
+SYNC_PROFILE_DIR = os.getenv("SYNC_PROFILE_DIR", "profiles")
 
 # Logging Setup
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -27,6 +52,7 @@ logger = logging.getLogger(__name__)
 class CustomerCreate(BaseModel):
     email: str
     full_name: str
+    phone: Optional[str] = None
     is_active: bool = True
 
 class OrderItemCreate(BaseModel):
@@ -36,10 +62,17 @@ class OrderItemCreate(BaseModel):
 
 class OrderCreate(BaseModel):
     wc_id: int
+    # wc_id with the store's prefix: the ERP's external_id
+    external_id: str
+    store: str
     customer_email: str
+    # The ERP contact /customers/resolve matched, so the order's account is
+    # linked to it even when it only has a placeholder email
+    customer_contact_id: Optional[int] = None
     status: str
     total_amount: float
     currency: str
+    placed_at: Optional[str] = None
     items: List[OrderItemCreate]
     ai_risk_score: Optional[float] = None
     ai_notes: Optional[str] = None
@@ -51,21 +84,256 @@ class SyncLogCreate(BaseModel):
     status: str
     details: Dict
 
+# --- Stores ---
+
+class StoreConfig(BaseModel):
+    """
+    One storefront. ``prefix`` namespaces its order ids in the ERP
+    (external_id = prefix + WooCommerce id), so two stores' order #1001
+    don't collide. key/secret default to WC_<CODE>_KEY/WC_<CODE>_SECRET.
+    """
+    code: str
+    url: str
+    key: Optional[str] = None
+    secret: Optional[str] = None
+    prefix: str = ""
+    statuses: str = "processing"
+    # WooCommerce requests per second
+    rate_limit: float = 5.0
+    # Orders of this store in flight at once
+    workers: int = 4
+    # How far back the first run looks
+    backfill_hours: int = 24
+
+    @property
+    def queue_file(self) -> str:
+        # The store of WC_URL keeps the queue file it always had
+        if self.code == "default":
+            return SYNC_QUEUE_FILE
+        return str(Path(SYNC_QUEUE_FILE).with_suffix(f".{self.code}.json"))
+
+    def external_id(self, wc_id) -> str:
+        return f"{self.prefix}{wc_id}"
+
+
+def load_stores(path: str = STORES_FILE) -> List[StoreConfig]:
+    try:
+        with open(path) as f:
+            stores = [StoreConfig(**entry) for entry in json.load(f)]
+    except FileNotFoundError:
+        if not WC_URL or not WC_KEY:
+            return []
+        # No prefix: its orders keep the plain ids they were synced with
+        stores = [StoreConfig(code="default", url=WC_URL, key=WC_KEY, secret=WC_SECRET)]
+    for store in stores:
+        store.key = store.key or os.getenv(f"WC_{store.code.upper()}_KEY")
+        store.secret = store.secret or os.getenv(f"WC_{store.code.upper()}_SECRET")
+        if not store.key or not store.secret:
+            raise ValueError(f"Store {store.code}: no key/secret (set WC_{store.code.upper()}_KEY/_SECRET)")
+    codes = [store.code for store in stores]
+    if len(set(codes)) != len(codes):
+        raise ValueError("Store codes must be unique")
+    prefixes = [store.prefix for store in stores]
+    # One store may go without a prefix (the original one); no prefix may start another
+    if prefixes.count("") > 1 or any(a != b and a and b.startswith(a) for a in prefixes for b in prefixes):
+        raise ValueError(f"Order id prefixes must tell the stores apart: {prefixes}")
+    return stores
+
+
+def other_prefixes(store: StoreConfig, stores: List[StoreConfig]) -> List[str]:
+    """What to leave out of the ERP's orders to get this store's: the longer prefixes of other stores."""
+    return [other.prefix for other in stores if other.prefix.startswith(store.prefix) and other is not store]
+
+# --- Scheduling ---
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.next_at = 0.0
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        # Claim a turn before sleeping, so concurrent callers queue up behind each other
+        at = max(now, self.next_at)
+        self.next_at = at + self.interval
+        if at > now:
+            await asyncio.sleep(at - now)
+
+
+class FairLimiter:
+    """
+    At most ``slots`` requests at once. When they're all taken, freed slots
+    go round-robin to the keys (stores) with requests waiting, so a store
+    with a thousand orders queued gets one turn like a store with one.
+    """
+
+    def __init__(self, slots: int):
+        self.free = slots
+        self.waiting: Dict[str, deque] = {}
+        self.turns: deque = deque()
+
+    async def acquire(self, key: str):
+        if self.free > 0 and not self.turns:
+            self.free -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        queue = self.waiting.setdefault(key, deque())
+        if not queue:
+            self.turns.append(key)
+        queue.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Handed the slot just as we were cancelled: pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self.turns:
+            key = self.turns.popleft()
+            queue = self.waiting[key]
+            waiter = queue.popleft()
+            if queue:
+                self.turns.append(key)
+            # Cancelled waiters are skipped here rather than removed when cancelled
+            if not waiter.cancelled():
+                waiter.set_result(None)
+                return
+        self.free += 1
+
+    @asynccontextmanager
+    async def slot(self, key: str):
+        await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class ErpClient:
+    """One connection pool to the ERP for every store, shared fairly."""
+
+    def __init__(self, max_connections: int = ERP_MAX_CONNECTIONS):
+        self.http = httpx.AsyncClient(
+            base_url=ERP_API_URL,
+            headers=ERP_HEADERS,
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.limiter = FairLimiter(max_connections)
+        if not ERP_API_TOKEN:
+            logger.warning("ERP_API_TOKEN is not set: calling the ERP without a token")
+
+    async def request(self, key: str, method: str, url: str, **kwargs) -> httpx.Response:
+        async with self.limiter.slot(key):
+            return await self.http.request(method, url, **kwargs)
+
+    def for_store(self, code: str) -> "StoreErpClient":
+        return StoreErpClient(self, code)
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+class StoreErpClient:
+    """The shared ERP client as one store uses it (get/post/put like httpx)."""
+
+    def __init__(self, erp: ErpClient, code: str):
+        self.erp = erp
+        self.code = code
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.erp.request(self.code, "GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.erp.request(self.code, "POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> httpx.Response:
+        return await self.erp.request(self.code, "PUT", url, **kwargs)
+
+# --- Sync Queue ---
+
+class SyncQueue:
+    """WooCommerce order ids waiting to be (re)synced, with why, in a JSON file."""
+
+    def __init__(self, path: str = SYNC_QUEUE_FILE):
+        self.path = Path(path)
+
+    def load(self) -> Dict[str, str]:
+        try:
+            return json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return {}
+
+    def _save(self, entries: Dict[str, str]):
+        # Write then rename, so a crash never leaves half a file
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(entries, indent=1, sort_keys=True))
+        tmp.replace(self.path)
+
+    def add(self, wc_ids: Iterable, reason: str):
+        entries = self.load()
+        entries.update({str(wc_id): reason for wc_id in wc_ids})
+        self._save(entries)
+
+    def remove(self, wc_ids: Iterable):
+        entries = self.load()
+        for wc_id in wc_ids:
+            entries.pop(str(wc_id), None)
+        self._save(entries)
+
+
+class Watermarks:
+    """Per store, the modification time up to which its orders are synced."""
+
+    def __init__(self, path: str = SYNC_STATE_FILE):
+        self.path = Path(path)
+
+    def _load(self) -> Dict[str, str]:
+        try:
+            return json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return {}
+
+    def get(self, code: str) -> Optional[datetime]:
+        value = self._load().get(code)
+        return datetime.fromisoformat(value) if value else None
+
+    def set(self, code: str, moment: datetime):
+        # Read-modify-write with no await in between: safe for stores sharing the loop
+        entries = self._load()
+        entries[code] = moment.isoformat()
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(entries, indent=1, sort_keys=True))
+        tmp.replace(self.path)
+
 # --- Core Logic ---
 
 class SyncEngine:
-    def __init__(self):
+    """The sync of one store; several run side by side (run_stores)."""
+
+    def __init__(self, store: StoreConfig, erp: ErpClient, watermarks: Optional[Watermarks] = None):
+        self.store = store
         self.wcapi = API(
-            url=WC_URL,
-            consumer_key=WC_KEY,
-            consumer_secret=WC_SECRET,
-            version="wc/v3"
-        )
-        self.erp_client = httpx.AsyncClient(
-            base_url=ERP_API_URL,
-            headers={"Authorization": f"Bearer {ERP_API_TOKEN}"},
-            timeout=30.0
+            url=store.url,
+            consumer_key=store.key,
+            consumer_secret=store.secret,
+            version="wc/v3",
+            timeout=30
         )
+        self.rate = RateLimiter(store.rate_limit)
+        self.erp_client = erp.for_store(store.code)
+        self.queue = SyncQueue(store.queue_file)
+        self.watermarks = watermarks or Watermarks()
+
+    async def wc_get(self, endpoint: str, params: Optional[Dict] = None):
+        """The WooCommerce client is blocking: run it in a thread, within the store's rate limit."""
+        await self.rate.wait()
+        return await asyncio.to_thread(self.wcapi.get, endpoint, params=params or {})
 
     async def log_sync(self, log: SyncLogCreate):
         """Send sync log to ERP."""
@@ -79,38 +347,46 @@ class SyncEngine:
         Antigravity Hook: Connects to local Ollama (RTX 3080).
         TODO: Connect to local Ollama (Qwen 2.5) here to analyze customer sentiment/fraud risk.
         """
-        logger.info(f"Analying Order #{order_data['id']} with Local AI...")
+        logger.info(f"[{self.store.code}] Analying Order #{order_data['id']} with Local AI...")
         # Placeholder logic
         order_data['ai_risk_score'] = 0.1 # Low risk placeholder
         order_data['ai_notes'] = "Customer has good history. Address looks valid."
         return order_data
 
-    async def get_or_create_customer(self, wc_order: Dict) -> Optional[str]:
-        """Ensure customer exists in ERP."""
+    async def get_or_create_customer(self, wc_order: Dict) -> Optional[Tuple[str, Optional[int]]]:
+        """Ensure customer exists in ERP: (email to order under, matched contact id or None)."""
         email = wc_order.get('billing', {}).get('email')
         if not email:
             logger.warning("Order has no email.")
             return None
 
-        # Check if exists
+        billing = wc_order['billing']
+        full_name = f"{billing.get('first_name', '')} {billing.get('last_name', '')}".strip()
+        phone = billing.get('phone') or None
+
+        # Check if exists: matched on normalized email, phone and name, so a
+        # customer imported from Zoho or re-registered with another address
+        # isn't created twice
         try:
-            resp = await self.erp_client.get(f"/api/v1/customers/by-email/{email}")
+            resp = await self.erp_client.get(
+                "/api/v1/customers/resolve",
+                params={k: v for k, v in {"email": email, "phone": phone, "name": full_name}.items() if v},
+            )
             if resp.status_code == 200:
-                return email
+                match = resp.json()
+                logger.info(f"Matched customer {email} to {match['email']} ({'+'.join(match['matched_on'])})")
+                return match['email'] or email, (match.get('contact') or {}).get('id')
         except httpx.HTTPError:
             pass # Continue to create
 
         # Create Customer
-        customer_data = CustomerCreate(
-            email=email,
-            full_name=f"{wc_order['billing']['first_name']} {wc_order['billing']['last_name']}"
-        )   
-        
+        customer_data = CustomerCreate(email=email, full_name=full_name, phone=phone)
+
         try:
             resp = await self.erp_client.post("/api/v1/customers", json=customer_data.dict())
             if resp.status_code in [200, 201]:
                 logger.info(f"Created Customer: {email}")
-                return email
+                return email, None
             else:
                 logger.error(f"Failed to create customer: {resp.text}")
                 return None
@@ -118,28 +394,31 @@ class SyncEngine:
             logger.error(f"Error creating customer: {e}")
             return None
 
-    async def sync_order(self, wc_order: Dict):
+    async def sync_order(self, wc_order: Dict, resync: bool = False) -> bool:
+        """Send one order to the ERP; with ``resync`` an order already there is updated. True when done."""
         wc_id = wc_order['id']
-        logger.info(f"Processing WC Order #{wc_id}")
+        external_id = self.store.external_id(wc_id)
+        logger.info(f"[{self.store.code}] Processing WC Order #{wc_id}")
 
         # 1. Idempotency Check
         try:
-            resp = await self.erp_client.get(f"/api/v1/orders/by-wc-id/{wc_id}")
-            if resp.status_code == 200:
+            resp = await self.erp_client.get(f"/api/v1/orders/by-wc-id/{external_id}")
+            exists = resp.status_code == 200
+            if exists and not resync:
                 logger.info(f"Order #{wc_id} already exists. Skipping.")
-                return
+                return True
         except Exception as e:
             logger.error(f"Error checking order existence: {e}")
             await self.log_sync(SyncLogCreate(
-                entity_type="Order", entity_id=wc_id, operation="Check", status="Fail", details={"error": str(e)}
+                entity_type="Order", entity_id=wc_id, operation="Check", status="Fail", details={"error": str(e), "store": self.store.code}
             ))
-            return
+            return False
 
         # 2. Customer Sync
-        customer_email = await self.get_or_create_customer(wc_order)
-        if not customer_email:
+        customer = await self.get_or_create_customer(wc_order)
+        if not customer:
             logger.error(f"Skipping Order #{wc_id} due to customer failure.")
-            return
+            return False
 
         # 3. AI Enrichment
         enriched_data = await self.enrich_data_with_local_ai(wc_order)
@@ -155,53 +434,173 @@ class SyncEngine:
 
         order_create = OrderCreate(
             wc_id=wc_id,
-            customer_email=customer_email,
+            external_id=external_id,
+            store=self.store.code,
+            customer_email=customer[0],
+            customer_contact_id=customer[1],
             status=wc_order['status'],
             total_amount=float(wc_order['total']),
             currency=wc_order['currency'],
+            placed_at=f"{wc_order['date_created_gmt']}+00:00" if wc_order.get('date_created_gmt') else None,
             items=items,
             ai_risk_score=enriched_data.get('ai_risk_score'),
             ai_notes=enriched_data.get('ai_notes')
         )
 
         # 5. Send to ERP
+        operation = "Update" if exists else "Create"
         try:
-            resp = await self.erp_client.post("/api/v1/orders", json=order_create.dict())
+            if exists:
+                resp = await self.erp_client.put(f"/api/v1/orders/by-wc-id/{external_id}", json=order_create.dict())
+            else:
+                resp = await self.erp_client.post("/api/v1/orders", json=order_create.dict())
             if resp.status_code in [200, 201]:
                 logger.info(f"Successfully synced Order #{wc_id}")
                 await self.log_sync(SyncLogCreate(
-                    entity_type="Order", entity_id=wc_id, operation="Create", status="Success", details={"wc_id": wc_id}
+                    entity_type="Order", entity_id=wc_id, operation=operation, status="Success", details={"wc_id": wc_id, "store": self.store.code}
                 ))
+                return True
             else:
                 logger.error(f"Failed to sync order: {resp.text}")
                 await self.log_sync(SyncLogCreate(
-                    entity_type="Order", entity_id=wc_id, operation="Create", status="Fail", details={"error": resp.text}
+                    entity_type="Order", entity_id=wc_id, operation=operation, status="Fail", details={"error": resp.text, "store": self.store.code}
                 ))
         except Exception as e:
             logger.error(f"Exception syncing order: {e}")
             await self.log_sync(SyncLogCreate(
-                entity_type="Order", entity_id=wc_id, operation="Create", status="Fail", details={"error": str(e)}
+                entity_type="Order", entity_id=wc_id, operation=operation, status="Fail", details={"error": str(e), "store": self.store.code}
             ))
+        return False
+
+    async def drain_queue(self):
+        """(Re)sync the orders reconcile.py queued; they stay queued until they go through."""
+        queued = self.queue.load()
+        if not queued:
+            return
+        logger.info(f"[{self.store.code}] {len(queued)} queued orders to resync.")
+        done = []
+        for wc_id, reason in queued.items():
+            resp = await self.wc_get(f"orders/{wc_id}")
+            if resp.status_code == 404:
+                logger.warning(f"Queued order #{wc_id} ({reason}) no longer exists in WooCommerce.")
+                done.append(wc_id)
+                continue
+            if resp.status_code == 200 and await self.sync_order(resp.json(), resync=True):
+                done.append(wc_id)
+        self.queue.remove(done)
+
+    async def _sync_all(self, orders: List[Dict]) -> List[int]:
+        """Sync a page of orders, ``store.workers`` at a time; returns the ids that failed."""
+        gate = asyncio.Semaphore(self.store.workers)
+
+        async def one(order):
+            async with gate:
+                return await self.sync_order(order, resync=True)
+
+        results = await asyncio.gather(*(one(order) for order in orders))
+        return [order['id'] for order, ok in zip(orders, results) if not ok]
+
+    async def sync_modified(self):
+        """
+        Every order modified since the store's watermark, oldest first. Orders
+        that fail go to the sync queue, so the watermark can move on past them.
+        """
+        started = datetime.now(timezone.utc)
+        since = self.watermarks.get(self.store.code) or started - timedelta(hours=self.store.backfill_hours)
+        params = {
+            "status": self.store.statuses,
+            "modified_after": (since - WATERMARK_OVERLAP).strftime("%Y-%m-%dT%H:%M:%S"),
+            "dates_are_gmt": "true",
+            "orderby": "date",
+            "order": "asc",
+            "per_page": 100,
+        }
+        page, synced = 1, 0
+        while True:
+            resp = await self.wc_get("orders", {**params, "page": page})
+            resp.raise_for_status()
+            orders = resp.json()
+            failed = await self._sync_all(orders)
+            if failed:
+                self.queue.add(failed, "failed")
+            synced += len(orders) - len(failed)
+            if page >= int(resp.headers.get("X-WP-TotalPages", 1)):
+                break
+            page += 1
+        self.watermarks.set(self.store.code, started)
+        logger.info(f"[{self.store.code}] {synced} orders synced, modified since {since:%Y-%m-%d %H:%M}.")
 
     async def run(self):
-        logger.info("Starting Sync Engine...")
+        logger.info(f"[{self.store.code}] Starting Sync Engine...")
         try:
-            # Fetch Processing Orders
-            orders = self.wcapi.get("orders", params={"status": "processing", "per_page": 10}).json()
-            logger.info(f"Found {len(orders)} processing orders.")
-            
-            for order in orders:
-                await self.sync_order(order)
-                
+            await self.sync_modified()
+            await self.drain_queue()
         except Exception as e:
-            logger.critical(f"Sync Engine Crash: {e}")
-        finally:
-            await self.erp_client.aclose()
+            logger.critical(f"[{self.store.code}] Sync Engine Crash: {e}")
+
+
+async def run_stores(stores: List[StoreConfig]):
+    """Every store's sync at once, over one shared ERP connection pool."""
+    erp = ErpClient()
+    watermarks = Watermarks()
+    try:
+        await asyncio.gather(*(SyncEngine(store, erp, watermarks).run() for store in stores))
+    finally:
+        await erp.aclose()
+
+def upload_profile(profiler: cProfile.Profile, duration_ms: float, stores: List[StoreConfig]):
+    """Hand a run's profile to the ERP (POST /api/v1/profiles/, a staff token); kept on disk if that fails."""
+    directory = Path(SYNC_PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"sync-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.prof"
+    profiler.dump_stats(path)
+    codes = ",".join(store.code for store in stores)
+    try:
+        with path.open("rb") as f:
+            resp = httpx.post(
+                f"{ERP_API_URL}/api/v1/profiles/",
+                headers=ERP_HEADERS,
+                files={"file": (path.name, f)},
+                data={
+                    "kind": "sync", "mode": "cprofile", "name": f"stores: {codes}",
+                    "duration_ms": f"{duration_ms:.1f}", "meta": json.dumps({"stores": codes}),
+                },
+                timeout=30.0,
+            )
+        resp.raise_for_status()
+    except httpx.HTTPError as e:
+        logger.warning(f"Could not upload the profile ({e}); it is in {path}")
+        return
+    path.unlink()
+    logger.info(f"Profile of this run uploaded (#{resp.json()['id']})")
+
+
+def run_profiled(stores: List[StoreConfig]):
+    """
+    One run under cProfile. It sees the event loop thread: the ERP calls and
+    the pipelines' own work; WooCommerce calls run in threads and show as
+    the time spent awaiting them.
+    """
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        asyncio.run(run_stores(stores))
+    finally:
+        profiler.disable()
+        upload_profile(profiler, (time.perf_counter() - start) * 1000, stores)
 
 if __name__ == "__main__":
-    if not WC_URL or not WC_KEY:
-        logger.error("Missing WooCommerce credentials. Please set WC_URL, WC_KEY, WC_SECRET.")
+    try:
+        stores = load_stores()
+    except ValueError as e:
+        logger.error(f"Bad store configuration: {e}")
         exit(1)
-        
-    engine = SyncEngine()
-    asyncio.run(engine.run())
+    if not stores:
+        logger.error(f"No stores. Set WC_URL, WC_KEY, WC_SECRET or list them in {STORES_FILE}.")
+        exit(1)
+
+    if random.random() < SYNC_PROFILE_RATE:
+        run_profiled(stores)
+    else:
+        asyncio.run(run_stores(stores))